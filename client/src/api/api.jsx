@@ -23,4 +23,90 @@ export const uploadFiles = async (formData) => {
     throw new Error(`Upload failed: ${response.status}`);
   }
   return response.json();
-};
\ No newline at end of file
+};
+
+// Job id returned by /upload - every later call (/run, /analysis, /result-files, /results) is scoped to it
+const JOB_KEY = "transcp_job_id";
+
+export const saveJobId = (jobId) => sessionStorage.setItem(JOB_KEY, jobId);
+export const getJobId = () => sessionStorage.getItem(JOB_KEY);
+export const clearJobId = () => sessionStorage.removeItem(JOB_KEY);
+
+// Job status push: /analysis/stream (Server-Sent Events), falls back to polling /analysis every 5s
+// onStatus gets the same body as GET /analysis; returns a stop() function
+export const POLL_INTERVAL_MS = 5000;
+
+export const watchJobStatus = (jobId, onStatus, onError) => {
+  let stopped = false;
+  let source = null;
+  let timer = null;
+  const isFinal = (status) => status === "done" || status === "error";
+
+  const stop = () => {
+    stopped = true;
+    if (source) source.close();
+    if (timer) clearTimeout(timer);
+  };
+
+  const poll = async () => {
+    try {
+      const res = await fetch(`${API_BASE}/analysis?job_id=${encodeURIComponent(jobId)}`);
+      if (!res.ok) throw new Error(`Status request failed: ${res.status}`);
+      const data = await res.json();
+      if (stopped) return;
+      onStatus(data);
+      if (!isFinal(data.status)) timer = setTimeout(poll, POLL_INTERVAL_MS);
+    } catch (err) {
+      if (!stopped) onError(err);
+    }
+  };
+
+  if (typeof window === "undefined" || !window.EventSource) {
+    poll();
+    return stop;
+  }
+
+  let received = false;
+  source = new EventSource(`${API_BASE}/analysis/stream?job_id=${encodeURIComponent(jobId)}`);
+  source.addEventListener("status", (e) => {
+    received = true;
+    const data = JSON.parse(e.data);
+    onStatus(data);
+    if (isFinal(data.status)) source.close(); // server ends the stream too, don't auto-reconnect
+  });
+  source.onerror = () => {
+    // stream never opened (proxy / old server): switch to polling for good
+    // stream dropped after messages: EventSource reconnects by itself unless closed
+    if (!received || source.readyState === EventSource.CLOSED) {
+      source.close();
+      if (!stopped) poll();
+    }
+  };
+  return stop;
+};
+
+// Client-side plot data: GET /viz/<job_id>/manifest.json, then each binary array (little-endian typed arrays)
+// ?v=<manifest version> lets the browser cache the arrays for good; the server sends them gzip-compressed
+const TYPED = { float32: Float32Array, uint32: Uint32Array, uint16: Uint16Array, uint8: Uint8Array };
+
+export const fetchVizData = async (jobId) => {
+  const base = `${API_BASE}/viz/${encodeURIComponent(jobId)}`;
+  const res = await fetch(`${base}/manifest.json`);
+  if (!res.ok) throw new Error(`Plot data request failed: ${res.status}`);
+  const manifest = await res.json();
+  const load = async ({ file, dtype }) => {
+    const r = await fetch(`${base}/${file}?v=${manifest.version}`);
+    if (!r.ok) throw new Error(`Plot data request failed: ${r.status}`);
+    return new TYPED[dtype](await r.arrayBuffer());
+  };
+  const obs = {};
+  await Promise.all(Object.entries(manifest.obs).map(async ([col, entry]) => {
+    obs[col] = { codes: await load(entry), categories: entry.categories, missing: entry.missing };
+  }));
+  const deg = manifest.deg && {
+    genes: manifest.deg.genes,
+    logfc: await load(manifest.deg.logfc),
+    fdr: await load(manifest.deg.fdr),
+  };
+  return { cells: manifest.cells, umap: await load(manifest.umap), obs, deg };
+};
@@ -0,0 +1,104 @@
+// src/components/DegTable.jsx
+// Paginated DEG table backed by GET /deg (filtered + sorted server-side, one page at a time)
+import axios from 'axios';
+import { useEffect, useState } from 'react';
+import { API_BASE, getJobId } from '../api/api';
+
+const PAGE_SIZE = 50;
+
+const COLUMNS = [
+  { key: 'gene', label: 'Gene', sort: 'gene' },
+  { key: 'logfc', label: 'log2FC', sort: 'logfc' },
+  { key: 'pval', label: 'p-value', sort: 'pval' },
+  { key: 'fdr', label: 'FDR', sort: 'fdr' },
+];
+
+const fmt = (v) => (v == null ? '–' : Math.abs(v) < 1e-3 && v !== 0 ? v.toExponential(2) : v.toFixed(3));
+
+export default function DegTable() {
+  const [page, setPage] = useState({ total: 0, rows: [] });
+  const [offset, setOffset] = useState(0);
+  const [geneQuery, setGeneQuery] = useState('');
+  const [fdrMax, setFdrMax] = useState('');
+  const [sort, setSort] = useState({ key: 'fdr', order: 'asc' });
+  const [error, setError] = useState('');
+
+  useEffect(() => {
+    const params = {
+      job_id: getJobId(),
+      sort: sort.key,
+      order: sort.order,
+      limit: PAGE_SIZE,
+      offset,
+    };
+    if (geneQuery) params.gene_prefix = geneQuery;
+    if (fdrMax) params.fdr_max = fdrMax;
+    axios.get(`${API_BASE}/deg`, { params })
+      .then(res => { setPage(res.data); setError(''); })
+      .catch(err => setError(err.response?.data?.detail || err.message));
+  }, [offset, geneQuery, fdrMax, sort]);
+
+  const toggleSort = (key) => {
+    setOffset(0);
+    setSort(prev => ({ key, order: prev.key === key && prev.order === 'asc' ? 'desc' : 'asc' }));
+  };
+
+  if (error) {
+    return <p className="text-gray-400 text-center">DEG table unavailable: {String(error)}</p>;
+  }
+
+  return (
+    <div className="bg-white rounded-2xl shadow-xl p-6 max-w-4xl mx-auto w-full">
+      <h3 className="text-xl font-bold text-gray-800 mb-4">🧬 Differentially Expressed Genes</h3>
+      <div className="flex gap-4 mb-4">
+        <input
+          value={geneQuery}
+          onChange={e => { setOffset(0); setGeneQuery(e.target.value.trim()); }}
+          placeholder="Gene name starts with..."
+          className="border rounded px-3 py-1 flex-1"
+        />
+        <select
+          value={fdrMax}
+          onChange={e => { setOffset(0); setFdrMax(e.target.value); }}
+          className="border rounded px-3 py-1"
+        >
+          <option value="">Any FDR</option>
+          <option value="0.05">FDR ≤ 0.05</option>
+          <option value="0.01">FDR ≤ 0.01</option>
+        </select>
+      </div>
+      <table className="w-full text-sm text-left">
+        <thead>
+          <tr className="border-b">
+            {COLUMNS.map(col => (
+              <th key={col.key} className="py-2 cursor-pointer select-none" onClick={() => toggleSort(col.sort)}>
+                {col.label}{sort.key === col.sort ? (sort.order === 'asc' ? ' ▲' : ' ▼') : ''}
+              </th>
+            ))}
+          </tr>
+        </thead>
+        <tbody>
+          {page.rows.map(row => (
+            <tr key={`${row.contrast}-${row.gene}`} className="border-b last:border-0">
+              <td className="py-1 font-mono">{row.gene}</td>
+              <td className="py-1">{fmt(row.logfc)}</td>
+              <td className="py-1">{fmt(row.pval)}</td>
+              <td className="py-1">{fmt(row.fdr)}</td>
+            </tr>
+          ))}
+        </tbody>
+      </table>
+      <div className="flex justify-between items-center mt-4 text-sm text-gray-600">
+        <span>
+          {page.total ? `${offset + 1}–${Math.min(offset + PAGE_SIZE, page.total)} of ${page.total}` : 'No matching genes'}
+        </span>
+        <div className="space-x-2">
+          <button disabled={offset === 0} onClick={() => setOffset(Math.max(offset - PAGE_SIZE, 0))}
+                  className="px-3 py-1 rounded bg-gray-200 disabled:opacity-40">Prev</button>
+          <button disabled={offset + PAGE_SIZE >= page.total} onClick={() => setOffset(offset + PAGE_SIZE)}
+                  className="px-3 py-1 rounded bg-gray-200 disabled:opacity-40">Next</button>
+        </div>
+      </div>
+    </div>
+  );
+}
@@ -0,0 +1,189 @@
+// src/components/InteractivePlots.jsx
+// UMAP + volcano drawn in the browser from the binary arrays of GET /viz (see fetchVizData)
+// recolor, zoom (wheel) and pan (drag) happen on a canvas - no new server-side render
+import { useEffect, useMemo, useRef, useState } from 'react';
+import { fetchVizData, getJobId } from '../api/api';
+
+const PALETTE = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2',
+                 '#7f7f7f', '#bcbd22', '#17becf', '#393b79', '#637939', '#8c6d31', '#843c39'];
+const MISSING_COLOR = '#d1d5db';
+const SIZE = 560;
+const PAD = 12;
+
+// x, y: typed arrays of the same length; colors: one CSS color per point (or a single string)
+function ScatterCanvas({ x, y, colors, onHover }) {
+  const canvasRef = useRef(null);
+  const [view, setView] = useState({ scale: 1, dx: 0, dy: 0 });
+  const drag = useRef(null);
+
+  // data range -> canvas pixels, before zoom / pan
+  const bounds = useMemo(() => {
+    let x0 = Infinity, x1 = -Infinity, y0 = Infinity, y1 = -Infinity;
+    for (let i = 0; i < x.length; i++) {
+      if (!Number.isFinite(x[i]) || !Number.isFinite(y[i])) continue;
+      x0 = Math.min(x0, x[i]); x1 = Math.max(x1, x[i]);
+      y0 = Math.min(y0, y[i]); y1 = Math.max(y1, y[i]);
+    }
+    return { x0, y0, sx: (SIZE - 2 * PAD) / ((x1 - x0) || 1), sy: (SIZE - 2 * PAD) / ((y1 - y0) || 1) };
+  }, [x, y]);
+
+  const toPixel = (i) => [
+    (PAD + (x[i] - bounds.x0) * bounds.sx) * view.scale + view.dx,
+    (SIZE - PAD - (y[i] - bounds.y0) * bounds.sy) * view.scale + view.dy,
+  ];
+
+  useEffect(() => {
+    const ctx = canvasRef.current.getContext('2d');
+    ctx.clearRect(0, 0, SIZE, SIZE);
+    const r = Math.max(1, Math.min(4, 1.5 * Math.sqrt(view.scale)));
+    for (let i = 0; i < x.length; i++) {
+      const [px, py] = toPixel(i);
+      if (px < 0 || py < 0 || px > SIZE || py > SIZE) continue;
+      ctx.fillStyle = typeof colors === 'string' ? colors : colors[i];
+      ctx.fillRect(px - r / 2, py - r / 2, r, r);
+    }
+  });  // every render: cheap next to the data transfer it replaces
+
+  const onWheel = (e) => {
+    const rect = canvasRef.current.getBoundingClientRect();
+    const mx = e.clientX - rect.left, my = e.clientY - rect.top;
+    const k = e.deltaY < 0 ? 1.25 : 0.8;
+    setView(v => ({ scale: v.scale * k, dx: mx - (mx - v.dx) * k, dy: my - (my - v.dy) * k }));
+  };
+
+  const onMouseMove = (e) => {
+    if (drag.current) {
+      const { x: sx, y: sy, view: v } = drag.current;
+      setView({ ...v, dx: v.dx + e.clientX - sx, dy: v.dy + e.clientY - sy });
+      return;
+    }
+    if (!onHover) return;
+    const rect = canvasRef.current.getBoundingClientRect();
+    const mx = e.clientX - rect.left, my = e.clientY - rect.top;
+    let best = -1, bestDist = 36;  // within 6 px
+    for (let i = 0; i < x.length; i++) {
+      const [px, py] = toPixel(i);
+      const d = (px - mx) ** 2 + (py - my) ** 2;
+      if (d < bestDist) { best = i; bestDist = d; }
+    }
+    onHover(best);
+  };
+
+  return (
+    <div className="flex flex-col items-center">
+      <canvas
+        ref={canvasRef}
+        width={SIZE}
+        height={SIZE}
+        className="border rounded-md bg-white cursor-crosshair"
+        onWheel={onWheel}
+        onMouseDown={e => { drag.current = { x: e.clientX, y: e.clientY, view }; }}
+        onMouseUp={() => { drag.current = null; }}
+        onMouseLeave={() => { drag.current = null; }}
+        onMouseMove={onMouseMove}
+      />
+      <button onClick={() => setView({ scale: 1, dx: 0, dy: 0 })} className="mt-2 text-sm text-sky-700">
+        Reset view
+      </button>
+    </div>
+  );
+}
+
+function UmapPlot({ data }) {
+  const columns = Object.keys(data.obs);
+  const [colorBy, setColorBy] = useState(columns[0]);
+  const { x, y } = useMemo(() => {
+    const n = data.umap.length / 2;
+    const xs = new Float32Array(n), ys = new Float32Array(n);
+    for (let i = 0; i < n; i++) { xs[i] = data.umap[2 * i]; ys[i] = data.umap[2 * i + 1]; }
+    return { x: xs, y: ys };
+  }, [data]);
+  const obs = data.obs[colorBy];
+  const colors = useMemo(() => {
+    if (!obs) return PALETTE[0];
+    return Array.from(obs.codes, c => (c === obs.missing ? MISSING_COLOR : PALETTE[c % PALETTE.length]));
+  }, [obs]);
+
+  return (
+    <div className="p-6">
+      <h3 className="text-xl font-bold text-gray-800 mb-2">🧠 UMAP (interactive)</h3>
+      <p className="text-sm text-gray-500 mb-2">
+        {data.cells.shown < data.cells.total
+          ? `${data.cells.shown.toLocaleString()} of ${data.cells.total.toLocaleString()} cells (density-preserving sample)`
+          : `${data.cells.total.toLocaleString()} cells`}
+      </p>
+      {columns.length > 0 && (
+        <select value={colorBy} onChange={e => setColorBy(e.target.value)} className="border rounded px-3 py-1 mb-3">
+          {columns.map(col => <option key={col} value={col}>{col}</option>)}
+        </select>
+      )}
+      <ScatterCanvas x={x} y={y} colors={colors} />
+      {obs && (
+        <div className="flex flex-wrap gap-3 mt-3 max-w-xl text-sm">
+          {obs.categories.map((cat, i) => (
+            <span key={cat} className="flex items-center gap-1">
+              <span className="inline-block w-3 h-3 rounded-sm" style={{ background: PALETTE[i % PALETTE.length] }} />
+              {cat}
+            </span>
+          ))}
+        </div>
+      )}
+    </div>
+  );
+}
+
+function VolcanoPlot({ deg }) {
+  const [fdrMax, setFdrMax] = useState(0.05);
+  const [hover, setHover] = useState(-1);
+  const y = useMemo(() => Float32Array.from(deg.fdr, f => -Math.log10(f + 1e-10)), [deg]);
+  const colors = useMemo(() => Array.from(deg.fdr, f => (f <= fdrMax ? '#dc2626' : '#9ca3af')), [deg, fdrMax]);
+
+  return (
+    <div className="p-6">
+      <h3 className="text-xl font-bold text-gray-800 mb-2">🌋 Volcano Plot (interactive)</h3>
+      <div className="flex gap-4 items-center mb-3 text-sm">
+        <select value={fdrMax} onChange={e => setFdrMax(Number(e.target.value))} className="border rounded px-3 py-1">
+          <option value={0.05}>FDR ≤ 0.05</option>
+          <option value={0.01}>FDR ≤ 0.01</option>
+          <option value={0.001}>FDR ≤ 0.001</option>
+        </select>
+        <span className="text-gray-600">
+          {hover >= 0
+            ? `${deg.genes[hover]}: log2FC ${deg.logfc[hover].toFixed(2)}, FDR ${deg.fdr[hover].toExponential(2)}`
+            : 'Hover a point for its gene'}
+        </span>
+      </div>
+      <ScatterCanvas x={deg.logfc} y={y} colors={colors} onHover={setHover} />
+    </div>
+  );
+}
+
+export default function InteractivePlots() {
+  const [data, setData] = useState(null);
+  const [error, setError] = useState('');
+
+  useEffect(() => {
+    fetchVizData(getJobId())
+      .then(setData)
+      .catch(err => setError(err.message));
+  }, []);
+
+  if (error) {
+    return <p className="text-gray-400 text-center">Interactive plots unavailable: {error}</p>;
+  }
+  if (!data) {
+    return <p className="text-gray-400 text-center">Loading interactive plots...</p>;
+  }
+  return (
+    <>
+      <div className="flex justify-center bg-white rounded-2xl shadow-xl overflow-hidden">
+        <UmapPlot data={data} />
+      </div>
+      {data.deg && (
+        <div className="flex justify-center bg-white rounded-2xl shadow-xl overflow-hidden">
+          <VolcanoPlot deg={data.deg} />
+        </div>
+      )}
+    </>
+  );
+}
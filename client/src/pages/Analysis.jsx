@@ -1,38 +1,31 @@
 // src/pages/Analysis.jsx
-import axios from 'axios';
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { API_BASE } from '../api/api'; // Hosting: import your API base URL
+import { getJobId, watchJobStatus } from '../api/api'; // status push/poll against the hosted API
 
 export default function Analysis() {
   const [status, setStatus] = useState('processing')
   const [error, setError]   = useState('')
-  const [loading, setLoading] = useState(false)
+  const [progress, setProgress] = useState(null) // current stage + ETA from the backend
   const navigate = useNavigate()
 
-  // Poll /analysis every 5 seconds, check the complete flag -> FASTAPI will udpate state once found
+  // Subscribe to /analysis/stream (pushed on every state/stage change), polling /analysis as fallback
   // analysis the backend status
   useEffect(() => {
-    let intervalId
-    async function pollStatus() {
-      try {
-        // const res = await axios.get('http://localhost:8000/analysis')
-        const res = await axios.get(`${API_BASE}/analysis`) // ✅ Use dynamic backend URL
-        
-        if (res.data.status === 'done') {
+    const stop = watchJobStatus(
+      getJobId(),
+      (data) => {
+        setProgress(data)
+        if (data.status === 'error') {
+          setError(data.error || 'Pipeline failed')
+        } else if (data.status === 'done') {
           setStatus('done')
-          clearInterval(intervalId)
           navigate('/result')
         }
-      } catch (err) {
-        setError(err.message)
-        clearInterval(intervalId)
-      }
-    }
-    // Start polling
-    pollStatus()
-    intervalId = setInterval(pollStatus, 5000)
-    return () => clearInterval(intervalId)
+      },
+      (err) => setError(err.message)
+    )
+    return stop
   }, [])
 
   if (error) {
@@ -45,6 +38,18 @@ export default function Analysis() {
       {status === 'processing' ? (
         <>
           <p className="text-lg">Analysis in progress...</p>
+          {progress?.status === 'queued' && (
+            <p className="text-gray-500">
+              Waiting for a free worker
+              {progress.queue_position != null && ` (position ${progress.queue_position} in the queue)`}...
+            </p>
+          )}
+          {progress?.stage && (
+            <p className="text-gray-500">
+              Step: {progress.stage}
+              {progress.eta_seconds != null && ` · about ${Math.ceil(progress.eta_seconds)}s left`}
+            </p>
+          )}
           <button
             onClick={() => navigate('/')}
             className="mt-4 bg-gray-300 text-gray-700 py-2 px-4 rounded"
@@ -1,7 +1,7 @@
 import axios from 'axios';
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { API_BASE } from '../api/api'; // Hosting: import your API base URL
+import { API_BASE, clearJobId, getJobId } from '../api/api'; // Hosting: import your API base URL
 
 // function Home() {
 //Use Tailwind CSS
@@ -40,9 +40,12 @@ export default function Home() {
   // }, []);
 
   useEffect(() => {
-    if (connected === true) {
-      axios.post(`${API_BASE}/reset`)
-        .catch(err => console.warn("Reset failed (non-fatal):", err?.response?.status));
+    // only clean up this browser's previous job, other users' jobs are left alone
+    const jobId = getJobId();
+    if (connected === true && jobId) {
+      axios.post(`${API_BASE}/reset`, null, { params: { job_id: jobId } })
+        .catch(err => console.warn("Reset failed (non-fatal):", err?.response?.status))
+        .finally(() => clearJobId());
     }
   }, [connected]);
 
@@ -2,7 +2,9 @@
 // src/pages/Result.jsx
 import axios from 'axios';
 import { useEffect, useState } from 'react';
-import { API_BASE } from '../api/api'; // Hosting: import your API base URL
+import { API_BASE, getJobId } from '../api/api'; // Hosting: import your API base URL
+import DegTable from '../components/DegTable';
+import InteractivePlots from '../components/InteractivePlots';
 
 const DownloadIcon = () => (
     <svg className="w-5 h-5 mr-2" fill="none" stroke="currentColor" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg"><path strokeLinecap="round" strokeLinejoin="round" strokeWidth="2" d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4"></path></svg>
@@ -39,7 +41,7 @@ export default function Result() {
   useEffect(() => {
     setLoading(true);
     // axios.get('http://localhost:8000/result-files')
-    axios.get(`${API_BASE}/result-files`)
+    axios.get(`${API_BASE}/result-files`, { params: { job_id: getJobId() } })
     
       .then(res => {
         setFiles(sortFiles(res.data));
@@ -89,6 +91,15 @@ export default function Result() {
         <p className="mt-2 text-lg text-gray-300">
           Explore the visualizations generated by the pipeline.
         </p>
+        {/* every output file in one zip, streamed by the server */}
+        <a
+          href={`${API_BASE}/bundle?job_id=${encodeURIComponent(getJobId())}`}
+          className="inline-flex items-center mt-4 px-4 py-2 rounded-md text-sm font-medium
+                     text-sky-700 bg-sky-100 hover:bg-sky-200 transition"
+        >
+          <DownloadIcon />
+          Download all results (.zip)
+        </a>
       </div>
 
       {/* Card Network */}
@@ -110,7 +121,7 @@ export default function Result() {
               <div className="bg-gray-100 p-4 rounded-lg">
                 <img
                   // src={`http://localhost:8000/results/${name}`}
-                  src={`${API_BASE}/results/${name}`}
+                  src={`${API_BASE}/results/${getJobId()}/${name}`}
                   alt={getTitle(name)}
                   className="w-full h-auto object-contain rounded-md shadow-inner"
                   loading="lazy"
@@ -119,7 +130,7 @@ export default function Result() {
               <div className="mt-6 flex justify-center">
                 <a
                   // href={`http://localhost:8000/results/${name}`} //obtain the pic
-                  href={`${API_BASE}/results/${name}`}
+                  href={`${API_BASE}/results/${getJobId()}/${name}`}
                   download={name}
                   target="_blank" //open to a new page
                   rel="noopener noreferrer" //network browsing privacy
@@ -137,6 +148,12 @@ export default function Result() {
             </div>
           </div>
         ))}
+
+        {/* UMAP / volcano drawn client-side from the /viz arrays: recolor + zoom without a re-run */}
+        <InteractivePlots />
+
+        {/* DEG table: paged from /deg instead of downloading the CSV */}
+        <DegTable />
       </div>
     </main>
   );
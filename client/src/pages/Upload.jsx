@@ -2,7 +2,7 @@
 import axios from 'axios'; //HTTP request
 import { useState } from 'react'; //React hook to manage local state
 import { useNavigate } from 'react-router-dom'; //moving page
-import { API_BASE } from '../api/api';
+import { API_BASE, getJobId, saveJobId } from '../api/api';
 
 export default function Upload() {
   const [exprFile, setExprFile] = useState(null)
@@ -28,12 +28,15 @@ export default function Upload() {
     try {
       //! await axios.post('http://localhost:8000/upload', formData)
       // Backend AWS EC2 HOSTING
-      await axios.post(`${API_BASE}/upload`, formData) //use ` `
+      const res = await axios.post(`${API_BASE}/upload`, formData) //use ` `
+      saveJobId(res.data.job_id) // each upload = one job workspace on the backend
       
-      alert('Upload Successful')
+      const warnings = res.data.warnings || []
+      alert('Upload Successful' + (warnings.length ? '\nWarnings:\n- ' + warnings.join('\n- ') : ''))
       setUploaded(true)
     } catch (err) {
-      alert('Uplaod Failed' + (err.message || err))
+      // 413 / 422: size limit or pre-flight check, detail says what is wrong with which file
+      alert('Uplaod Failed: ' + (err.response?.data?.detail || err.message || err))
     } finally {
       setLoading(false)
     }
@@ -46,7 +49,7 @@ export default function Upload() {
       //Pipeline execution: Send post -> to FASTAPI
       //! const response = await axios.post('http://localhost:8000/run')
       // Backend AWS EC2 HOSTING: from local host :8000 to api:8000
-      const response = await axios.post(`${API_BASE}/run`)
+      const response = await axios.post(`${API_BASE}/run`, null, { params: { job_id: getJobId() } })
 
       //Page navigation: if SUCCESS => auto nav, if NOT => Error
       if (response.status === 200 && response.data.success !== false) {
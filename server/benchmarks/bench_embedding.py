@@ -0,0 +1,85 @@
+"""
+Benchmark: previous embedding work (neighbors' own PCA + UMAP in main, then plot_umap's
+StandardScaler + PCA(10) + UMAP on the dense matrix) vs the shared engine (one PCA, one kNN graph,
+one UMAP, reused by the plot).
+
+Run from server/:
+    python -m benchmarks.bench_embedding --cells 100000 --genes 2000
+"""
+import argparse
+
+import anndata as ad
+import numpy as np
+import scanpy as sc
+import umap.umap_ as umap
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.synthetic import make_counts, make_covariates
+from pipeline.embedding import compute_embedding
+from pipeline.profiling import measure
+
+
+def make_adata(n_cells: int, n_genes: int, density: float):
+    meta_df = make_covariates(n_cells)
+    adata = ad.AnnData(X=make_counts(n_cells, n_genes, density, meta_df=meta_df), obs=meta_df)
+    sc.pp.normalize_total(adata, target_sum=1e4)
+    sc.pp.log1p(adata)
+    return adata
+
+
+def old_embedding(adata, n_neighbors: int, n_pcs: int) -> dict:
+    out = {}
+    with measure("main: neighbors (+ its own PCA) + umap", verbose=False) as m:
+        sc.pp.neighbors(adata, n_neighbors=n_neighbors, n_pcs=n_pcs)
+        sc.tl.umap(adata)
+    out[m["stage"]] = m["seconds"]
+    with measure("plot_umap: scaler + PCA(10) + UMAP", verbose=False) as m:
+        scaled = StandardScaler().fit_transform(adata.X.toarray())
+        umap.UMAP(n_components=2, random_state=42).fit_transform(PCA(n_components=10).fit_transform(scaled))
+    out[m["stage"]] = m["seconds"]
+    return out
+
+
+def new_embedding(adata, n_neighbors: int, n_pcs: int) -> dict:
+    out = {}
+    with measure("engine: PCA + kNN + UMAP", verbose=False) as m:
+        steps = compute_embedding(adata, n_neighbors=n_neighbors, n_pcs=n_pcs)
+    out[m["stage"]] = m["seconds"]
+    with measure("plot_umap: reuse", verbose=False) as m:
+        again = compute_embedding(adata, n_neighbors=n_neighbors, n_pcs=n_pcs)
+    assert not again, again  # nothing recomputed
+    out[m["stage"]] = m["seconds"]
+    print(f"  engine steps: {steps}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=20000)
+    parser.add_argument("--genes", type=int, default=2000)
+    parser.add_argument("--density", type=float, default=0.1)
+    parser.add_argument("--n-neighbors", type=int, default=5)
+    parser.add_argument("--n-pcs", type=int, default=30)
+    args = parser.parse_args()
+
+    # numba JIT (umap / pynndescent) compiles on first use: pay it outside the timings
+    warm = make_adata(5000, 200, 0.2)
+    old_embedding(warm.copy(), args.n_neighbors, 10)
+    new_embedding(warm.copy(), args.n_neighbors, 10)
+
+    adata = make_adata(args.cells, args.genes, args.density)
+    print(f"{args.cells} cells x {args.genes} genes, density {args.density}")
+    old = old_embedding(adata.copy(), args.n_neighbors, args.n_pcs)
+    new = new_embedding(adata, args.n_neighbors, args.n_pcs)
+    for name, seconds in {**old, **new}.items():
+        print(f"  {name:42s} {seconds:8.2f} s")
+    t_old, t_new = sum(old.values()), sum(new.values())
+    print(f"previous: {t_old:.2f} s, shared engine: {t_new:.2f} s, saved {t_old - t_new:.2f} s "
+          f"({t_old / max(t_new, 1e-9):.1f}x)")
+    print(f"UMAP coordinates: {adata.obsm['X_umap'].shape}, finite: {bool(np.isfinite(adata.obsm['X_umap']).all())}")
+
+
+if __name__ == "__main__":
+    main()
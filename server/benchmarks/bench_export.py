@@ -0,0 +1,73 @@
+"""
+Benchmark: client-side plot payload (pipeline.export.build_payload).
+Synthetic UMAP = a few large clusters + one rare population (--rare fraction of the cells);
+density-preserving sample vs uniform random sample of the same size: how many rare cells survive,
+plus payload size raw / gzip and build time.
+
+Run from server/:
+    python -m benchmarks.bench_export --cells 500000 --max-points 50000
+"""
+import argparse
+import time
+
+import anndata as ad
+import numpy as np
+import pandas as pd
+
+from pipeline.export import build_payload, density_sample
+
+
+def make_adata(n_cells: int, rare: float, seed: int = 0) -> ad.AnnData:
+    rng = np.random.default_rng(seed)
+    n_rare = max(1, int(n_cells * rare))
+    centers = rng.uniform(-10, 10, size=(6, 2))
+    label = rng.integers(0, len(centers), n_cells - n_rare)
+    coords = np.vstack([centers[label] + rng.normal(0, 1.0, (len(label), 2)),
+                        rng.normal((14, 14), 0.3, (n_rare, 2))]).astype(np.float32)
+    obs = pd.DataFrame({
+        "leiden": pd.Categorical(np.concatenate([label, np.full(n_rare, len(centers))]).astype(str)),
+        "oupSample.batchCond": pd.Categorical(rng.choice(["AD", "CT"], n_cells)),
+    }, index=[f"cell{i}" for i in range(n_cells)])
+    adata = ad.AnnData(obs=obs)
+    adata.obsm["X_umap"] = coords
+    return adata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=200000)
+    parser.add_argument("--genes", type=int, default=1000, help="rows of the DEG table")
+    parser.add_argument("--rare", type=float, default=0.002)
+    parser.add_argument("--max-points", type=int, default=50000)
+    args = parser.parse_args()
+
+    adata = make_adata(args.cells, args.rare)
+    rng = np.random.default_rng(1)
+    deg_df = pd.DataFrame({"names": [f"GENE{i}" for i in range(args.genes)],
+                           "logfoldchanges": rng.normal(0, 1, args.genes),
+                           "pvals_adj": rng.uniform(0, 1, args.genes)})
+    p = {"max_points": args.max_points, "grid": 64, "min_per_bin": 8, "seed": 0,
+         "obs": ["leiden", "oupSample.batchCond"]}
+
+    is_rare = (adata.obs["leiden"] == "6").to_numpy()
+    t0 = time.perf_counter()
+    index = density_sample(adata.obsm["X_umap"], args.max_points)
+    sample_seconds = time.perf_counter() - t0
+    uniform = rng.choice(args.cells, size=len(index), replace=False)
+
+    t0 = time.perf_counter()
+    files = build_payload(adata, deg_df, p, version="bench")
+    build_seconds = time.perf_counter() - t0
+    raw = sum(len(v) for k, v in files.items() if not k.endswith(".gz"))
+    gz = sum(len(v) for k, v in files.items() if k.endswith(".gz"))
+
+    print(f"{args.cells} cells ({is_rare.sum()} rare), {args.genes} DEG rows, max_points={args.max_points}")
+    print(f"  density sample: {len(index)} cells in {sample_seconds * 1000:.1f} ms, "
+          f"rare cells kept {is_rare[index].sum()} vs {is_rare[uniform].sum()} for a uniform sample")
+    print(f"  payload: {len(files) // 2} files, {raw / 1024:.0f} KiB raw, {gz / 1024:.0f} KiB gzip, "
+          f"built in {build_seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: in-memory preprocessing (scanpy_preprocess_matrix) vs out-of-core row blocks
+(pipeline.outofcore) on the same memory-mapped ingest cache: time, peak RSS, same result.
+
+Run from server/:
+    python -m benchmarks.bench_outofcore --cells 100000 --genes 5000
+"""
+import argparse
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from benchmarks.synthetic import make_counts, make_covariates
+from pipeline import runner
+from pipeline.ingest import load_expression_cache
+from pipeline.outofcore import estimate_preprocess_bytes, load_chunked, preprocess_chunked
+from pipeline.profiling import measure
+
+
+def write_cache(cache_dir: Path, X, meta_df) -> dict:
+    """CSR ingest cache layout without the CSV round trip -> its manifest"""
+    info = {"version": 2, "kind": "expression", "shape": list(X.shape), "format": "csr",
+            "density": round(X.nnz / (X.shape[0] * X.shape[1]), 4), "parse_seconds": 0}
+    cache_dir.mkdir(parents=True)
+    np.save(cache_dir / "X_data.npy", X.data)
+    np.save(cache_dir / "X_indices.npy", X.indices)
+    np.save(cache_dir / "X_indptr.npy", X.indptr)
+    np.save(cache_dir / "obs_names.npy", meta_df.index.to_numpy(dtype=str))
+    np.save(cache_dir / "var_names.npy", np.array([f"GENE{j}" for j in range(X.shape[1])]))
+    (cache_dir / "manifest.json").write_text(json.dumps(info))
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=50000)
+    parser.add_argument("--genes", type=int, default=3000)
+    parser.add_argument("--density", type=float, default=0.1)
+    parser.add_argument("--block-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        meta_df = make_covariates(args.cells)
+        info = write_cache(tmp / "cache", make_counts(args.cells, args.genes, args.density, meta_df=meta_df),
+                           meta_df)
+
+        X, obs_names, var_names = load_expression_cache(tmp / "cache")
+        with measure("in-memory", verbose=False, reset_peak=True) as mem:
+            adata = runner.scanpy_preprocess_matrix(X, obs_names, var_names, meta_df)[2]
+        in_memory = sparse.csr_matrix(adata.X)
+        del adata
+
+        (tmp / "out").mkdir()
+        X, obs_names, var_names = load_expression_cache(tmp / "cache")
+        with measure("out-of-core", verbose=False, reset_peak=True) as ooc:
+            preprocess_chunked(X, obs_names, var_names, meta_df, tmp / "out",
+                               block_bytes=args.block_mb * 1024 ** 2)
+        chunked = load_chunked(tmp / "out")
+
+        assert chunked.shape == in_memory.shape, (chunked.shape, in_memory.shape)
+        worst = abs(sparse.csr_matrix(chunked.X) - in_memory).max() if in_memory.nnz else 0.0
+
+    print(f"{args.cells} cells x {args.genes} genes, density {args.density}, "
+          f"estimated in-memory need {estimate_preprocess_bytes(info) // 1024 ** 2} MB")
+    for m in (mem, ooc):
+        print(f"  {m['stage']:12s} {m['seconds']:8.2f} s   peak RSS {m['peak_rss_mb']:8.1f} MB")
+    print(f"  kept {chunked.shape}, max |out-of-core - in-memory| = {worst:.2e}")
+
+
+if __name__ == "__main__":
+    main()
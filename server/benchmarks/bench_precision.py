@@ -0,0 +1,83 @@
+"""
+Regression check + benchmark: float32 vs float64 precision of X (runner.DEFAULT_PARAMS["preprocess"]["dtype"]).
+Same synthetic counts preprocessed at both precisions, then PCA / neighbours and the three DEG producers
+(rank_genes_groups wilcoxon, batched Welch, per-cell-type contrasts). Fails if a DEG ranking changes:
+the top --top genes must come out in the same order and the full rankings must agree (Spearman).
+
+Run from server/:
+    python -m benchmarks.bench_precision --cells 20000 --genes 5000 --density 0.05
+"""
+import argparse
+
+import numpy as np
+from scipy.stats import spearmanr
+
+from benchmarks.synthetic import make_counts, make_covariates
+from pipeline import runner
+from pipeline.embedding import compute_embedding
+from pipeline.profiling import measure
+
+
+def run(X, meta_df, genes, dtype: str) -> dict:
+    out, timings = {}, {}
+    with measure("preprocess", verbose=False, reset_peak=True) as m:
+        _, _, adata, _ = runner.scanpy_preprocess_matrix(X, meta_df.index, genes, meta_df, dtype=dtype)
+    timings["preprocess"] = m
+    with measure("pca + neighbors", verbose=False, reset_peak=True) as m:
+        compute_embedding(adata, n_neighbors=5, n_pcs=30)
+    timings["pca + neighbors"] = m
+    params = runner.DEFAULT_PARAMS
+    with measure("rank_genes_groups", verbose=False, reset_peak=True) as m:
+        out["rank_genes_groups"] = runner.run_rank_genes(adata, params["deg"])["names"].tolist()
+    timings["rank_genes_groups"] = m
+    with measure("welch", verbose=False, reset_peak=True) as m:
+        welch = runner.calculate_deg_scanpy_df(runner.expr_frame(adata), adata.obs)
+        #ranked on the raw p-value with a gene tie-break: BH FDR has many ties, their order is not a result
+        out["welch"] = welch.sort_values(["pval", "gene"], kind="mergesort")["gene"].tolist()
+    timings["welch"] = m
+    with measure("celltype_deg", verbose=False, reset_peak=True) as m:
+        ct = runner.run_celltype_deg(adata, {**params["celltype_deg"], "methods": ["welch"], "n_jobs": 1})
+        out["celltype_deg"] = ct.sort_values(["contrast", "scores", "gene"], ascending=[False, False, True],
+                                             kind="mergesort")["gene"].tolist()
+    timings["celltype_deg"] = m
+    return {"rankings": out, "timings": timings, "x_mb": adata.X.data.nbytes / 1024 ** 2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=20000)
+    parser.add_argument("--genes", type=int, default=5000)
+    parser.add_argument("--density", type=float, default=0.05)
+    parser.add_argument("--top", type=int, default=100)
+    args = parser.parse_args()
+
+    meta_df = make_covariates(args.cells)
+    X = make_counts(args.cells, args.genes, args.density, meta_df=meta_df)
+    genes = [f"GENE{j}" for j in range(args.genes)]
+    results = {dtype: run(X, meta_df, genes, dtype) for dtype in ("float64", "float32")}
+
+    print(f"{args.cells} cells x {args.genes} genes, density {args.density}")
+    print(f"  X after preprocessing: float64 {results['float64']['x_mb']:.0f} MB, "
+          f"float32 {results['float32']['x_mb']:.0f} MB")
+    print(f"  {'stage':20s} {'f64 s':>8s} {'f32 s':>8s} {'f64 MB':>8s} {'f32 MB':>8s}")
+    for stage, old in results["float64"]["timings"].items():
+        new = results["float32"]["timings"][stage]
+        print(f"  {stage:20s} {old['seconds']:8.2f} {new['seconds']:8.2f} "
+              f"{old['peak_rss_mb']:8.1f} {new['peak_rss_mb']:8.1f}")
+
+    failed = []
+    for name, ref in results["float64"]["rankings"].items():
+        got = results["float32"]["rankings"][name]
+        position = {g: i for i, g in enumerate(got)}
+        rho = spearmanr(np.arange(len(ref)), [position.get(g, len(got)) for g in ref])[0]
+        same_top = ref[:args.top] == got[:args.top]
+        print(f"  {name:20s} top {args.top} identical: {same_top}, Spearman {rho:.6f}")
+        if not same_top or rho < 0.999:
+            failed.append(name)
+    if failed:
+        raise SystemExit(f"DEG ranking changed at float32: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: pseudobulk aggregation of cell-level counts by sample x cell type.
+previous approach = pandas groupby over the covariates + one row-slice sum per group (the offline scripts);
+pipeline.pseudobulk.pseudobulk = one indicator-matrix x CSR product.
+Also reports the DEG input shrink (cells x genes -> profiles x genes) and a Welch DEG on the profiles.
+
+Run from server/:
+    python -m benchmarks.bench_pseudobulk --cells 100000 --genes 5000 --samples 24
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from benchmarks.synthetic import make_counts, make_covariates
+from pipeline.deg import welch_deg_table
+from pipeline.pseudobulk import pseudobulk
+
+
+def make_cell_covariates(n_cells: int, n_samples: int, seed: int = 0) -> pd.DataFrame:
+    """Cell-level covariates: every cell belongs to a sample, the condition is the sample's"""
+    rng = np.random.default_rng(seed)
+    meta_df = make_covariates(n_cells, seed)
+    sample = rng.integers(0, n_samples, n_cells)
+    cond = np.where(sample < n_samples // 2, "AD", "CT")
+    meta_df["oupSample.sampleID"] = [f"{c}{s}" for c, s in zip(cond, sample)]
+    meta_df["oupSample.batchCond"] = cond
+    meta_df["oupSample.cellType_batchCond"] = meta_df["oupSample.cellType"] + "_" + cond
+    return meta_df
+
+
+def groupby_loop(X, meta_df: pd.DataFrame, by: list, min_cells: int):
+    rows, names = [], []
+    for key, idx in meta_df.groupby(by, sort=False).indices.items():
+        if len(idx) >= min_cells:
+            rows.append(np.asarray(X[idx].sum(axis=0)).ravel())
+            names.append("_".join(key))
+    return pd.DataFrame(np.vstack(rows), index=names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=100000)
+    parser.add_argument("--genes", type=int, default=5000)
+    parser.add_argument("--density", type=float, default=0.05)
+    parser.add_argument("--samples", type=int, default=24)
+    parser.add_argument("--min-cells", type=int, default=10)
+    args = parser.parse_args()
+
+    meta_df = make_cell_covariates(args.cells, args.samples)
+    X = make_counts(args.cells, args.genes, args.density, meta_df=meta_df)
+    by = ["oupSample.sampleID", "oupSample.cellType"]
+
+    t0 = time.perf_counter()
+    ref = groupby_loop(X, meta_df, by, args.min_cells)
+    loop_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    counts, obs = pseudobulk(X, meta_df, *by, min_cells=args.min_cells)
+    product_seconds = time.perf_counter() - t0
+    assert np.allclose(ref.loc[obs.index].to_numpy(), counts.toarray()), "aggregates differ"
+
+    is_ad = (obs["oupSample.batchCond"] == "AD").to_numpy()
+    t0 = time.perf_counter()
+    deg = welch_deg_table(sparse.csr_matrix(counts), np.arange(args.genes), is_ad, ~is_ad)
+    deg_seconds = time.perf_counter() - t0
+
+    print(f"{args.cells} cells x {args.genes} genes ({X.nnz} non-zeros), {args.samples} samples")
+    print(f"  groupby + row-slice sums   {loop_seconds:8.2f} s")
+    print(f"  indicator-matrix product   {product_seconds:8.2f} s   ({loop_seconds / product_seconds:.1f}x)")
+    print(f"  DEG input {X.shape} -> {counts.shape}, Welch on the profiles {deg_seconds:.2f} s, "
+          f"{int((deg['FDR'] < 0.05).sum())} genes at FDR < 0.05")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: trying several Leiden resolutions.
+previous approach = one full re-run per resolution (neighbors + UMAP + sc.tl.leiden);
+sweep = pipeline.clustering.leiden_sweep on the one cached graph, inline and in a forked process pool.
+
+Run from server/:
+    python -m benchmarks.bench_sweep --cells 50000 --genes 2000 --jobs 4
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import scanpy as sc
+from sklearn.metrics import adjusted_rand_score
+
+from benchmarks.bench_embedding import make_adata
+from pipeline.clustering import leiden_sweep
+from pipeline.embedding import compute_embedding
+
+RESOLUTIONS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0)
+
+
+def rerun_loop(adata, n_neighbors: int, n_pcs: int) -> dict:
+    out = {}
+    for r in RESOLUTIONS:
+        for key in ("connectivities", "distances"):
+            adata.obsp.pop(key, None)
+        adata.uns.pop("neighbors", None)
+        adata.obsm.pop("X_umap", None)
+        compute_embedding(adata, n_neighbors=n_neighbors, n_pcs=n_pcs)
+        sc.tl.leiden(adata, resolution=r, flavor="igraph", directed=False, n_iterations=2, random_state=0)
+        out[r] = adata.obs["leiden"].astype(int).to_numpy()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=20000)
+    parser.add_argument("--genes", type=int, default=2000)
+    parser.add_argument("--density", type=float, default=0.1)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    adata = make_adata(args.cells, args.genes, args.density)
+    timings = {}
+    t0 = time.perf_counter()
+    ref = rerun_loop(adata, n_neighbors=5, n_pcs=30)
+    timings[f"re-run per resolution ({len(RESOLUTIONS)} x 1 seed)"] = time.perf_counter() - t0
+
+    results = {}
+    for n_jobs in sorted({1, args.jobs}):
+        t0 = time.perf_counter()
+        results[n_jobs] = leiden_sweep(adata.obsp["connectivities"], RESOLUTIONS, seeds=args.seeds, n_jobs=n_jobs)
+        timings[f"sweep ({len(RESOLUTIONS)} x {args.seeds} seeds), n_jobs={n_jobs}"] = time.perf_counter() - t0
+
+    summary, labels = results[args.jobs]
+    assert summary.equals(results[1][0]), "pool and inline sweeps differ"
+    agreement = min(adjusted_rand_score(ref[r], labels[f"leiden_{r:g}"]) for r in RESOLUTIONS)
+
+    print(f"{args.cells} cells x {args.genes} genes, {os.cpu_count()} CPUs")
+    for name, seconds in timings.items():
+        print(f"  {name:45s} {seconds:8.2f} s")
+    print(summary.to_string(index=False))
+    print(f"  min ARI vs sc.tl.leiden on the same graph = {agreement:.3f}; "
+          f"mean seed ARI = {np.nanmean(summary['seed_ari']):.3f}")
+
+
+if __name__ == "__main__":
+    main()
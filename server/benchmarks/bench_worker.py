@@ -0,0 +1,68 @@
+"""
+Benchmark: cold start (fresh python per job, previous /run behaviour) vs warm worker pool.
+
+Run from server/:
+    python -m benchmarks.bench_worker --runs 3
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import write_dataset
+from pipeline.worker import WorkerPool
+
+
+def write_job(job_dir: Path, n_cells: int = 120, n_genes: int = 800) -> Path:
+    """Small synthetic job: data/bench__expr.csv (genes x samples) + data/bench__cov.csv"""
+    write_dataset(job_dir / "data", n_cells, n_genes, density=0.5, prefix="bench")
+    return job_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    server_dir = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory() as tmp:
+        job_dir = write_job(Path(tmp) / "job")
+
+        # --- 1. import cost alone ---
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import pipeline.runner"], cwd=server_dir, check=True)
+        t_import = time.perf_counter() - t0
+
+        # --- 2. cold: new interpreter per job ---
+        cold = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "pipeline.runner", "--job-dir", str(job_dir)],
+                           cwd=server_dir, check=True, capture_output=True)
+            cold.append(time.perf_counter() - t0)
+
+        # --- 3. warm: one pre-imported worker, fork per job ---
+        pool = WorkerPool(size=1)
+        pool.start()
+        pool.wait_ready()
+        warm = []
+        for i in range(args.runs):
+            t0 = time.perf_counter()
+            pool.run(f"bench{i}", job_dir)
+            warm.append(time.perf_counter() - t0)
+        pool.shutdown()
+
+    print(f"import pipeline.runner (fresh interpreter): {t_import:7.2f} s")
+    print(f"worker warm-up (paid once at server start) : {pool.startup_seconds[0]:7.2f} s")
+    print(f"cold job latency  median of {args.runs}: {np.median(cold):7.2f} s  {['%.2f' % t for t in cold]}")
+    print(f"warm job latency  median of {args.runs}: {np.median(warm):7.2f} s  {['%.2f' % t for t in warm]}")
+    print(f"saved per job: {np.median(cold) - np.median(warm):7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Compare two run_stages reports stage by stage.
+
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import argparse
+import json
+
+
+def index(report: dict) -> dict:
+    return {(r["cells"], r["genes"], r["density"], r["stage"]): r
+            for r in report["records"] if "seconds" in r and "error" not in r}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    a, b = index(old), index(new)
+
+    print(f"{old['commit']} ({old.get('dtype', 'float64')}) -> {new['commit']} ({new.get('dtype', 'float64')})")
+    print(f"{'cells':>7} {'genes':>6} {'dens':>5} {'stage':28s} {'old s':>8} {'new s':>8} {'x':>6} "
+          f"{'old MB':>8} {'new MB':>8}")
+    for key in sorted(a.keys() & b.keys()):
+        ra, rb = a[key], b[key]
+        speedup = ra["seconds"] / rb["seconds"] if rb["seconds"] else float("inf")
+        print(f"{key[0]:>7} {key[1]:>6} {key[2]:>5} {key[3]:28s} {ra['seconds']:8.2f} {rb['seconds']:8.2f} "
+              f"{speedup:6.2f} {ra['peak_rss_mb']:8.1f} {rb['peak_rss_mb']:8.1f}")
+    for key in sorted(a.keys() ^ b.keys()):
+        print(f"  only in {'old' if key in a else 'new'}: {key}")
+
+
+if __name__ == "__main__":
+    main()
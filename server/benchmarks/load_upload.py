@@ -0,0 +1,97 @@
+"""
+Load test: does the API stay responsive while large uploads and resets are in flight?
+Probes GET /health every --probe-ms while N concurrent /upload requests (then their /reset) run,
+and reports probe latency at idle, during uploads and during resets.
+
+Start the server first, then run from server/:
+    python -m benchmarks.load_upload --url http://localhost:8000 --uploads 4 --cells 20000 --genes 5000
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from benchmarks.synthetic import write_dataset
+
+
+class Prober:
+    """Background thread timing GET /health, latencies grouped by the current phase"""
+
+    def __init__(self, url: str, interval: float):
+        self.url, self.interval = url, interval
+        self.phase = "idle"
+        self.latencies: dict[str, list[float]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        with httpx.Client(base_url=self.url, timeout=60) as client:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                client.get("/health").raise_for_status()
+                self.latencies.setdefault(self.phase, []).append((time.perf_counter() - t0) * 1000)
+                self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def upload(url: str, expr_path: Path, cov_path: Path) -> str:
+    with httpx.Client(base_url=url, timeout=None) as client, \
+            open(expr_path, "rb") as expr, open(cov_path, "rb") as cov:
+        res = client.post("/upload", files={"expression_matrix": (expr_path.name, expr),
+                                            "covariate_table": (cov_path.name, cov)})
+        res.raise_for_status()
+        return res.json()["job_id"]
+
+
+def reset(url: str, job_id: str) -> None:
+    httpx.post(f"{url}/reset", params={"job_id": job_id}, timeout=None).raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--uploads", type=int, default=4, help="concurrent uploads")
+    parser.add_argument("--cells", type=int, default=20000)
+    parser.add_argument("--genes", type=int, default=5000)
+    parser.add_argument("--probe-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        expr_path, cov_path, _, _ = write_dataset(Path(tmp), args.cells, args.genes)
+        size_mb = expr_path.stat().st_size / 1024 ** 2
+
+        with Prober(args.url, args.probe_ms / 1000) as prober, \
+                ThreadPoolExecutor(max_workers=args.uploads) as pool:
+            time.sleep(1.0)
+            prober.phase = "uploads"
+            t0 = time.perf_counter()
+            job_ids = list(pool.map(lambda _: upload(args.url, expr_path, cov_path), range(args.uploads)))
+            upload_seconds = time.perf_counter() - t0
+            prober.phase = "resets"
+            list(pool.map(lambda job_id: reset(args.url, job_id), job_ids))
+            prober.phase = "idle after"
+            time.sleep(0.5)
+
+    print(f"{args.uploads} concurrent uploads of {size_mb:.0f} MB in {upload_seconds:.1f} s, then /reset of each")
+    print(f"  {'phase':12s} {'probes':>6s} {'p50 ms':>8s} {'p95 ms':>8s} {'max ms':>8s}")
+    for phase, values in prober.latencies.items():
+        values = sorted(values)
+        p95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+        print(f"  {phase:12s} {len(values):6d} {statistics.median(values):8.1f} {p95:8.1f} {values[-1]:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
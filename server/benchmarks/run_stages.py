@@ -0,0 +1,178 @@
+"""
+Per-stage time + memory benchmark of pipeline/runner.py on synthetic data.
+
+Run from server/:
+    python -m benchmarks.run_stages --preset small
+    python -m benchmarks.run_stages --cells 500 20000 --genes 2000 30000 --density 0.05
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+    precision savings: the same configs with --dtype float64 and --dtype float32 (default), then compare
+
+Writes benchmarks/results/<commit>_<timestamp>.json: one record per (config, stage) with
+seconds, cpu_seconds, peak_rss_mb (per stage, VmHWM reset before each stage), rss before/after.
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+from benchmarks.synthetic import make_counts, make_covariates, write_dataset
+from pipeline import runner
+from pipeline.ingest import build_expression_cache, load_expression_cache
+from pipeline.profiling import measure
+
+PRESETS = {
+    "small": {"cells": [500, 5000], "genes": [2000], "density": [0.1]},
+    "full": {"cells": [500, 10000, 50000, 200000], "genes": [2000, 30000], "density": [0.02, 0.1]},
+}
+RESULT_DIR = Path(__file__).parent / "results"
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class StageRecorder:
+    def __init__(self, config: dict):
+        self.config = config
+        self.records = []
+
+    def run(self, stage: str, fn, skip_reason: str | None = None):
+        """Time fn() as one stage, keep going if it fails"""
+        record = {**self.config, "stage": stage}
+        if skip_reason:
+            record["skipped"] = skip_reason
+            self.records.append(record)
+            print(f"  {stage:28s} skipped ({skip_reason})")
+            return None
+        gc.collect()
+        result = None
+        try:
+            with measure(stage, verbose=False, reset_peak=True) as m:
+                result = fn()
+        except Exception as e:
+            m["error"] = f"{type(e).__name__}: {e}"
+        record.update({k: v for k, v in m.items() if k != "stage"})
+        self.records.append(record)
+        status = m.get("error", f"{m['seconds']:8.2f}s  peak {m['peak_rss_mb']:8.1f} MB")
+        print(f"  {stage:28s} {status}")
+        return result
+
+
+def bench_config(n_cells: int, n_genes: int, density: float, workdir: Path, args) -> list:
+    config = {"cells": n_cells, "genes": n_genes, "density": density}
+    print(f"cells={n_cells} genes={n_genes} density={density}")
+    rec = StageRecorder(config)
+    dense_bytes = n_cells * n_genes * 8
+    too_dense = f"dense matrix {dense_bytes / 1e9:.1f} GB > --max-dense-gb" \
+        if dense_bytes > args.max_dense_gb * 1e9 else None
+
+    # --- data ---
+    data_dir = workdir / f"{n_cells}x{n_genes}_{density}"
+    if too_dense is None:
+        expr_path, cov_path, X, meta_df = write_dataset(data_dir, n_cells, n_genes, density)
+    else:  # CSV would be too big to write/parse: start the pipeline from the in-memory CSR
+        meta_df = make_covariates(n_cells)
+        X = make_counts(n_cells, n_genes, density, meta_df=meta_df)
+        expr_path = cov_path = None
+
+    # --- load_* (CSV parse) + binary ingest cache ---
+    rec.run("load_expression_data", lambda: runner.load_expression_data(expr_path, args.dtype), too_dense)
+    rec.run("load_metadata", lambda: runner.load_metadata(cov_path), too_dense)
+    cache_dir = rec.run("ingest", lambda: build_expression_cache(expr_path, workdir / "cache"), too_dense)
+    loaded = rec.run("load_expression_cache", lambda: load_expression_cache(cache_dir),
+                     None if cache_dir is not None else "no ingest cache")
+    if loaded is not None:
+        X, obs_names, var_names = loaded
+    else:
+        obs_names, var_names = meta_df.index, [f"GENE{j}" for j in range(n_genes)]
+
+    # --- preprocessing ---
+    out = rec.run("scanpy_preprocess", lambda: runner.scanpy_preprocess_matrix(
+        X, obs_names, var_names, meta_df, dtype=args.dtype))
+    if out is None:
+        return rec.records
+    adata = out[2]
+    del X, out
+
+    # --- neighbors / UMAP / Leiden, rank_genes_groups, Welch DEG ---
+    params = runner.DEFAULT_PARAMS
+    rec.run("neighbors_umap_leiden", lambda: runner.run_embedding(adata, params["embedding"]))
+    sweep = params["sweep"]
+    rec.run("leiden_sweep", lambda: runner.leiden_sweep(
+        adata.obsp["connectivities"], sweep["resolutions"], sweep["seeds"], sweep["n_iterations"]),
+        None if "connectivities" in adata.obsp else "no neighbour graph")
+    deg_df = rec.run("rank_genes_groups", lambda: runner.run_rank_genes(adata, params["deg"]))
+    rec.run("calculate_deg_scanpy_df", lambda: runner.calculate_deg_scanpy_df(
+        runner.expr_frame(adata), adata.obs), too_dense)
+
+    # --- plots ---
+    plot_dir = workdir / "plots"
+    plot_dir.mkdir(exist_ok=True)
+    dpi = params["plots"]["dpi"]
+    rec.run("plot_umap_explorative", lambda: runner.plot_umap_explorative(
+        adata, plot_dir / "umap.png", dpi=dpi), None if "X_umap" in adata.obsm else "no embedding")
+    if deg_df is not None:
+        top_up, top_down = runner.top_up_down(deg_df, params["plots"]["top_n"])
+        top_genes = list(top_up["names"]) + list(top_down["names"])
+        rec.run("plot_heatmap", lambda: runner.plot_heatmap(adata, top_genes, plot_dir / "heatmap.png", dpi=dpi))
+        rec.run("plot_volcano", lambda: runner.plot_volcano(deg_df.copy(), plot_dir / "volcano.png", dpi=dpi))
+    rec.run("render_plots_preview", lambda: runner.render_plots(adata, deg_df, params["plots"]),
+            None if deg_df is not None and "X_umap" in adata.obsm else "no DEG table / embedding")
+    rec.run("plot_umap", lambda: runner.plot_umap(
+        adata, "oupSample.batchCond", output_path=plot_dir / "umap_seaborn.png"))
+    return rec.records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=PRESETS, default=None)
+    parser.add_argument("--cells", type=int, nargs="+", default=[500])
+    parser.add_argument("--genes", type=int, nargs="+", default=[2000])
+    parser.add_argument("--density", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--max-dense-gb", type=float, default=2.0,
+                        help="skip CSV/dense-only stages above this dense float64 size")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float32",
+                        help="precision of X from preprocessing on (runner.DEFAULT_PARAMS['preprocess'])")
+    parser.add_argument("--out", type=Path, default=None)
+    args = parser.parse_args()
+    if args.preset:
+        for key, values in PRESETS[args.preset].items():
+            setattr(args, key, values)
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_cells, n_genes, density in itertools.product(args.cells, args.genes, args.density):
+            records += bench_config(n_cells, n_genes, density, Path(tmp), args)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dtype": args.dtype,
+        "host": {"platform": platform.platform(), "python": platform.python_version(),
+                 "cpus": os.cpu_count()},
+        "records": records,
+    }
+    out = args.out or RESULT_DIR / f"{commit}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=1))
+    print(f"Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Synthetic count matrices + covariate tables shaped like the uploads the pipeline expects.
+
+- counts: cells x genes CSR (int-valued float32), negative-binomial values on a
+  per-gene detection probability, so the QC filters and DEG have something to do
+- covariates: oupSample.batchCond (AD/CT), oupSample.cellType, oupSample.cellType_batchCond
+- AD cells get a boosted detection rate on a small set of genes (real DE signal)
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+CELL_TYPES = ["astro", "neuron", "oligo", "micro", "OPC"]
+BLOCK_CELLS = 2000
+
+
+def make_covariates(n_cells: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    cond = rng.choice(["AD", "CT"], n_cells)
+    cell_type = rng.choice(CELL_TYPES, n_cells, p=[0.3, 0.25, 0.25, 0.1, 0.1])
+    return pd.DataFrame({
+        "oupSample.batchCond": cond,
+        "oupSample.cellType": cell_type,
+        "oupSample.cellType_batchCond": [f"{c}_{b}" for c, b in zip(cell_type, cond)],
+    }, index=pd.Index([f"cell{i}" for i in range(n_cells)], name="sampleID"))
+
+
+def make_counts(n_cells: int, n_genes: int, density: float = 0.1,
+                meta_df: pd.DataFrame | None = None, de_fraction: float = 0.02,
+                seed: int = 0) -> sparse.csr_matrix:
+    """cells x genes counts with roughly `density` non-zeros, generated block by block"""
+    rng = np.random.default_rng(seed)
+    meta_df = meta_df if meta_df is not None else make_covariates(n_cells, seed)
+    is_ad = (meta_df["oupSample.batchCond"] == "AD").to_numpy()
+
+    # per-gene detection probability with mean ~ density (some genes common, most rare)
+    p_gene = rng.beta(0.5, 0.5 / density - 0.5, n_genes).astype(np.float32)
+    de_genes = rng.choice(n_genes, max(1, int(de_fraction * n_genes)), replace=False)
+    p_ad = p_gene.copy()
+    p_ad[de_genes] = np.minimum(p_ad[de_genes] * 3 + 0.05, 0.95)
+
+    blocks = []
+    for start in range(0, n_cells, BLOCK_CELLS):
+        stop = min(start + BLOCK_CELLS, n_cells)
+        p = np.where(is_ad[start:stop, None], p_ad[None, :], p_gene[None, :])
+        hit = rng.random((stop - start, n_genes), dtype=np.float32) < p
+        rows, cols = np.nonzero(hit)
+        values = (1 + rng.negative_binomial(1, 0.3, rows.size)).astype(np.float32)
+        blocks.append(sparse.csr_matrix((values, (rows, cols)), shape=(stop - start, n_genes)))
+    return sparse.vstack(blocks, format="csr")
+
+
+def write_dataset(out_dir: Path, n_cells: int, n_genes: int, density: float = 0.1,
+                  seed: int = 0, prefix: str = "synthetic"):
+    """
+    Upload-format files: <prefix>__expr.csv (genes x cells) + <prefix>__cov.csv.
+    Returns (expr_path, cov_path, counts cells x genes CSR, covariates)
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    meta_df = make_covariates(n_cells, seed)
+    X = make_counts(n_cells, n_genes, density, meta_df=meta_df, seed=seed)
+    genes = np.array([f"GENE{j}" for j in range(n_genes)])
+
+    expr_path = out_dir / f"{prefix}__expr.csv"
+    G = X.T.tocsr()  # genes x cells, written in row blocks
+    with open(expr_path, "w") as f:
+        f.write("," + ",".join(meta_df.index) + "\n")
+        for start in range(0, n_genes, 1000):
+            block = G[start:start + 1000].toarray().astype(np.int64)
+            pd.DataFrame(block, index=genes[start:start + 1000]).to_csv(f, header=False)
+    cov_path = out_dir / f"{prefix}__cov.csv"
+    meta_df.to_csv(cov_path)
+    return expr_path, cov_path, X, meta_df
@@ -0,0 +1,235 @@
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from resources import Resources, available_memory
+
+
+#? Job subsystem: one workspace per upload, admission-controlled pool of pipeline runs
+##jobs/<job_id>/data     <- uploaded expression + covariate files
+##jobs/<job_id>/results  <- pipeline outputs (served under /results/<job_id>/)
+##jobs/.trash/           <- removed workspaces: renamed here at once, deleted by a background thread
+##admission: FIFO queue, the head job starts once its Resources (memory cap + cpus) fit next to the running
+##ones inside the host capacity and the host has that much memory available; a job too big for the host
+##still runs, alone
+##background work (the full-resolution figure render) queues the same way but leaves job.state alone:
+##the job is already "done", job.background tracks it (queued / processing / None)
+
+TRASH_DIR = ".trash"
+
+
+@dataclass
+class Job:
+    job_id: str
+    job_dir: Path
+    state: str = "idle"          # idle / queued / processing / done / error
+    error: str | None = None
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    resources: Resources | None = None   # reserved while queued / processing
+    background: str | None = None        # queued / processing while follow-up work runs on a finished job
+
+    @property
+    def data_dir(self) -> Path:
+        return self.job_dir / "data"
+
+    @property
+    def result_dir(self) -> Path:
+        return self.job_dir / "results"
+
+
+class JobManager:
+    """Registry of jobs + an admission-controlled worker pool that runs them"""
+
+    def __init__(self, jobs_dir: Path, max_workers: int = 2, capacity: Resources | None = None):
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.max_workers = max_workers
+        self.capacity = capacity  # None = count limit only
+        self._queue: list[tuple[Job, object, bool]] = []  # (job, fn, background) waiting for admission, FIFO
+        self._running: dict[tuple[str, bool], Resources | None] = {}  # (job_id, background) -> reservation
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix="pipeline")
+        self.listeners = []  # fn(job), called on every state change (from the pool threads too)
+        #deferred deletion: one thread empties jobs/.trash, the caller only pays for a rename
+        self._trash = self.jobs_dir / TRASH_DIR
+        self._trash.mkdir(exist_ok=True)
+        self._gc = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trash-gc")
+        for path in self._trash.iterdir():  # left over from before a restart
+            self._gc.submit(shutil.rmtree, path, True)
+
+    def discard(self, path: Path) -> None:
+        """Move a file / directory out of the way now, delete it in the background"""
+        target = self._trash / uuid.uuid4().hex
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return
+        self._gc.submit(shutil.rmtree if target.is_dir() else os.unlink, target)
+
+    def _changed(self, job: Job) -> None:
+        for fn in self.listeners:
+            fn(job)
+
+    def create(self) -> Job:
+        """New job with an empty workspace"""
+        job_id = uuid.uuid4().hex
+        job = Job(job_id=job_id, job_dir=self.jobs_dir / job_id)
+        job.data_dir.mkdir(parents=True, exist_ok=True)
+        job.result_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            # workspace left over from before a restart: re-register it as idle
+            job_dir = self.jobs_dir / job_id
+            if job_id.isalnum() and job_dir.is_dir():
+                job = Job(job_id=job_id, job_dir=job_dir)
+                if (job.result_dir / "completed.flag").exists():
+                    job.state = "done"
+                with self._lock:
+                    job = self._jobs.setdefault(job_id, job)
+        return job
+
+    def submit(self, job: Job, fn, resources: Resources | None = None) -> None:
+        """Queue fn(job), it starts once the admission check lets it"""
+        with self._lock:
+            if job.state in ("queued", "processing"):
+                raise RuntimeError(f"Job {job.job_id} is already {job.state}")
+            if job.background is not None:
+                raise RuntimeError(f"Job {job.job_id} is still rendering figures")
+            job.state = "queued"
+            job.error = None
+            job.resources = resources
+            self._queue.append((job, fn, False))
+        self._changed(job)
+        self._dispatch()
+
+    def submit_background(self, job: Job, fn, resources: Resources | None = None) -> None:
+        """Queue follow-up work fn(job) on a job, same admission check, job.state untouched"""
+        with self._lock:
+            if job.background is not None:
+                raise RuntimeError(f"Job {job.job_id} already has background work {job.background}")
+            job.background = "queued"
+            self._queue.append((job, fn, True))
+        self._changed(job)
+        self._dispatch()
+
+    def _admissible(self, resources: Resources | None) -> bool:
+        if not self._running:
+            return True  # never leave the host idle, even for a job bigger than the capacity
+        if len(self._running) >= self.max_workers:
+            return False
+        if self.capacity is None or resources is None:
+            return True
+        reserved = sum((r for r in self._running.values() if r is not None), Resources(0, 0))
+        if not (reserved + resources).fits(self.capacity):
+            return False
+        free = available_memory()
+        return free is None or resources.memory <= free
+
+    def _dispatch(self) -> None:
+        """Start queued jobs from the head while they fit, then tell the rest their new position"""
+        started = []
+        with self._lock:
+            while self._queue and self._admissible(self._queue[0][0].resources):
+                job, fn, background = self._queue.pop(0)
+                self._running[(job.job_id, background)] = job.resources
+                started.append((job, fn, background))
+            waiting = [job for job, _, _ in self._queue] if started else []
+        for job, fn, background in started:
+            self._pool.submit(self._run_background if background else self._run, job, fn)
+        for job in waiting:
+            self._changed(job)
+
+    def queue_position(self, job_id: str) -> int | None:
+        """1 = next to start, None = not queued"""
+        with self._lock:
+            for i, (job, _, background) in enumerate(self._queue):
+                if job.job_id == job_id and not background:
+                    return i + 1
+        return None
+
+    def usage(self) -> dict:
+        """Reserved vs total capacity + queue length, for /metrics"""
+        with self._lock:
+            reserved = sum((r for r in self._running.values() if r is not None), Resources(0, 0))
+            return {"running": len(self._running), "queued": len(self._queue),
+                    "reserved": reserved, "capacity": self.capacity}
+
+    def _run(self, job: Job, fn) -> None:
+        job.state = "processing"
+        job.started = time.time()
+        job.finished = None
+        self._changed(job)
+        try:
+            fn(job)
+            job.state = "done"
+        except Exception as e:
+            job.state = "error"
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._running.pop((job.job_id, False), None)
+            self._changed(job)
+            self._dispatch()
+
+    def _run_background(self, job: Job, fn) -> None:
+        job.background = "processing"
+        self._changed(job)
+        try:
+            fn(job)
+        except Exception as e:
+            print(f"Background work of job {job.job_id} failed: {e}", file=sys.stderr)  # the previews stay published
+        finally:
+            job.background = None
+            with self._lock:
+                self._running.pop((job.job_id, True), None)
+            self._changed(job)
+            self._dispatch()
+
+    def state_counts(self) -> dict[str, int]:
+        """Number of registered jobs per state"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.state] = counts.get(job.state, 0) + 1
+        return counts
+
+    def remove(self, job_id: str) -> bool:
+        """Drop a job and its workspace (refuses while it is running)"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job.state in ("queued", "processing"):
+            raise RuntimeError(f"Job {job_id} is still {job.state}")
+        if job.background is not None:
+            raise RuntimeError(f"Job {job_id} is still rendering figures")
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self.discard(job.job_dir)
+        return True
+
+    def clear(self) -> None:
+        """Drop every idle/finished job and its workspace"""
+        with self._lock:
+            busy = {j for j, job in self._jobs.items()
+                    if job.state in ("queued", "processing") or job.background is not None}
+            self._jobs = {j: job for j, job in self._jobs.items() if j in busy}
+        for path in self.jobs_dir.iterdir():
+            if path.name not in busy and path.name != TRASH_DIR:
+                self.discard(path)
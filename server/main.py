@@ -1,19 +1,36 @@
+import asyncio
+import json
+import mimetypes
 import os
-import shutil
 import subprocess
 import sys
-import threading
 import time
 from pathlib import Path  # dir path
-from typing import List  # List, response model
+from typing import Annotated, List  # List, response model
 from urllib.parse import quote
 
-from fastapi import (BackgroundTasks, FastAPI, File, HTTPException, Query,
-                     UploadFile)
+from fastapi import (BackgroundTasks, FastAPI, HTTPException, Query, Request,
+                     Response)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from fastapi.responses import (FileResponse, PlainTextResponse,
+                               StreamingResponse)
+from pydantic import BaseModel, Field
+
+from jobs import Job, JobManager
+from pipeline.artifacts import (bundle_etag, is_current, read_artifacts,
+                                 stream_zip)
+from pipeline.deg_store import (DEG_DB, SORT_COLUMNS, list_deg_tables,
+                                 query_deg)
+from pipeline.export import MANIFEST, VIZ_DIR
+from pipeline.ingest import ingest
+from pipeline.telemetry import StageStats, read_events, stage_table
+from pipeline.worker import WorkerPool, parse_size
+from preflight import PREFLIGHT_FILE, PreflightError, preflight
+from resources import (Resources, estimate_resources, host_capacity,
+                       scan_expression)
+from status_feed import StatusHub
+from storage import StorageManager
+from uploads import UploadError, UploadTooLarge, save_form_files
 
 #? FASTAPI Object
 app = FastAPI()
@@ -44,22 +61,32 @@ app.add_middleware(
 
 
 #? essential dirs
-# UPLOAD_DIR = Path("./data") #upload dir
-UPLOAD_DIR = Path("/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server/data") #!AWS EC2
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True) #auto make a dir if not exist
-DATA_DIR = UPLOAD_DIR
-
-# RESULT_DIR = Path("./results")
-RESULT_DIR = Path("/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server/results") #!AWS EC2
-RESULT_DIR.mkdir(parents=True, exist_ok=True)
-
-# mount to drive
-# after you create app = FastAPI()
-# then the files would be availabel in React FE
-app.mount(
-  "/results",
-  StaticFiles(directory=str(RESULT_DIR)),
-  name="results"
+# SERVER_DIR = Path(".")
+SERVER_DIR = Path("/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server") #!AWS EC2
+# JOBS_DIR = Path("./jobs") #one workspace per job: jobs/<job_id>/{data,results}
+JOBS_DIR = SERVER_DIR / "jobs"
+JOBS_DIR.mkdir(parents=True, exist_ok=True) #auto make a dir if not exist
+#shared binary caches, same default as pipeline/runner.py
+CACHE_DIR = Path(os.environ.get("PIPELINE_CACHE_DIR", SERVER_DIR / "cache"))
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+#per-stage averages over finished runs -> ETA in /analysis + /metrics
+stage_stats = StageStats(CACHE_DIR / "stage_stats.json")
+
+#admission control: at most this many pipelines at the same time, and only while their estimated
+##memory + cpus fit the host capacity (PIPELINE_HOST_MEMORY / PIPELINE_HOST_CPUS, see resources.py)
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", "2"))
+jobs = JobManager(JOBS_DIR, max_workers=MAX_CONCURRENT_JOBS, capacity=host_capacity())
+
+#per uploaded file, 0 = no limit
+MAX_UPLOAD_SIZE = parse_size(os.environ.get("MAX_UPLOAD_SIZE", "2G"))
+
+#retention: idle workspaces expire after STORAGE_TTL_HOURS without a request, and jobs + caches are kept
+##under STORAGE_QUOTA (0 = no quota) by least-recently-used eviction, on a background thread (storage.py)
+storage = StorageManager(
+    jobs, CACHE_DIR,
+    ttl=float(os.environ.get("STORAGE_TTL_HOURS", "168")) * 3600,
+    quota=parse_size(os.environ.get("STORAGE_QUOTA", "20G")),
+    interval=float(os.environ.get("STORAGE_INTERVAL", "600")),
 )
 
 #file download if necessary, or jsut use webbrowser download
@@ -70,143 +97,264 @@ app.mount(
 def read_root():
     return {"msg": "Backend working"}
 
+
+def get_job_or_404(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    storage.touch(job_id) #last access, for the retention TTL / LRU
+    return job
+
+
+#background ingest: parse the uploaded CSVs once into the binary cache so /run can memory-map them
+def ingest_uploads(expr_path: Path, cov_path: Path, digests: dict):
+    try:
+        ingest(expr_path, cov_path, CACHE_DIR, digests)
+    except Exception as e:
+        #not fatal: the runner parses the CSV itself and reports the real error
+        print(f"Ingest failed for {expr_path.parent.parent.name}: {e}", file=sys.stderr)
+
+
 #ii. uplaod page - #!DONE
 @app.post("/upload")
-async def upload_two_files(
-    expression_matrix: UploadFile = File(...), #two file uploading entry form react front end
-    covariate_table: UploadFile = File(...)
-):
-    # print("Working dir:", os.getcwd())
-    # print("Saving to:", UPLOAD_DIR.resolve())
-    #i. store the expression_matrix, add a tag to uploaded 
-    expr_name = Path(expression_matrix.filename)
-    expr_saved_name = expr_name.stem + "__expr" + expr_name.suffix
-    save_expr_path = UPLOAD_DIR / expr_saved_name
-    with save_expr_path.open("wb") as buf1:
-        shutil.copyfileobj(expression_matrix.file, buf1)
-
-    #ii. store the covariate_table, add a tag to uploaded 
-    cov_name = Path(covariate_table.filename)
-    cov_saved_name = cov_name.stem + "__cov" + cov_name.suffix
-    save_cov_path = UPLOAD_DIR / cov_saved_name
-    with save_cov_path.open("wb") as buf2:
-        shutil.copyfileobj(covariate_table.file, buf2)
+async def upload_two_files(request: Request, background_tasks: BackgroundTasks):
+    #two file fields from the react front end: expression_matrix, covariate_table (multipart/form-data)
+    #each upload gets its own job + workspace, the job_id is used by /run, /analysis, /result-files
+    job = jobs.create()
+
+    #i. store the expression_matrix, ii. the covariate_table, add a tag to uploaded
+    def tagged(tag):
+        return lambda filename: job.data_dir / (Path(filename).stem + tag + Path(filename).suffix)
 
+    #body parsed as it arrives: each chunk hashed + written once, aborted at MAX_UPLOAD_SIZE (no temp spool)
+    try:
+        files = await save_form_files(request, {"expression_matrix": tagged("__expr"),
+                                                "covariate_table": tagged("__cov")}, MAX_UPLOAD_SIZE)
+    except (UploadTooLarge, UploadError) as e:
+        await asyncio.to_thread(jobs.remove, job.job_id)
+        raise HTTPException(status_code=413 if isinstance(e, UploadTooLarge) else 422, detail=str(e))
+    expr, cov = files["expression_matrix"], files["covariate_table"]
+    save_expr_path, save_cov_path = expr["path"], cov["path"]
+    expr_sha, cov_sha = expr["sha256"], cov["sha256"]
+
+    #pre-flight: headers, sample IDs, required columns, a sample of values (milliseconds, no scanpy)
+    ##bad inputs are rejected here instead of failing inside the runner; shape -> preflight.json for /run
+    try:
+        summary = await asyncio.to_thread(preflight, save_expr_path, save_cov_path, job.job_dir)
+    except PreflightError as e:
+        await asyncio.to_thread(jobs.remove, job.job_id)
+        raise HTTPException(status_code=422, detail=str(e))
+
+    digests = {"expression": expr_sha, "metadata": cov_sha}
+    storage.record_inputs(job.job_dir, digests) #ingest caches this job keeps alive
+    background_tasks.add_task(ingest_uploads, save_expr_path, save_cov_path, digests)
     return {
-        "expression_matrix": expression_matrix.filename,
-        "covariate_table": covariate_table.filename
+        "job_id": job.job_id,
+        "expression_matrix": expr["filename"],
+        "covariate_table": cov["filename"],
+        "shape": [summary["cells"], summary["genes"]],  # cells x genes
+        "warnings": summary["warnings"],
     }
 
 
-#result route: **when enter Home: perform reset of all data/ and result/
+#result route: **when enter Home: perform reset of the previous job
 ##then trigger this when React FE return
+##without job_id: one storage collection (expired / over-quota workspaces and caches), no longer a wipe
+##of everyone's jobs - the shared ingest caches stay, so re-uploading the same files skips the CSV parse
+##workspaces are renamed into jobs/.trash and deleted by a background thread, never on the event loop
 @app.post("/reset")
-async def reset_pipeline():
+async def reset_pipeline(job_id: str | None = None):
     try:
-        # Remove and recreate data directory: data/
-        if DATA_DIR.exists():
-            shutil.rmtree(DATA_DIR)
-        DATA_DIR.mkdir()
-
-        # Remove and recreate results directory: results/
-        if RESULT_DIR.exists():
-            shutil.rmtree(RESULT_DIR)
-        RESULT_DIR.mkdir()
-        return {"reset": True}
+        if job_id is not None:
+            return {"reset": await asyncio.to_thread(jobs.remove, job_id)}
+        return {"reset": True, **await asyncio.to_thread(storage.collect)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-FLAG_FILE = RESULT_DIR / 'completed.flag'
-# OUTPUT_PNG  = RESULT_DIR / 'mean_expression.png'
-
 #? Run and Status listening - pipeline
-# shared status
-status_store = {
-    "state": "idle",      # idle / processing / done / error
-    "error": None,         #error state
-}
-
 class RunResponse(BaseModel):
     success: bool
+    job_id: str
+
+class StageInfo(BaseModel):
+    stage: str
+    state: str            # running / done / error
+    seconds: float | None = None
+    cpu_seconds: float | None = None
+    peak_rss_mb: float | None = None
+    rows: int | None = None
+    cols: int | None = None
+    cached: bool | None = None
 
 class StatusResponse(BaseModel):
-    status: str
+    job_id: str
+    status: str           # idle / queued / processing / done / error
     error: str | None = None
+    stage: str | None = None              # stage running right now
+    stages: List[StageInfo] = []          # from jobs/<job_id>/events.jsonl, in run order
+    elapsed_seconds: float | None = None
+    eta_seconds: float | None = None      # from the per-stage averages of earlier runs
+    queue_position: int | None = None     # 1 = next to start, while queued
+    memory_max_mb: float | None = None    # memory cap of this run, from the upload's size
+    cpus: int | None = None
+    background: str | None = None         # queued / processing while the full-resolution figures render
+
+
+#? Pipeline execution mode
+##warm (default): long-lived workers import scanpy & co once, each job runs in a forked child capped at its estimate
+##cold: one systemd-run scope + fresh conda python per job (previous behaviour)
+CONDA_PYTHON = "/home/ubuntu/miniforge3/envs/transcp_webapp/bin/python" #conda env python
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "warm")
+PIPELINE_MEMORY_MAX = os.environ.get("PIPELINE_MEMORY_MAX", "3G") #per job: upper bound of the estimates
+worker_pool = WorkerPool(
+    size=MAX_CONCURRENT_JOBS,
+    memory_max=PIPELINE_MEMORY_MAX,
+    max_jobs_per_worker=int(os.environ.get("PIPELINE_WORKER_MAX_JOBS", "20")),
+    max_worker_rss=os.environ.get("PIPELINE_WORKER_MAX_RSS", "2G"),
+    python=CONDA_PYTHON if Path(CONDA_PYTHON).exists() else None,
+)
+
+@app.on_event("startup")
+def start_workers():
+    if PIPELINE_MODE == "warm":
+        worker_pool.start()
+    storage.start()
+
+@app.on_event("shutdown")
+def stop_workers():
+    if PIPELINE_MODE == "warm":
+        worker_pool.shutdown()
+    storage.stop()
+
 
+#pipeline function - task "pipeline" = runner.main, "sweep" = runner.sweep (Leiden resolution sweep),
+#"render" = runner.render (full-resolution + vector figures, after a run that published previews)
+RENDER_PENDING = ".render_pending" #same marker as pipeline/runner.py
 
-#pipeline function
-def pipeline_job():
+def pipeline_job(job: Job, task: str = "pipeline"):
     try:
-        status_store["state"] = "processing"
-        status_store["error"] = None
-
-        CONDA_PYTHON = "/home/ubuntu/miniforge3/envs/transcp_webapp/bin/python" #conda env python
-
-        #! pipeline execution
-        time.sleep(1)   
-        # subprocess.run(
-        #     # [sys.executable, "pipeline/runner.py"],
-        #     [CONDA_PYTHON, "/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server/pipeline/runner.py"],
-        #     # cwd=".",  # ensure runner.py sees the data folder
-        #     cwd="/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server/",
-        #     check=True,
-        #     capture_output=True,
-        #     text=True)
-        subprocess.run(
+        run_pipeline_process(job, task)
+    finally:
+        stage_stats.record(job_events(job)) #feed the ETA averages + /metrics, failed runs included
+    if task == "pipeline" and (job.result_dir / RENDER_PENDING).exists():
+        jobs.submit_background(job, lambda j: run_pipeline_process(j, "render"), job.resources)
+
+
+def run_pipeline_process(job: Job, task: str = "pipeline"):
+    memory_max = job.resources.memory if job.resources else parse_size(PIPELINE_MEMORY_MAX)
+    cpus = job.resources.cpus if job.resources else None
+    if PIPELINE_MODE == "warm":
+        worker_pool.run(job.job_id, job.job_dir, memory_max=memory_max, task=task, cpus=cpus)
+        return
+
+    #! pipeline execution - output kept in jobs/<job_id>/pipeline.log, render.log (same as the warm workers)
+    log_file = job.job_dir / ("render.log" if task == "render" else "pipeline.log")
+    with log_file.open("w") as log:
+        proc = subprocess.run(
         [
-            "systemd-run", "--scope", "-p", "MemoryMax=3G",
-            CONDA_PYTHON,
-            "/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server/pipeline/runner.py"
+            "systemd-run", "--scope", "-p", f"MemoryMax={memory_max}",
+            *(["-p", f"CPUQuota={cpus * 100}%", f"--setenv=PIPELINE_CPUS={cpus}"] if cpus else []),
+            CONDA_PYTHON, "-m", "pipeline.runner", #run as module: pipeline/ imports resolve from server/
+            "--job-dir", str(job.job_dir),
+            *([f"--{task}"] if task != "pipeline" else []),
         ],
-        cwd="/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server/",
-        check=True,
-        capture_output=True,
+        cwd=str(SERVER_DIR),
+        stdout=log,
+        stderr=subprocess.STDOUT,
         text=True
         )
-        time.sleep(1)   
-        # If you catch exceptions in here, set error below
-        # -------------------------------------------
+    if proc.returncode != 0:
+        tail = log_file.read_text(errors="replace")[-2000:]
+        print("Pipeline output:", tail, file=sys.stderr)
+        raise RuntimeError(tail or f"pipeline exited with {proc.returncode}")
 
-        #? state change once finished
-        status_store["state"] = "done"
-    #error
-    except Exception as e:
-        status_store["state"] = "error"
-        status_store["error"] = str(e)
 
+def job_events(job: Job) -> list:
+    """Stage events of the job's current/last run (a re-run rewrites the file once the runner starts)"""
+    events = read_events(job.job_dir)
+    if job.started is not None:
+        events = [e for e in events if e["time"] >= job.started]
+    return events
+
+
+async def job_resources(job: Job) -> Resources | None:
+    """Memory cap + cpus for a run of this job, from the shape recorded by the upload pre-flight"""
+    try:
+        shape = json.loads((job.job_dir / PREFLIGHT_FILE).read_text())
+    except (OSError, ValueError):
+        #workspace from before pre-flight existed: header / newline scan of the upload
+        expr_files = [f for f in job.data_dir.glob("*") if "__expr" in f.name.lower()]
+        if not expr_files:
+            return None  # the runner reports the missing file
+        shape = await asyncio.to_thread(scan_expression, expr_files[0])
+    return estimate_resources(shape, jobs.capacity)
 
-#ii. Run - pipeline execution
-# @app.post("/run")
-# async def run_pipeline():
-#     try:
-        #pass
-#         return {"success": True}
-#     except subprocess.CalledProcessError as e:
-#         print("Pipeline stderr:", e.stderr, file=sys.stderr)
-#         raise HTTPException(500, detail=e.stderr or e.stdout)
 
+#ii. Run - pipeline execution
 @app.post("/run", response_model=RunResponse) #Add RunResponse
-async def run_pipeline(background_tasks: BackgroundTasks): #Move to Background Tasks - prevent oocupying the HTTP POST request until pipeline finished*
-    # Start the pipelien in the bkgd
-    background_tasks.add_task(pipeline_job)
-    return {"success": True} #return a True --> initiate the navigation
+async def run_pipeline(job_id: str = Query(...)):
+    # Queue the pipeline behind the admission check - prevent oocupying the HTTP POST request until pipeline finished*
+    job = get_job_or_404(job_id)
+    try:
+        jobs.submit(job, pipeline_job, await job_resources(job))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "job_id": job.job_id} #return a True --> initiate the navigation
 
 #iii. analysis page
-@app.get("/analysis", response_model=StatusResponse)
-async def get_status():
-    # Called by your React poll every 5s
-    ##Pipeline Listener: StatusResponse -> once the pieplien finished, return state
+def job_status(job: Job) -> dict:
+    """Body of /analysis and of every /analysis/stream message"""
+    events = job_events(job) if job.state != "queued" else []
+    stages = stage_table(events)
+    running = [s["stage"] for s in stages if s["state"] == "running"]
+    elapsed = None
+    if job.started is not None:
+        elapsed = round((job.finished or time.time()) - job.started, 1)
     return {
-        "status": status_store["state"],
-        "error": status_store["error"]
+        "job_id": job.job_id,
+        "status": job.state,
+        "error": job.error,
+        "stage": running[-1] if running and job.state == "processing" else None,
+        "stages": stages,
+        "elapsed_seconds": elapsed,
+        "eta_seconds": stage_stats.eta(events) if job.state == "processing" else None,
+        "queue_position": jobs.queue_position(job.job_id) if job.state == "queued" else None,
+        "memory_max_mb": round(job.resources.memory / 1024 ** 2, 1) if job.resources else None,
+        "cpus": job.resources.cpus if job.resources else None,
+        "background": job.background,
     }
 
+@app.get("/analysis", response_model=StatusResponse)
+async def get_status(job_id: str = Query(...)):
+    # Polling fallback (React polls every 5s when EventSource is unavailable)
+    ##Pipeline Listener: StatusResponse -> once the pieplien finished, return state
+    return job_status(get_job_or_404(job_id))
+
+#push version of /analysis: one "status" SSE message per state/stage change, stream ends at done/error
+status_hub = StatusHub(lambda job: StatusResponse(**job_status(job)).model_dump(), jobs.queue_position)
+jobs.listeners.append(status_hub.notify)
+
+@app.on_event("startup")
+async def bind_status_hub():
+    status_hub.bind(asyncio.get_running_loop())
+
+@app.get("/analysis/stream")
+async def stream_status(job_id: str = Query(...)):
+    job = get_job_or_404(job_id)
+    return StreamingResponse(
+        status_hub.sse(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, #no proxy buffering (nginx)
+    )
+
 #iv. Result viewing/feedback from pipeline ,py
 @app.get("/result-flag")
-def get_result(filename: str):
+def get_result(filename: str, job_id: str = Query(...)):
     #the flag file for noticing the finish of pipeline analysis
-    flag_file = RESULT_DIR / 'completed.flag'
+    flag_file = get_job_or_404(job_id).result_dir / 'completed.flag'
     if flag_file.exists():
         content = flag_file.read_text()
         return {"filename": filename, "content": content}
@@ -214,9 +362,216 @@ def get_result(filename: str):
         return {"error": "Result not found"}
 
 #handle picture 
+##from results/artifacts.json once the run has finished, a directory glob only before that
 @app.get("/result-files", response_model=List[str]) #respone you the list
-def list_results(extension: str = "png"):
-    return [f.name for f in RESULT_DIR.glob(f"*.{extension}")]
+def list_results(job_id: str = Query(...), extension: str = "png"):
+    result_dir = get_job_or_404(job_id).result_dir
+    artifacts = read_artifacts(result_dir)
+    if artifacts:
+        return [a["name"] for a in artifacts if a["name"].endswith(f".{extension}")]
+    return [f.name for f in result_dir.glob(f"*.{extension}")]
+
+#? Result artifacts: index, conditional / precompressed single files, streamed zip bundle
+class Artifact(BaseModel):
+    name: str
+    size: int
+    sha256: str
+    etag: str
+    gzip_size: int | None = None   # .gz twin served with Content-Encoding: gzip
+
+@app.get("/artifacts", response_model=List[Artifact])
+def list_artifacts(job_id: str = Query(...)):
+    artifacts = read_artifacts(get_job_or_404(job_id).result_dir)
+    if not artifacts:
+        raise HTTPException(status_code=404, detail="No finished results for this job yet")
+    return artifacts
+
+#one zip of the job's outputs, written while the files are read (never built in memory / on disk)
+@app.get("/bundle")
+def get_bundle(request: Request, job_id: str = Query(...), extension: List[str] | None = Query(None)):
+    job = get_job_or_404(job_id)
+    artifacts = [a for a in read_artifacts(job.result_dir)
+                 if not extension or a["name"].rsplit(".", 1)[-1] in extension]
+    if not artifacts:
+        raise HTTPException(status_code=404, detail="No finished results for this job yet")
+    if not all(is_current(a, job.result_dir / a["name"]) for a in artifacts):
+        raise HTTPException(status_code=409, detail="Results are being rewritten, try again once the run is done")
+    headers = {"ETag": bundle_etag(artifacts), "Cache-Control": "private, no-cache",
+               "Content-Disposition": f'attachment; filename="results_{job_id}.zip"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(stream_zip(job.result_dir, artifacts), media_type="application/zip",
+                             headers=headers)
+
+#? DEG query API: pages of results/deg.sqlite instead of whole CSVs
+class DegTable(BaseModel):
+    source: str           # rank_genes_groups / welch ...
+    contrast: str
+    genes: int
+
+class DegRow(BaseModel):
+    contrast: str
+    rank: int             # position in the producer's own ranking
+    gene: str
+    logfc: float | None = None
+    pval: float | None = None
+    fdr: float | None = None
+    score: float | None = None
+
+class DegPage(BaseModel):
+    total: int            # rows matching the filters
+    limit: int
+    offset: int
+    rows: List[DegRow]
+
+
+def deg_db_or_404(job_id: str) -> Path:
+    db_path = get_job_or_404(job_id).result_dir / DEG_DB
+    if not db_path.exists():
+        raise HTTPException(status_code=404, detail="No DEG results for this job yet")
+    return db_path
+
+@app.get("/deg/tables", response_model=List[DegTable])
+def deg_tables(job_id: str = Query(...)):
+    return list_deg_tables(deg_db_or_404(job_id))
+
+@app.get("/deg", response_model=DegPage)
+def deg_page(
+    job_id: str = Query(...),
+    source: str = "rank_genes_groups",
+    contrast: str | None = None,
+    fdr_max: float | None = Query(None, ge=0, le=1),
+    min_abs_logfc: float | None = Query(None, ge=0),
+    logfc_min: float | None = None,
+    logfc_max: float | None = None,
+    gene_prefix: str | None = Query(None, max_length=64),
+    sort: str = Query("fdr", pattern="^(" + "|".join(SORT_COLUMNS) + ")$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    total, rows = query_deg(deg_db_or_404(job_id), source, contrast,
+                            fdr_max=fdr_max, min_abs_logfc=min_abs_logfc,
+                            logfc_min=logfc_min, logfc_max=logfc_max, gene_prefix=gene_prefix,
+                            sort=sort, descending=(order == "desc"), limit=limit, offset=offset)
+    return {"total": total, "limit": limit, "offset": offset, "rows": rows}
+
+#? Clustering sweep: Leiden at many resolutions on the job's cached neighbour graph
+##runs as a job (same queue, status via /analysis + /analysis/stream), earlier stages come from checkpoints
+class SweepRequest(BaseModel):
+    resolutions: List[Annotated[float, Field(gt=0, le=10)]] | None = Field(None, min_length=1, max_length=50)
+    seeds: int | None = Field(None, ge=1, le=10)           # runs per resolution, for the stability ARI
+    n_iterations: int | None = Field(None, ge=-1, le=50)   # -1 = until converged
+
+class SweepRow(BaseModel):
+    resolution: float
+    n_clusters: int       # seed-0 run
+    n_clusters_min: int   # over seeds
+    n_clusters_max: int
+    min_cluster_size: int
+    max_cluster_size: int
+    modularity: float
+    seed_ari: float | None = None   # mean pairwise ARI between seeds (1 = stable)
+    ari_prev: float | None = None   # ARI to the next lower resolution
+
+
+@app.post("/cluster/sweep", response_model=RunResponse)
+async def run_cluster_sweep(request: SweepRequest, job_id: str = Query(...)):
+    job = get_job_or_404(job_id)
+    if job.state in ("queued", "processing"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already {job.state}")
+    #defaults for anything left out: runner.DEFAULT_PARAMS["sweep"]
+    (job.job_dir / "sweep.json").write_text(json.dumps(request.model_dump(exclude_none=True)))
+    (job.result_dir / "leiden_sweep.json").unlink(missing_ok=True)
+    try:
+        jobs.submit(job, lambda j: pipeline_job(j, task="sweep"), await job_resources(job))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "job_id": job.job_id}
+
+@app.get("/cluster/sweep", response_model=List[SweepRow])
+def get_cluster_sweep(job_id: str = Query(...)):
+    path = get_job_or_404(job_id).result_dir / "leiden_sweep.json"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No clustering sweep for this job yet")
+    return json.loads(path.read_text())
+
+#serve one job's output file, replaces the shared /results StaticFiles mount
+##indexed files (artifacts.json): content-hash ETag -> 304 on repeat views, .gz twin when gzip is accepted
+@app.get("/results/{job_id}/{filename:path}")
+def get_result_file(request: Request, job_id: str, filename: str):
+    result_dir = get_job_or_404(job_id).result_dir.resolve()
+    path = (result_dir / filename).resolve()
+    if result_dir not in path.parents or not path.is_file(): #no ../ escapes
+        raise HTTPException(status_code=404, detail="Result not found")
+    entry = next((a for a in read_artifacts(result_dir) if a["name"] == filename), None)
+    if entry is None or not is_current(entry, path):
+        return FileResponse(path)
+    gz = path.with_name(path.name + ".gz")
+    use_gz = bool(entry.get("gzip_size")) and "gzip" in request.headers.get("accept-encoding", "") and gz.is_file()
+    etag = entry["etag"][:-1] + '-gz"' if use_gz else entry["etag"]  # one ETag per encoding
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if use_gz:
+        headers["Content-Encoding"] = "gzip"
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        return FileResponse(gz, media_type=media_type, headers=headers)
+    return FileResponse(path, headers=headers)
+
+#? Client-side plot payloads: results/viz/ (pipeline/export.py)
+##precompressed .gz twin when the client accepts gzip, ETag -> 304 on revalidation
+##?v=<manifest version>: the file can only change with a new version -> cached for good by the browser
+@app.get("/viz/{job_id}/{filename}")
+def get_viz_file(request: Request, job_id: str, filename: str, v: str | None = None):
+    viz_dir = get_job_or_404(job_id).result_dir / VIZ_DIR
+    path = viz_dir / filename
+    if filename.startswith(".") or filename.endswith(".gz") or not path.is_file():
+        raise HTTPException(status_code=404, detail="No plot data for this job yet")
+    served, headers = path, {"Vary": "Accept-Encoding"}
+    gz = viz_dir / f"{filename}.gz"
+    if "gzip" in request.headers.get("accept-encoding", "") and gz.is_file():
+        served, headers["Content-Encoding"] = gz, "gzip"
+    version = json.loads((viz_dir / MANIFEST).read_text()).get("version") if v else None
+    headers["Cache-Control"] = ("private, max-age=31536000, immutable" if v and v == version
+                                else "private, no-cache")
+    stat = served.stat()
+    headers["ETag"] = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    media_type = "application/json" if filename == MANIFEST else "application/octet-stream"
+    return FileResponse(served, media_type=media_type, headers=headers)
+
+#Prometheus text format: job states + per-stage totals of finished runs
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    lines = ["# HELP pipeline_jobs Jobs known to the server by state", "# TYPE pipeline_jobs gauge"]
+    for state, count in sorted(jobs.state_counts().items()):
+        lines.append(f'pipeline_jobs{{state="{state}"}} {count}')
+    usage = jobs.usage()
+    lines += ["# HELP pipeline_queue_length Jobs waiting for admission", "# TYPE pipeline_queue_length gauge",
+              f"pipeline_queue_length {usage['queued']}"]
+    if usage["capacity"] is not None:
+        lines += ["# HELP pipeline_memory_bytes Memory reserved by running jobs / admission capacity",
+                  "# TYPE pipeline_memory_bytes gauge",
+                  f'pipeline_memory_bytes{{kind="reserved"}} {usage["reserved"].memory}',
+                  f'pipeline_memory_bytes{{kind="capacity"}} {usage["capacity"].memory}',
+                  "# HELP pipeline_cpus CPUs reserved by running jobs / admission capacity",
+                  "# TYPE pipeline_cpus gauge",
+                  f'pipeline_cpus{{kind="reserved"}} {usage["reserved"].cpus}',
+                  f'pipeline_cpus{{kind="capacity"}} {usage["capacity"].cpus}']
+    if storage.last_report:
+        lines += ["# HELP pipeline_storage_bytes Disk used by job workspaces / ingest caches / checkpoints",
+                  "# TYPE pipeline_storage_bytes gauge"]
+        lines += [f'pipeline_storage_bytes{{kind="{kind}"}} {n}' for kind, n in storage.last_report["bytes"].items()]
+    lines += stage_stats.prometheus()
+    return "\n".join(lines) + "\n"
+
+#disk usage per kind (walks the trees) + the last collection
+@app.get("/storage")
+def storage_usage():
+    return {"usage": storage.usage(), "ttl_hours": storage.ttl / 3600, "quota_bytes": storage.quota,
+            "last_collection": storage.last_report}
 
 #health check route
 @app.get("/health")
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import zipfile
+from pathlib import Path
+
+#? Result artifacts index + streaming bundle (stdlib only, safe to import from the web process)
+##runner side: write_artifacts() once a run / render / sweep has finished writing results/
+##  -> results/artifacts.json: name, size, sha256, ETag, mtime of every top-level output file
+##  -> a .gz twin of every text output (CSV, JSON, SVG ...) for Content-Encoding: gzip
+##web side: read_artifacts() for /artifacts, conditional GETs (304) and /result-files without a glob;
+##  stream_zip() writes the bundle into a tiny in-memory sink that is drained after every chunk,
+##  so a download never holds more than one CHUNK of one file (no archive in memory or on disk)
+
+ARTIFACTS_FILE = "artifacts.json"
+CHUNK = 1024 * 1024
+COMPRESSIBLE = {".csv", ".tsv", ".txt", ".json", ".svg"}
+STORED = {".png", ".jpg", ".gz", ".zip", ".sqlite"}  # already compressed / binary: zip without deflate
+SKIP = {ARTIFACTS_FILE, "completed.flag"}
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _gzip_twin(path: Path) -> int:
+    """path + ".gz" (level 6, no timestamp -> same bytes for the same input) -> its size"""
+    twin = path.with_name(path.name + ".gz")
+    tmp = path.with_name(f".{path.name}.gz.{os.getpid()}.tmp")
+    with open(path, "rb") as src, open(tmp, "wb") as raw, \
+            gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as dst:
+        shutil.copyfileobj(src, dst, CHUNK)
+    os.replace(tmp, twin)
+    return twin.stat().st_size
+
+
+def write_artifacts(result_dir: Path) -> list:
+    """Index (and gzip the text files of) every top-level output in result_dir -> the entries written"""
+    result_dir = Path(result_dir)
+    previous = {a["name"]: a for a in read_artifacts(result_dir)}
+    entries = []
+    for path in sorted(result_dir.iterdir()):
+        name = path.name
+        if not path.is_file() or name.startswith(".") or name.endswith(".gz") or name in SKIP:
+            continue
+        stat = path.stat()
+        old = previous.get(name)
+        if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+            entries.append(old)  # unchanged since the last index (e.g. after a render / sweep)
+            continue
+        sha = _sha256(path)
+        entry = {"name": name, "size": stat.st_size, "sha256": sha, "etag": f'"{sha[:32]}"',
+                 "mtime_ns": stat.st_mtime_ns}
+        if path.suffix.lower() in COMPRESSIBLE:
+            entry["gzip_size"] = _gzip_twin(path)
+        entries.append(entry)
+    tmp = result_dir / f".{ARTIFACTS_FILE}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(entries, indent=1))
+    os.replace(tmp, result_dir / ARTIFACTS_FILE)
+    return entries
+
+
+def read_artifacts(result_dir: Path) -> list:
+    try:
+        return json.loads((Path(result_dir) / ARTIFACTS_FILE).read_text())
+    except (OSError, ValueError):
+        return []
+
+
+def is_current(entry: dict, path: Path) -> bool:
+    """The file is still the one indexed (a re-run may be rewriting results/ right now)"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return False
+    return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+
+def bundle_etag(entries: list) -> str:
+    return '"' + hashlib.sha256("".join(e["sha256"] for e in entries).encode()).hexdigest()[:32] + '"'
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer: zipfile falls back to data descriptors, we drain it as we go"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(result_dir: Path, entries: list, root: str = "results"):
+    """Yield a zip archive of the listed files, chunk by chunk, while reading them"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for entry in entries:
+            path = Path(result_dir) / entry["name"]
+            info = zipfile.ZipInfo.from_file(path, arcname=f"{root}/{entry['name']}")
+            info.compress_type = (zipfile.ZIP_STORED if path.suffix.lower() in STORED
+                                  else zipfile.ZIP_DEFLATED)
+            with open(path, "rb") as src, zf.open(info, mode="w", force_zip64=True) as dst:
+                for chunk in iter(lambda: src.read(CHUNK), b""):
+                    dst.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()  # central directory
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+#? Content-addressed stage checkpoints
+##key = sha256(stage name + stage params + upstream keys), the first upstream key is the input file hashes
+##-> a stage is recomputed only if its inputs, its params or anything upstream changed
+##cache/stages/<key>/value.pkl + meta.json, size-bounded LRU eviction (dir mtime = last use)
+##directory entries (get_or_build_dir): cache/stages/<key>/<files written by the stage> + meta.json
+
+CHECKPOINT_VERSION = 1
+
+
+def stage_key(stage: str, params: dict | None, *upstream: str) -> str:
+    payload = json.dumps({"v": CHECKPOINT_VERSION, "stage": stage,
+                          "params": params or {}, "upstream": list(upstream)},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StageCache:
+    """Pickle-backed store of stage outputs (AnnData, DataFrames, dicts of arrays/bytes)"""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits, self.misses = [], []
+        self.held: set[Path] = set()  # directory entries this run reads from disk: never evicted by it
+
+    def _dir(self, key: str) -> Path:
+        return self.root / key
+
+    def has(self, key: str) -> bool:
+        return (self._dir(key) / "meta.json").exists()
+
+    def get(self, key: str):
+        path = self._dir(key)
+        with open(path / "value.pkl", "rb") as f:
+            value = pickle.load(f)
+        os.utime(path)  # mark as recently used
+        return value
+
+    def put(self, key: str, value, stage: str = "") -> None:
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        with open(tmp / "value.pkl", "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = (tmp / "value.pkl").stat().st_size
+        (tmp / "meta.json").write_text(json.dumps(
+            {"stage": stage, "size": size, "created": time.time()}))
+        try:
+            os.rename(tmp, self._dir(key))
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # same key written concurrently
+        self.evict(keep=self._dir(key))
+
+    def get_or_compute(self, key: str, compute, stage: str = ""):
+        """Cached value for key, or compute() it and store it"""
+        if self.has(key):
+            try:
+                value = self.get(key)
+                self.hits.append(stage)
+                print(f"♻ {stage}: checkpoint hit ({key[:12]})")
+                return value
+            except (OSError, EOFError, pickle.UnpicklingError):
+                shutil.rmtree(self._dir(key), ignore_errors=True)  # corrupt entry
+        self.misses.append(stage)
+        value = compute()
+        self.put(key, value, stage=stage)
+        return value
+
+    def get_or_build_dir(self, key: str, build, stage: str = "") -> Path:
+        """
+        Entry dir for key, or build(tmp_dir) the stage's own files into a new one.
+        For outputs used straight from disk (memory-mapped), never unpickled into RAM.
+        """
+        path = self._dir(key)
+        if self.has(key):
+            os.utime(path)
+            self.held.add(path)
+            self.hits.append(stage)
+            print(f"♻ {stage}: checkpoint hit ({key[:12]})")
+            return path
+        self.misses.append(stage)
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        try:
+            build(tmp)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        size = sum(f.stat().st_size for f in tmp.rglob("*") if f.is_file())
+        (tmp / "meta.json").write_text(json.dumps(
+            {"stage": stage, "size": size, "created": time.time()}))
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # same key written concurrently
+        self.held.add(path)
+        self.evict(keep=path)
+        return path
+
+    def entries(self) -> list[tuple[float, int, Path]]:
+        """(last use, size, dir) of every entry"""
+        out = []
+        for path in self.root.iterdir():
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                size = json.loads((path / "meta.json").read_text())["size"]
+                out.append((path.stat().st_mtime, size, path))
+            except (OSError, ValueError, KeyError):
+                continue
+        return out
+
+    def evict(self, keep: Path | None = None) -> None:
+        """Drop least recently used entries until the cache fits max_bytes (never keep or a held entry)"""
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep or path in self.held:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
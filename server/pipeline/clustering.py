@@ -0,0 +1,96 @@
+import multiprocessing as mp
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import igraph as ig
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.metrics import adjusted_rand_score
+
+from pipeline.profiling import cpu_budget
+
+#? Leiden resolution sweep on the shared neighbour graph (adata.obsp["connectivities"])
+##the igraph graph is built ONCE and parked in _SHARED before the pool forks -> workers share it (copy-on-write)
+##one pool task per (resolution, seed), same Leiden call as sc.tl.leiden(flavor="igraph", directed=False)
+##stability: mean pairwise ARI between seeds at a resolution + ARI to the next lower resolution
+
+_SHARED = {}  # igraph graph for the forked workers
+
+
+def graph_from_connectivities(conn) -> ig.Graph:
+    """Undirected weighted igraph graph of a symmetric kNN connectivity matrix (each edge once)"""
+    upper = sparse.triu(sparse.csr_matrix(conn), k=1).tocoo()
+    graph = ig.Graph(n=conn.shape[0], edges=list(zip(upper.row.tolist(), upper.col.tolist())), directed=False)
+    graph.es["weight"] = upper.data.astype(np.float64)
+    return graph
+
+
+def _by_size(membership) -> np.ndarray:
+    """Relabel clusters 0..k-1 from largest to smallest"""
+    _, inverse, counts = np.unique(membership, return_inverse=True, return_counts=True)
+    rank = np.empty(len(counts), dtype=np.int32)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(len(counts))
+    return rank[inverse]
+
+
+def _run_leiden(resolution: float, seed: int, n_iterations: int):
+    graph = _SHARED["graph"]
+    state = random.getstate()  # igraph draws from the stdlib random module
+    try:
+        random.seed(seed)
+        ig.set_random_number_generator(random)
+        part = graph.community_leiden(objective_function="modularity", weights="weight",
+                                      resolution=resolution, n_iterations=n_iterations)
+    finally:
+        random.setstate(state)
+    return _by_size(part.membership), graph.modularity(part.membership, weights="weight")
+
+
+def leiden_sweep(conn, resolutions=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0), seeds: int = 3,
+                 n_iterations: int = 2, n_jobs: int = 0):
+    """
+    Leiden at every resolution x seed on one graph, run in a forked process pool.
+    -> (summary: one row per resolution, labels: cells x resolutions of the seed-0 runs)
+    n_jobs <= 0: one worker per CPU of the job's budget (capped at the number of runs); 1 = run inline.
+    """
+    resolutions = sorted({float(r) for r in resolutions})
+    if not resolutions or resolutions[0] <= 0:
+        raise ValueError("Resolutions must be positive")
+    seeds = max(1, int(seeds))
+    tasks = [(r, s) for r in resolutions for s in range(seeds)]
+    n_jobs = min(n_jobs if n_jobs > 0 else cpu_budget(), len(tasks))
+
+    _SHARED["graph"] = graph_from_connectivities(conn)
+    try:
+        if n_jobs == 1:
+            runs = [_run_leiden(r, s, n_iterations) for r, s in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("fork")) as pool:
+                futures = [pool.submit(_run_leiden, r, s, n_iterations) for r, s in tasks]
+                runs = [f.result() for f in futures]
+    finally:
+        _SHARED.clear()
+    runs = dict(zip(tasks, runs))
+
+    rows, labels, previous = [], {}, None
+    for r in resolutions:
+        membership, modularity = runs[(r, 0)]
+        sizes = np.bincount(membership)
+        pairs = [adjusted_rand_score(runs[(r, a)][0], runs[(r, b)][0])
+                 for a, b in combinations(range(seeds), 2)]
+        rows.append({
+            "resolution": r,
+            "n_clusters": len(sizes),
+            "n_clusters_min": min(len(np.bincount(runs[(r, s)][0])) for s in range(seeds)),
+            "n_clusters_max": max(len(np.bincount(runs[(r, s)][0])) for s in range(seeds)),
+            "min_cluster_size": int(sizes.min()),
+            "max_cluster_size": int(sizes.max()),
+            "modularity": modularity,
+            "seed_ari": float(np.mean(pairs)) if pairs else np.nan,  # 1 = same partition for every seed
+            "ari_prev": adjusted_rand_score(previous, membership) if previous is not None else np.nan,
+        })
+        labels[f"leiden_{r:g}"] = membership
+        previous = membership
+    return pd.DataFrame(rows), pd.DataFrame(labels)
@@ -0,0 +1,83 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pipeline.deg import bh_fdr, welch_ttest, wilcoxon_test
+from pipeline.profiling import cpu_budget
+
+#? Multi-contrast DEG: AD vs CT within every cell type, one contrast per pool task
+##the normalised matrix is NOT copied per cell type: contrasts are row masks into the shared X
+##the pool is forked after X is parked in _SHARED, so every worker reads the same pages (copy-on-write)
+##-> one long table: contrast, method, gene, logfoldchanges, scores, pval, FDR (BH per contrast + method)
+
+_SHARED = {}  # X + gene names for the forked workers
+
+
+def _run_contrast(label: str, group_rows: np.ndarray, ref_rows: np.ndarray, methods: tuple) -> pd.DataFrame:
+    X, genes = _SHARED["X"], _SHARED["genes"]
+    tables = []
+    for method in methods:
+        if method == "wilcoxon":
+            res = wilcoxon_test(X, group_rows, ref_rows)
+        elif method == "welch":
+            res = welch_ttest(X, group_rows, ref_rows)
+            res["scores"] = res["t"]
+        else:
+            raise ValueError(f"Unknown DEG method: {method}")
+        tables.append(pd.DataFrame({
+            "contrast": label,
+            "method": method,
+            "gene": genes,
+            "logfoldchanges": res["logfoldchanges"],
+            "scores": res["scores"],
+            "pval": res["pval"],
+            "FDR": bh_fdr(res["pval"]),
+            "n_group": len(group_rows),
+            "n_reference": len(ref_rows),
+        }))
+    return pd.concat(tables, ignore_index=True)
+
+
+def contrast_rows(obs: pd.DataFrame, split_col: str, groupby: str, group: str, reference: str,
+                  min_cells: int = 3) -> dict:
+    """{cell type: (group row positions, reference row positions)}, types with too few cells skipped"""
+    split = obs[split_col].astype(str).to_numpy()
+    cond = obs[groupby].astype(str).to_numpy()
+    out = {}
+    for label in pd.unique(split):
+        in_type = split == label
+        g = np.flatnonzero(in_type & (cond == group))
+        r = np.flatnonzero(in_type & (cond == reference))
+        if len(g) >= min_cells and len(r) >= min_cells:
+            out[label] = (g, r)
+        else:
+            print(f" Skipping contrast {label}: {len(g)} {group} / {len(r)} {reference} cells (< {min_cells})")
+    return out
+
+
+def celltype_contrasts(X, genes, obs: pd.DataFrame, split_col: str = "oupSample.cellType",
+                       groupby: str = "oupSample.batchCond", group: str = "AD", reference: str = "CT",
+                       methods=("wilcoxon", "welch"), min_cells: int = 3, n_jobs: int = 0) -> pd.DataFrame:
+    """
+    group vs reference inside every value of split_col, tests run in a forked process pool.
+    n_jobs <= 0: one worker per CPU of the job's budget (capped at the number of contrasts); 1 = run inline.
+    """
+    rows = contrast_rows(obs, split_col, groupby, group, reference, min_cells)
+    if not rows:
+        raise ValueError(f"No {split_col} has at least {min_cells} {group} and {reference} cells")
+    methods = tuple(methods)
+    n_jobs = min(n_jobs if n_jobs > 0 else cpu_budget(), len(rows))
+
+    _SHARED.update(X=X, genes=np.asarray(genes))
+    try:
+        if n_jobs == 1:
+            tables = [_run_contrast(label, g, r, methods) for label, (g, r) in rows.items()]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("fork")) as pool:
+                futures = [pool.submit(_run_contrast, label, g, r, methods) for label, (g, r) in rows.items()]
+                tables = [f.result() for f in futures]
+    finally:
+        _SHARED.clear()
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import norm, rankdata
+from scipy.stats import t as t_dist
+from statsmodels.stats.multitest import multipletests  # FDR p-value
+
+
+#? Batched DEG engine: whole-matrix Welch t-test (AD vs CT)
+##same numbers as looping scipy.stats.ttest_ind(equal_var=False) gene by gene
+##X may be float32 (the pipeline's default precision): sums, variances and ranks are float64
+##+ wilcoxon_test: rank-sum z-scores in gene blocks, same statistic as scanpy's wilcoxon
+
+
+def _as_mask(index, n_rows: int) -> np.ndarray:
+    """Row positions / boolean mask -> boolean mask"""
+    index = np.asarray(index)
+    if index.dtype == bool:
+        if index.shape[0] != n_rows:
+            raise ValueError(f"Mask length {index.shape[0]} does not match {n_rows} rows")
+        return index
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[index] = True
+    return mask
+
+
+def group_mean_var(X, mask: np.ndarray, block_bytes: int = 64 * 1024 ** 2):
+    """
+    Per-gene mean and sample variance (ddof=1) of the rows selected by mask.
+    X: cells x genes, dense ndarray or scipy sparse, float32 or float64; accumulates in float64
+    (dense X: in column blocks of about block_bytes, never a float64 copy of the whole group)
+    """
+    n = int(mask.sum())
+    if sparse.issparse(X):
+        sub = sparse.csr_matrix(X)[mask]
+        s1 = np.asarray(sub.sum(axis=0, dtype=np.float64)).ravel()
+        sq = sub.copy()
+        sq.data = sq.data.astype(np.float64) ** 2
+        s2 = np.asarray(sq.sum(axis=0)).ravel()
+        mean = s1 / n if n else np.full(X.shape[1], np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (s2 - n * mean ** 2) / (n - 1)
+        var = np.maximum(var, 0.0)  # rounding can push it slightly below 0
+    else:
+        sub = np.asarray(X)[mask]
+        mean, var = np.empty(X.shape[1]), np.empty(X.shape[1])
+        step = max(1, block_bytes // (8 * max(n, 1)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for start in range(0, X.shape[1], step):
+                block = sub[:, start:start + step].astype(np.float64)
+                mean[start:start + step] = block.mean(axis=0)
+                var[start:start + step] = block.var(axis=0, ddof=1)
+    return mean, var, n
+
+
+def welch_ttest(X, ad_index, ct_index) -> dict:
+    """
+    Welch t-test for every gene at once.
+    Input: X (cells x genes), AD/CT row positions or boolean masks
+    Output: dict of per-gene arrays (means, variances, t, df, pval, log2fc)
+    """
+    n_rows = X.shape[0]
+    ad_mask = _as_mask(ad_index, n_rows)
+    ct_mask = _as_mask(ct_index, n_rows)
+
+    # --- 1. Group moments ---
+    m1, v1, n1 = group_mean_var(X, ad_mask)
+    m2, v2, n2 = group_mean_var(X, ct_mask)
+
+    # --- 2. Welch statistic + Welch-Satterthwaite degrees of freedom ---
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se1 = v1 / n1
+        se2 = v2 / n2
+        denom = np.sqrt(se1 + se2)
+        t_stat = (m1 - m2) / denom
+        dof = (se1 + se2) ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+    dof = np.where(np.isnan(dof), 1, dof)  # zero variance in both groups: scipy uses df = 1 (p = 0 if means differ)
+
+    # --- 3. Two-sided p-value ---
+    pval = 2.0 * t_dist.sf(np.abs(t_stat), dof)
+
+    # --- 4. log2 fold change, same pseudo count as before ---
+    log2fc = np.log2(m1 + 1e-6) - np.log2(m2 + 1e-6)
+
+    return {
+        "mean_AD": m1, "mean_CT": m2,
+        "var_AD": v1, "var_CT": v2,
+        "t": t_stat, "df": dof,
+        "pval": pval, "logfoldchanges": log2fc,
+    }
+
+
+def welch_deg_table(X, genes, ad_index, ct_index) -> pd.DataFrame:
+    """Welch t-test + BH FDR -> DEG table (gene, logfoldchanges, pval, FDR)"""
+    res = welch_ttest(X, ad_index, ct_index)
+
+    # FDR correction, for p-value => FDR < 0.05 (a NaN p-value must not turn every FDR into NaN)
+    fdr_vals = bh_fdr(res["pval"])
+
+    deg_df = pd.DataFrame({
+        "gene": np.asarray(genes),
+        "logfoldchanges": res["logfoldchanges"],
+        "pval": res["pval"],
+    })
+    deg_df["FDR"] = fdr_vals
+    return deg_df
+
+
+def wilcoxon_test(X, group_index, ref_index, block_bytes: int = 64 * 1024 ** 2) -> dict:
+    """
+    Wilcoxon rank-sum (Mann-Whitney, normal approximation) for every gene, group vs reference rows.
+    Same statistic as sc.tl.rank_genes_groups(method="wilcoxon", reference=...) without tie correction:
+    z-score, two-sided p, log2FC of expm1 means (X is log1p data).
+    Genes are ranked in dense column blocks of about block_bytes, so X can be any size.
+    """
+    n_rows = X.shape[0]
+    g_mask = _as_mask(group_index, n_rows)
+    r_mask = _as_mask(ref_index, n_rows)
+    rows = np.flatnonzero(g_mask | r_mask)
+    is_group = g_mask[rows]
+    n1, n2 = int(is_group.sum()), int((~is_group).sum())
+    n_genes = X.shape[1]
+
+    sub = sparse.csc_matrix(X[rows]) if sparse.issparse(X) else np.asarray(X)[rows]
+    step = max(1, block_bytes // (8 * max(len(rows), 1)))
+    rank_sum = np.empty(n_genes)
+    for start in range(0, n_genes, step):
+        block = sub[:, start:start + step]
+        block = block.toarray() if sparse.issparse(block) else block
+        rank_sum[start:start + step] = rankdata(block, axis=0)[is_group].sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (rank_sum - n1 * (n1 + n2 + 1) / 2.0) / np.sqrt(n1 * n2 * (n1 + n2 + 1) / 12.0)
+    pval = 2.0 * norm.sf(np.abs(z))
+
+    mean_g, _, _ = group_mean_var(X, g_mask)
+    mean_r, _, _ = group_mean_var(X, r_mask)
+    log2fc = np.log2((np.expm1(mean_g) + 1e-9) / (np.expm1(mean_r) + 1e-9))
+    return {"scores": z, "pval": pval, "logfoldchanges": log2fc}
+
+
+def bh_fdr(pval: np.ndarray) -> np.ndarray:
+    """BH FDR over the finite p-values (NaN stays NaN, e.g. genes constant in both groups)"""
+    fdr = np.full(len(pval), np.nan)
+    ok = np.isfinite(pval)
+    if ok.any():
+        fdr[ok] = multipletests(pval[ok], method="fdr_bh")[1]
+    return fdr
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+#? Indexed DEG store: results/deg.sqlite (stdlib sqlite3, safe to import from the web process)
+##one long table for every DEG result of a job: (source table, contrast, gene) + logFC / p / FDR / score
+##indexes on FDR, logFC and upper-cased gene name -> threshold filters, gene-prefix search, sorting and
+##LIMIT/OFFSET pages without reading the CSVs
+
+DEG_DB = "deg.sqlite"
+SORT_COLUMNS = {"fdr": "fdr", "pval": "pval", "logfc": "logfc", "abs_logfc": "ABS(logfc)",
+                "score": "score", "gene": "gene_upper", "rank": "rank"}
+
+#column names of the two DEG producers -> store columns
+##rank_genes_groups_df: names, scores, logfoldchanges, pvals, pvals_adj
+##calculate_deg_scanpy_df: gene, logfoldchanges, pval, FDR
+COLUMN_ALIASES = {
+    "gene": ("gene", "names"),
+    "logfc": ("logfoldchanges",),
+    "pval": ("pval", "pvals"),
+    "fdr": ("FDR", "pvals_adj"),
+    "score": ("scores", "t"),
+}
+
+SCHEMA = """
+CREATE TABLE deg (
+    source     TEXT NOT NULL,
+    contrast   TEXT NOT NULL,
+    rank       INTEGER NOT NULL,
+    gene       TEXT NOT NULL,
+    gene_upper TEXT NOT NULL,
+    logfc      REAL,
+    pval       REAL,
+    fdr        REAL,
+    score      REAL
+);
+CREATE INDEX deg_fdr   ON deg (source, contrast, fdr);
+CREATE INDEX deg_logfc ON deg (source, contrast, logfc);
+CREATE INDEX deg_gene  ON deg (source, contrast, gene_upper);
+"""
+
+
+def _standardise(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame(index=range(len(df)))
+    for col, aliases in COLUMN_ALIASES.items():
+        found = next((a for a in aliases if a in df.columns), None)
+        if found is None and col == "gene":
+            raise ValueError(f"DEG table has no gene column (one of {aliases})")
+        out[col] = df[found].to_numpy() if found else None
+    out["gene"] = out["gene"].astype(str)
+    out["gene_upper"] = out["gene"].str.upper()
+    out["rank"] = range(len(out))  # row order of the producer (its own ranking)
+    return out
+
+
+def write_deg_store(db_path: Path, tables: dict) -> Path:
+    """
+    {(source, contrast): DataFrame} -> db_path, written to a temp file and renamed into place
+    so readers never see a half-built database.
+    """
+    db_path = Path(db_path)
+    tmp = db_path.with_name(f".{db_path.name}.{uuid.uuid4().hex}")
+    con = sqlite3.connect(tmp)
+    try:
+        con.execute("PRAGMA journal_mode = OFF")  # private temp file until the rename
+        con.execute("PRAGMA synchronous = OFF")
+        con.executescript(SCHEMA)
+        for (source, contrast), df in tables.items():
+            rows = _standardise(df)
+            rows.insert(0, "contrast", contrast)
+            rows.insert(0, "source", source)
+            rows = rows[["source", "contrast", "rank", "gene", "gene_upper", "logfc", "pval", "fdr", "score"]]
+            con.executemany("INSERT INTO deg VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            rows.astype(object).where(rows.notna(), None).itertuples(index=False))
+        con.commit()
+        con.execute("ANALYZE")
+    finally:
+        con.close()
+    os.replace(tmp, db_path)
+    return db_path
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    if not Path(db_path).exists():
+        raise FileNotFoundError(f"No DEG store: {db_path}")
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    con.row_factory = sqlite3.Row
+    return con
+
+
+def list_deg_tables(db_path: Path) -> list[dict]:
+    """[{source, contrast, genes}] stored for a job"""
+    with closing(_connect(db_path)) as con:
+        rows = con.execute("SELECT source, contrast, COUNT(*) AS genes FROM deg "
+                           "GROUP BY source, contrast ORDER BY source, contrast").fetchall()
+    return [dict(r) for r in rows]
+
+
+def query_deg(db_path: Path, source: str, contrast: str | None = None,
+              fdr_max: float | None = None, min_abs_logfc: float | None = None,
+              logfc_min: float | None = None, logfc_max: float | None = None,
+              gene_prefix: str | None = None, sort: str = "fdr", descending: bool = False,
+              limit: int = 50, offset: int = 0) -> tuple[int, list[dict]]:
+    """One page of a DEG table -> (matching row count, rows)"""
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column: {sort} (one of {', '.join(SORT_COLUMNS)})")
+    where, args = ["source = ?"], [source]
+    if contrast is not None:
+        where.append("contrast = ?")
+        args.append(contrast)
+    if fdr_max is not None:
+        where.append("fdr <= ?")
+        args.append(fdr_max)
+    if min_abs_logfc is not None:
+        where.append("(logfc >= ? OR logfc <= ?)")  # index-friendly ABS(logfc) >= x
+        args += [min_abs_logfc, -min_abs_logfc]
+    if logfc_min is not None:
+        where.append("logfc >= ?")
+        args.append(logfc_min)
+    if logfc_max is not None:
+        where.append("logfc <= ?")
+        args.append(logfc_max)
+    if gene_prefix:
+        prefix = gene_prefix.upper()
+        where.append("gene_upper >= ? AND gene_upper < ?")  # range scan on the gene index
+        args += [prefix, prefix + "\U0010ffff"]
+    clause = " AND ".join(where)
+    #NaN is stored as NULL, which SQLite sorts first: untestable genes go last in both directions
+    col = SORT_COLUMNS[sort]
+    order = f"{col} IS NULL, {col} {'DESC' if descending else 'ASC'}, rank"
+    with closing(_connect(db_path)) as con:
+        total = con.execute(f"SELECT COUNT(*) FROM deg WHERE {clause}", args).fetchone()[0]
+        rows = con.execute(f"SELECT contrast, rank, gene, logfc, pval, fdr, score FROM deg "
+                           f"WHERE {clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                           args + [limit, offset]).fetchall()
+    return total, [dict(r) for r in rows]
@@ -0,0 +1,82 @@
+import time
+
+import scanpy as sc
+from scipy import sparse
+
+#? Shared embedding engine: PCA -> kNN graph -> UMAP, each computed once per AnnData
+##results live in adata.obsm["X_pca"] / obsp["connectivities", "distances"] / obsm["X_umap"]
+##every plot + clustering step calls ensure_*() and reuses them instead of running its own PCA/UMAP
+##PCA: truncated SVD straight on the log-normalised matrix, no dense copy
+##  sparse X -> ARPACK with implicit centering, dense X -> randomized SVD
+##kNN: pynndescent (approximate) above APPROX_NN_MIN_CELLS, exact brute force below (fast + exact there)
+
+APPROX_NN_MIN_CELLS = 4096
+
+
+def ensure_pca(adata, n_comps: int = 30, svd_solver: str | None = None, random_state: int = 0) -> bool:
+    """adata.obsm["X_pca"] with at least n_comps components; False if it was already there"""
+    n_comps = min(n_comps, min(adata.shape) - 1)
+    if "X_pca" in adata.obsm and adata.obsm["X_pca"].shape[1] >= n_comps:
+        return False
+    if svd_solver is None:
+        svd_solver = "arpack" if sparse.issparse(adata.X) else "randomized"
+    sc.pp.pca(adata, n_comps=n_comps, svd_solver=svd_solver, random_state=random_state)
+    return True
+
+
+def knn_transformer(n_obs: int, method: str = "auto") -> str:
+    if method != "auto":
+        return method
+    return "pynndescent" if n_obs >= APPROX_NN_MIN_CELLS else "sklearn"
+
+
+def ensure_neighbors(adata, n_neighbors: int = 5, n_pcs: int = 30, knn: str = "auto",
+                     random_state: int = 0) -> bool:
+    """kNN graph on X_pca (built once); rebuilt only when n_neighbors / n_pcs changed"""
+    n_pcs = min(n_pcs, min(adata.shape) - 1)
+    params = adata.uns.get("neighbors", {}).get("params", {})
+    if (params.get("n_neighbors") == n_neighbors and params.get("n_pcs") == n_pcs
+            and "connectivities" in adata.obsp):
+        return False
+    ensure_pca(adata, n_pcs)
+    adata.obsm.pop("X_umap", None)  # laid out on the old graph
+    sc.pp.neighbors(adata, n_neighbors=n_neighbors, n_pcs=n_pcs, use_rep="X_pca",
+                    transformer=knn_transformer(adata.n_obs, knn), random_state=random_state)
+    return True
+
+
+def ensure_umap(adata, random_state: int = 0) -> bool:
+    """adata.obsm["X_umap"] from the shared neighbour graph"""
+    if "X_umap" in adata.obsm:
+        return False
+    sc.tl.umap(adata, random_state=random_state)
+    return True
+
+
+def compute_embedding(adata, n_neighbors: int = 5, n_pcs: int = 30, knn: str = "auto",
+                      random_state: int = 0) -> dict:
+    """PCA + neighbours + UMAP (whatever is missing) -> {step: seconds} of the steps actually run"""
+    timings = {}
+    for step, fn in (("pca", lambda: ensure_pca(adata, n_pcs, random_state=random_state)),
+                     ("neighbors", lambda: ensure_neighbors(adata, n_neighbors, n_pcs, knn, random_state)),
+                     ("umap", lambda: ensure_umap(adata, random_state))):
+        t0 = time.perf_counter()
+        if fn():
+            timings[step] = round(time.perf_counter() - t0, 3)
+    return timings
+
+
+def warm_up() -> float:
+    """
+    Run the engine once on a tiny random matrix so numba compiles umap / pynndescent kernels now.
+    Called by the warm pipeline workers before they fork jobs -> every job inherits compiled code.
+    """
+    import anndata as ad
+    import numpy as np
+
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(0)
+    for n_obs in (200, APPROX_NN_MIN_CELLS):  # exact and approximate kNN paths
+        adata = ad.AnnData(X=rng.random((n_obs, 20), dtype=np.float32))
+        compute_embedding(adata, n_neighbors=5, n_pcs=10)
+    return time.perf_counter() - t0
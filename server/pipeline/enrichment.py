@@ -0,0 +1,174 @@
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import hypergeom
+from statsmodels.stats.multitest import multipletests  # FDR p-value
+
+#? Offline gene-set enrichment (replaces the enrichr web call)
+##GMT libraries live on disk: genesets/<name>.gmt
+##first use builds a binary index next to it: genesets/<name>.index.npz (terms x genes CSR membership)
+##all gene lists are tested in one sparse matrix product + vectorised hypergeometric tail
+##output columns match gseapy.enrichr results, so gseapy.plot.dotplot works unchanged
+
+INDEX_VERSION = 1
+RESULT_COLUMNS = ["Gene_set", "Term", "Overlap", "P-value", "Adjusted P-value",
+                  "Odds Ratio", "Combined Score", "Genes"]
+
+
+def read_gmt(gmt_file: Path) -> dict:
+    """GMT: term <tab> description <tab> gene1 <tab> gene2 ... -> {term: [genes]}"""
+    gene_sets = {}
+    with open(gmt_file) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 3:
+                continue
+            genes = [g.split(",")[0].strip().upper() for g in fields[2:] if g.strip()]
+            gene_sets[fields[0]] = sorted(set(genes))
+    return gene_sets
+
+
+class GeneSetIndex:
+    """Precomputed membership matrix of one gene-set library"""
+
+    def __init__(self, name: str, terms: np.ndarray, genes: np.ndarray, membership: sparse.csr_matrix):
+        self.name = name
+        self.terms = terms
+        self.genes = genes
+        self.membership = membership  # terms x genes, 1 = gene in term
+        self.term_sizes = np.diff(membership.indptr)
+        self.gene_pos = {g: i for i, g in enumerate(genes)}
+
+    @classmethod
+    def from_gene_sets(cls, name: str, gene_sets: dict) -> "GeneSetIndex":
+        genes = np.array(sorted({g for members in gene_sets.values() for g in members}))
+        gene_pos = {g: i for i, g in enumerate(genes)}
+        terms = np.array(list(gene_sets))
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(gene_sets[t]) for t in terms])
+        indices = np.fromiter((gene_pos[g] for t in terms for g in gene_sets[t]),
+                              dtype=np.int32, count=indptr[-1])
+        membership = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                                       shape=(len(terms), len(genes)))
+        return cls(name, terms, genes, membership)
+
+    def save(self, path: Path, source_stat: os.stat_result) -> None:
+        np.savez(path, version=INDEX_VERSION, terms=self.terms, genes=self.genes,
+                 indptr=self.membership.indptr, indices=self.membership.indices,
+                 source_size=source_stat.st_size, source_mtime=source_stat.st_mtime)
+
+    @classmethod
+    def load(cls, name: str, path: Path) -> "GeneSetIndex":
+        z = np.load(path)
+        indices = z["indices"]
+        membership = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, z["indptr"]),
+                                       shape=(len(z["terms"]), len(z["genes"])))
+        return cls(name, z["terms"], z["genes"], membership)
+
+
+def load_library(name: str, geneset_dir: Path) -> GeneSetIndex:
+    """Index for genesets/<name>.gmt, (re)built when the GMT is newer than the index"""
+    gmt_file = Path(geneset_dir) / f"{name}.gmt"
+    index_file = Path(geneset_dir) / f"{name}.index.npz"
+    if not gmt_file.exists():
+        raise FileNotFoundError(
+            f"Gene-set library not found: {gmt_file} "
+            f"(fetch it once with: python -m pipeline.enrichment --download {name})")
+    stat = gmt_file.stat()
+    if index_file.exists():
+        with np.load(index_file) as z:
+            fresh = (int(z["version"]) == INDEX_VERSION and int(z["source_size"]) == stat.st_size
+                     and float(z["source_mtime"]) == stat.st_mtime)
+        if fresh:
+            return GeneSetIndex.load(name, index_file)
+    index = GeneSetIndex.from_gene_sets(name, read_gmt(gmt_file))
+    index.save(index_file, stat)
+    return index
+
+
+def enrich(index: GeneSetIndex, gene_lists: dict, cutoff: float = 1.0) -> dict:
+    """
+    Hypergeometric (one-sided Fisher) test of every term for every gene list, BH FDR per list.
+    Background = all genes of the library (same as gseapy's offline enrich).
+    Input: {label: [genes]} -> Output: {label: DataFrame with RESULT_COLUMNS}
+    """
+    labels = list(gene_lists)
+    N = len(index.genes)
+
+    # --- 1. Gene lists -> genes x lists indicator matrix ---
+    cols, rows = [], []
+    for j, label in enumerate(labels):
+        pos = {index.gene_pos[g] for g in (str(x).upper() for x in gene_lists[label]) if g in index.gene_pos}
+        rows.extend(pos)
+        cols.extend([j] * len(pos))
+    Q = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(N, len(labels)))
+    n = np.asarray(Q.sum(axis=0)).ravel()                     # list sizes within background
+
+    # --- 2. Overlaps for all terms x lists in one product ---
+    k = np.asarray((index.membership @ Q).todense())          # terms x lists
+    K = index.term_sizes[:, None]
+
+    # --- 3. Vectorised statistics ---
+    pvals = hypergeom.sf(k - 1, N, K, n[None, :])
+    a, b, c, d = k, K - k, n[None, :] - k, N - K - n[None, :] + k
+    zero_cell = (a == 0) | (b == 0) | (c == 0) | (d == 0)      # Haldane-Anscombe correction
+    with np.errstate(divide="ignore", invalid="ignore"):
+        odds = np.where(zero_cell, ((a + .5) * (d + .5)) / ((b + .5) * (c + .5)), (a * d) / (b * c))
+    combined = -np.log(np.clip(pvals, 1e-300, None)) * odds
+
+    results = {}
+    Qc = Q.tocsc()
+    for j, label in enumerate(labels):
+        hit = np.flatnonzero(k[:, j] > 0)
+        if hit.size == 0:
+            results[label] = pd.DataFrame(columns=RESULT_COLUMNS)
+            continue
+        _, fdr, _, _ = multipletests(pvals[hit, j], method="fdr_bh")
+        query = np.zeros(N, dtype=bool)
+        query[Qc.indices[Qc.indptr[j]:Qc.indptr[j + 1]]] = True
+        M = index.membership
+        overlap_genes = [";".join(index.genes[M.indices[M.indptr[t]:M.indptr[t + 1]]
+                                              [query[M.indices[M.indptr[t]:M.indptr[t + 1]]]]])
+                         for t in hit]
+        df = pd.DataFrame({
+            "Gene_set": index.name,
+            "Term": index.terms[hit],
+            "Overlap": [f"{int(k[t, j])}/{int(index.term_sizes[t])}" for t in hit],
+            "P-value": pvals[hit, j],
+            "Adjusted P-value": fdr,
+            "Odds Ratio": odds[hit, j],
+            "Combined Score": combined[hit, j],
+            "Genes": overlap_genes,
+        })
+        df = df[df["Adjusted P-value"] <= cutoff]
+        results[label] = df.sort_values("P-value").reset_index(drop=True)
+    return results
+
+
+def download_library(name: str, geneset_dir: Path, organism: str = "Human") -> Path:
+    """One-off fetch of an Enrichr library into genesets/<name>.gmt (needs network)"""
+    from gseapy import get_library
+
+    gene_sets = get_library(name=name, organism=organism)
+    Path(geneset_dir).mkdir(parents=True, exist_ok=True)
+    gmt_file = Path(geneset_dir) / f"{name}.gmt"
+    with open(gmt_file, "w") as f:
+        for term, genes in gene_sets.items():
+            f.write("\t".join([term, ""] + list(genes)) + "\n")
+    return gmt_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline gene-set libraries")
+    parser.add_argument("--download", metavar="LIBRARY", required=True,
+                        help="Enrichr library name, e.g. GO_Biological_Process_2021")
+    parser.add_argument("--organism", default="Human")
+    parser.add_argument("--geneset-dir", type=Path, default=Path(__file__).parent.parent / "genesets")
+    args = parser.parse_args()
+    path = download_library(args.download, args.geneset_dir, args.organism)
+    load_library(args.download, args.geneset_dir)  # build the index right away
+    print(f"Saved {path}")
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+
+#? Compact binary payloads for client-side plots (results/viz/, served by GET /viz/<job_id>/<file>)
+##manifest.json describes every array: file name, dtype, shape, category labels -> the client fetches the
+##binaries as ArrayBuffers and wraps them in typed arrays (little-endian, no parsing)
+##  cells.u32       row of each shown cell in the full AnnData (the sample below)
+##  umap.f32        shown cells x 2 UMAP coordinates
+##  obs_<i>.u8/u16  category codes of each covariate / cluster column, MISSING = the dtype's max value
+##  deg_logfc.f32, deg_fdr.f32 (+ gene names in the manifest) for the volcano plot
+##large datasets: density-preserving sample on a grid over the UMAP: every occupied bin keeps up to
+##min_per_bin cells, the rest of the budget is shared in proportion to the bin counts
+##-> dense regions keep their relative density, rare populations and outliers stay visible
+##each file also gets a .gz twin (written once here, not per request)
+
+VIZ_DIR = "viz"
+MANIFEST = "manifest.json"
+
+
+def density_sample(coords: np.ndarray, max_points: int, grid: int = 64, min_per_bin: int = 8,
+                   seed: int = 0) -> np.ndarray:
+    """Sorted row indices of about max_points cells: min_per_bin per occupied grid bin + a proportional share"""
+    n = len(coords)
+    if n <= max_points:
+        return np.arange(n)
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    cell = np.floor((coords - lo) / np.where(hi > lo, hi - lo, 1) * (grid - 1e-9)).astype(np.int64)
+    bins = cell[:, 0] * grid + cell[:, 1]
+    counts = np.bincount(bins, minlength=grid * grid)
+    floor = np.minimum(counts, min_per_bin)
+    share = max(0, max_points - int(floor.sum())) / n
+    quota = np.minimum(counts, np.maximum(floor, np.floor(counts * share))).astype(np.int64)
+
+    #random rank of each cell inside its bin: sort by (bin, random key), subtract the bin's first position
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(n), bins))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(n) - starts[bins[order]]
+    return np.sort(order[rank < quota[bins[order]]])
+
+
+def _codes(values: pd.Series) -> tuple[np.ndarray, list]:
+    cat = values.astype("category")
+    categories = [str(c) for c in cat.cat.categories]
+    dtype = np.uint8 if len(categories) < np.iinfo(np.uint8).max else np.uint16
+    codes = cat.cat.codes.to_numpy().astype(np.int64)
+    codes[codes < 0] = np.iinfo(dtype).max
+    return codes.astype(dtype), categories
+
+
+def _array(files: dict, name: str, values: np.ndarray) -> dict:
+    values = np.ascontiguousarray(values)
+    files[name] = values.astype(values.dtype.newbyteorder("<")).tobytes()
+    return {"file": name, "dtype": values.dtype.name, "shape": list(values.shape)}
+
+
+def build_payload(adata, deg_df: pd.DataFrame, p: dict, version: str = "") -> dict:
+    """AnnData with X_umap + DEG table -> {filename: bytes} (manifest + arrays + .gz twins)"""
+    coords = np.asarray(adata.obsm["X_umap"], dtype=np.float32)
+    index = density_sample(coords, p["max_points"], p["grid"], p["min_per_bin"], p["seed"])
+    files = {}
+    manifest = {
+        "version": version,
+        "cells": {"total": len(coords), "shown": len(index), **_array(files, "cells.u32", index.astype(np.uint32))},
+        "umap": _array(files, "umap.f32", coords[index]),
+        "obs": {},
+    }
+    for i, col in enumerate(c for c in p["obs"] if c in adata.obs):
+        codes, categories = _codes(adata.obs[col].iloc[index])
+        entry = _array(files, f"obs_{i}.{'u8' if codes.dtype == np.uint8 else 'u16'}", codes)
+        manifest["obs"][col] = {**entry, "categories": categories, "missing": int(np.iinfo(codes.dtype).max)}
+    if deg_df is not None:
+        manifest["deg"] = {
+            "genes": deg_df["names"].astype(str).tolist(),
+            "logfc": _array(files, "deg_logfc.f32", deg_df["logfoldchanges"].to_numpy(np.float32)),
+            "fdr": _array(files, "deg_fdr.f32", deg_df["pvals_adj"].to_numpy(np.float32)),
+        }
+    files[MANIFEST] = json.dumps(manifest).encode()
+    for name in list(files):
+        files[name + ".gz"] = gzip.compress(files[name], compresslevel=6, mtime=0)
+    return files
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+from scipy import sparse
+
+from pipeline.profiling import current_rss_bytes, mb
+
+#? Binary cache of uploaded tables (parse the CSV once, memory-map afterwards)
+##cache/ingest/<sha256 of file>/
+##   expression: cells x genes float32, obs_names.npy, var_names.npy, manifest.json
+##               sparse (density < DENSE_THRESHOLD): CSR parts X_data.npy, X_indices.npy, X_indptr.npy
+##               dense: X.npy
+##   metadata:   meta.pkl, manifest.json
+##content-addressed: re-uploading the same file re-uses the same cache
+##building it never holds the table: every CSV chunk's non-zeros are appended to parts_*.bin on disk,
+##then scattered chunk by chunk into the memory-mapped .npy files -> memory ~ one chunk, not the matrix
+
+CACHE_VERSION = 2
+HASH_CHUNK = 1024 * 1024
+CSV_CHUNK_ROWS = 2000   # genes parsed per block
+DENSE_THRESHOLD = 0.5   # store dense above this fraction of non-zeros
+PARTS_DATA, PARTS_INDICES = "parts_data.bin", "parts_indices.bin"  # per-chunk non-zeros while building
+
+
+def file_sha256(path: Path) -> str:
+    """Streaming sha256 of a file"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _publish(tmp_dir: Path, cache_dir: Path) -> Path:
+    """Atomically move a finished cache into place (first writer wins, a stale / partial dir is replaced)"""
+    for _ in range(3):
+        try:
+            os.rename(tmp_dir, cache_dir)
+            return cache_dir
+        except OSError:
+            if read_manifest(cache_dir):
+                # another run built the same cache meanwhile
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return cache_dir
+        #older CACHE_VERSION or no manifest: move it aside (a reader may still have it open), then delete
+        stale = cache_dir.parent / f".tmp-{uuid.uuid4().hex}"
+        try:
+            os.rename(cache_dir, stale)
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(stale, ignore_errors=True)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    raise OSError(f"Could not publish the ingest cache {cache_dir}")
+
+
+def _require_manifest(cache_dir: Path) -> dict:
+    info = read_manifest(cache_dir)
+    if info is None:
+        raise FileNotFoundError(f"No ingest cache of version {CACHE_VERSION} in {cache_dir} "
+                                f"(missing or stale manifest.json)")
+    return info
+
+
+def _write_manifest(path: Path, **info) -> dict:
+    info = {"version": CACHE_VERSION, **info}
+    (path / "manifest.json").write_text(json.dumps(info, indent=2))
+    return info
+
+
+def read_manifest(cache_dir: Path) -> dict | None:
+    try:
+        info = json.loads((Path(cache_dir) / "manifest.json").read_text())
+    except (OSError, ValueError):
+        return None
+    return info if info.get("version") == CACHE_VERSION else None
+
+
+def parse_expression_parts(expr_file: Path, out_dir: Path, chunksize: int = CSV_CHUNK_ROWS) -> dict:
+    """
+    Parse genes x samples CSV block by block, appending each block's non-zeros to out_dir/parts_*.bin
+    (= cells x genes in column order) -> {"cells", "genes", "gene_nnz", "cell_nnz", "blocks"}
+    memory is bounded by one CSV chunk: the table is never held whole, dense or sparse
+    """
+    out_dir = Path(out_dir)
+    genes, gene_nnz, blocks = [], [], []
+    cells, cell_nnz = None, None
+    with open(out_dir / PARTS_DATA, "wb") as f_data, open(out_dir / PARTS_INDICES, "wb") as f_indices:
+        for chunk in pd.read_csv(expr_file, index_col=0, chunksize=chunksize):
+            chunk = chunk.dropna(how='any') #dropna row, same as load_expression_data
+            if cells is None:
+                cells = chunk.columns
+                cell_nnz = np.zeros(len(cells), dtype=np.int64)
+            block = sparse.csr_matrix(chunk.to_numpy(dtype=np.float32))  # genes x cells
+            block.data.astype(np.float32, copy=False).tofile(f_data)
+            block.indices.astype(np.int32, copy=False).tofile(f_indices)
+            cell_nnz += np.bincount(block.indices, minlength=len(cells))
+            gene_nnz.append(np.diff(block.indptr))
+            genes.append(chunk.index)
+            blocks.append(block.shape[0])
+    if cells is None:
+        raise ValueError(f"Expression file is empty: {expr_file}")
+    genes = genes[0].append(genes[1:]) if len(genes) > 1 else genes[0]
+    return {"cells": cells, "genes": genes, "gene_nnz": np.concatenate(gene_nnz),
+            "cell_nnz": cell_nnz, "blocks": blocks}
+
+
+def _column_blocks(out_dir: Path, parts: dict):
+    """(gene ids, cell ids, values) of every parsed block, read back one block at a time"""
+    gene_nnz = parts["gene_nnz"]
+    g0 = 0
+    with open(out_dir / PARTS_DATA, "rb") as f_data, open(out_dir / PARTS_INDICES, "rb") as f_indices:
+        for n_genes in parts["blocks"]:
+            g1 = g0 + n_genes
+            n = int(gene_nnz[g0:g1].sum())
+            values = np.fromfile(f_data, dtype=np.float32, count=n)
+            cell_ids = np.fromfile(f_indices, dtype=np.int32, count=n)
+            gene_ids = np.repeat(np.arange(g0, g1), gene_nnz[g0:g1])
+            yield gene_ids, cell_ids, values
+            g0 = g1
+
+
+def _write_csr(out_dir: Path, parts: dict) -> None:
+    """Scatter the column blocks into memory-mapped X_data / X_indices / X_indptr (cells x genes CSR)"""
+    cell_nnz = parts["cell_nnz"]
+    n_cells, nnz = len(cell_nnz), int(cell_nnz.sum())
+    idx_dtype = np.int32 if max(nnz, len(parts["genes"])) < np.iinfo(np.int32).max else np.int64
+    indptr = np.zeros(n_cells + 1, dtype=idx_dtype)
+    np.cumsum(cell_nnz, out=indptr[1:])
+    np.save(out_dir / "X_indptr.npy", indptr)
+    if nnz == 0:
+        np.save(out_dir / "X_data.npy", np.zeros(0, dtype=np.float32))
+        np.save(out_dir / "X_indices.npy", np.zeros(0, dtype=idx_dtype))
+        return
+    data = open_memmap(out_dir / "X_data.npy", mode="w+", dtype=np.float32, shape=(nnz,))
+    indices = open_memmap(out_dir / "X_indices.npy", mode="w+", dtype=idx_dtype, shape=(nnz,))
+    fill = indptr[:-1].astype(np.int64)  # next free slot of every cell
+    for gene_ids, cell_ids, values in _column_blocks(out_dir, parts):
+        #stable: a cell's entries stay in gene order -> sorted indices without a sort pass
+        order = np.argsort(cell_ids, kind="stable")
+        c = cell_ids[order]
+        counts = np.bincount(c, minlength=n_cells)
+        first = np.cumsum(counts) - counts  # where each cell's run starts in c
+        dest = fill[c] + (np.arange(len(c)) - first[c])
+        data[dest] = values[order]
+        indices[dest] = gene_ids[order]
+        fill += counts
+    data.flush()
+    indices.flush()
+    del data, indices
+
+
+def _write_dense(out_dir: Path, parts: dict) -> None:
+    X = open_memmap(out_dir / "X.npy", mode="w+", dtype=np.float32,
+                    shape=(len(parts["cells"]), len(parts["genes"])))  # zero-filled
+    for gene_ids, cell_ids, values in _column_blocks(out_dir, parts):
+        X[cell_ids, gene_ids] = values
+    X.flush()
+    del X
+
+
+def build_expression_cache(expr_file: Path, cache_root: Path, digest: str | None = None) -> Path:
+    """Parse genes x samples CSV once -> cells x genes float32 (CSR or dense .npy), one chunk in memory at a time"""
+    digest = digest or file_sha256(expr_file)
+    cache_dir = Path(cache_root) / digest
+    if read_manifest(cache_dir):
+        os.utime(cache_dir)  # last use, for the storage manager's LRU
+        return cache_dir
+
+    rss_before = current_rss_bytes()
+    tmp_dir = Path(cache_root) / f".tmp-{uuid.uuid4().hex}"
+    tmp_dir.mkdir(parents=True)
+    try:
+        t0 = time.perf_counter()
+        parts = parse_expression_parts(expr_file, tmp_dir)
+        parse_seconds = time.perf_counter() - t0
+        shape = [len(parts["cells"]), len(parts["genes"])]
+        density = int(parts["cell_nnz"].sum()) / max(shape[0] * shape[1], 1)
+        fmt = "csr" if density < DENSE_THRESHOLD else "dense"
+        (_write_csr if fmt == "csr" else _write_dense)(tmp_dir, parts)
+        (tmp_dir / PARTS_DATA).unlink()
+        (tmp_dir / PARTS_INDICES).unlink()
+        np.save(tmp_dir / "obs_names.npy", parts["cells"].astype(str).to_numpy(dtype=str))
+        np.save(tmp_dir / "var_names.npy", parts["genes"].astype(str).to_numpy(dtype=str))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    rss_after = current_rss_bytes()
+
+    info = _write_manifest(
+        tmp_dir, kind="expression", source=Path(expr_file).name, sha256=digest,
+        shape=shape, dtype="float32", format=fmt, density=round(density, 4),
+        parse_seconds=round(parse_seconds, 3), write_seconds=round(time.perf_counter() - t0 - parse_seconds, 3),
+        rss_before_mb=mb(rss_before), rss_after_mb=mb(rss_after),
+    )
+    print(f" Ingested {info['source']}: {info['shape']} {fmt} (density {info['density']}) "
+          f"in {info['parse_seconds']}s + {info['write_seconds']}s (RSS {info['rss_before_mb']} -> "
+          f"{info['rss_after_mb']} MB)")
+    return _publish(tmp_dir, cache_dir)
+
+
+def build_metadata_cache(meta_file: Path, cache_root: Path, digest: str | None = None) -> Path:
+    """Parse samples x covariates CSV once -> pickled DataFrame"""
+    digest = digest or file_sha256(meta_file)
+    cache_dir = Path(cache_root) / digest
+    if read_manifest(cache_dir):
+        os.utime(cache_dir)  # last use, for the storage manager's LRU
+        return cache_dir
+
+    t0 = time.perf_counter()
+    df = pd.read_csv(meta_file, index_col=0)
+    df = df.dropna(how='any') #dropna row, same as load_metadata
+    parse_seconds = time.perf_counter() - t0
+
+    tmp_dir = Path(cache_root) / f".tmp-{uuid.uuid4().hex}"
+    tmp_dir.mkdir(parents=True)
+    df.to_pickle(tmp_dir / "meta.pkl")
+    _write_manifest(tmp_dir, kind="metadata", source=Path(meta_file).name, sha256=digest,
+                    shape=list(df.shape), parse_seconds=round(parse_seconds, 3))
+    return _publish(tmp_dir, cache_dir)
+
+
+def load_expression_cache(cache_dir: Path):
+    """-> (X memory-mapped cells x genes float32 CSR or ndarray, obs_names, var_names)"""
+    cache_dir = Path(cache_dir)
+    info = _require_manifest(cache_dir)
+    if info["format"] == "csr":
+        X = sparse.csr_matrix((np.load(cache_dir / "X_data.npy", mmap_mode="r"),
+                               np.load(cache_dir / "X_indices.npy", mmap_mode="r"),
+                               np.load(cache_dir / "X_indptr.npy", mmap_mode="r")),
+                              shape=tuple(info["shape"]), copy=False)
+    else:
+        X = np.load(cache_dir / "X.npy", mmap_mode="r")
+    obs_names = np.load(cache_dir / "obs_names.npy")
+    var_names = np.load(cache_dir / "var_names.npy")
+    return X, obs_names, var_names
+
+
+def load_metadata_cache(cache_dir: Path) -> pd.DataFrame:
+    _require_manifest(cache_dir)
+    return pd.read_pickle(Path(cache_dir) / "meta.pkl")
+
+
+def align_metadata(meta_df: pd.DataFrame, obs_names) -> pd.DataFrame:
+    """Covariate rows reordered to the expression rows by sample ID (never by position)"""
+    meta_df = meta_df.set_axis(meta_df.index.astype(str))
+    obs_names = pd.Index(obs_names).astype(str)
+    missing = obs_names.difference(meta_df.index)
+    if len(missing):
+        raise ValueError(f"{len(missing)} expression sample(s) without a covariate row: "
+                         f"{', '.join(missing[:5])}")
+    return meta_df.loc[obs_names]
+
+
+def ingest(expr_file: Path, meta_file: Path, cache_root: Path, digests: dict | None = None) -> dict:
+    """Build (or re-use) both caches, return their locations (digests: sha256 already known from /upload)"""
+    cache_root = Path(cache_root) / "ingest"
+    cache_root.mkdir(parents=True, exist_ok=True)
+    digests = digests or {}
+    return {
+        "expression": build_expression_cache(expr_file, cache_root, digests.get("expression")),
+        "metadata": build_metadata_cache(meta_file, cache_root, digests.get("metadata")),
+    }
@@ -0,0 +1,154 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scanpy as sc
+from scipy import sparse
+
+from pipeline.ingest import align_metadata
+from pipeline.profiling import current_rss_bytes, memory_budget_bytes
+
+#? Out-of-core preprocessing: QC, cell/gene filters, normalize_total + log1p in row blocks
+##input = the memory-mapped ingest cache (CSR parts or dense X.npy), read BLOCK_BYTES of rows at a time
+##pass 1: QC metrics (same columns as runner.qc_metrics) -> 5-95 percentile cell filter
+##pass 2: per gene, kept cells with >= 2 counts -> gene filter (>= 10 cells)
+##pass 3: kept rows x kept genes, normalise to scale_factor, log1p -> raw CSR files in out_dir
+##out_dir is memory-mapped back as adata.X, so only per-cell / per-gene vectors and one block live in RAM
+
+BLOCK_BYTES = 64 * 1024 ** 2
+IN_MEMORY_FACTOR = 3  # in-memory path: cache pages + filtered copy + normalised copy of X
+MANIFEST = "manifest.json"
+
+
+def estimate_preprocess_bytes(info: dict) -> int:
+    """Peak memory of the in-memory preprocess path, from the ingest manifest"""
+    n_rows, n_cols = info["shape"]
+    if info["format"] == "csr":
+        x_bytes = int(n_rows * n_cols * info["density"]) * 8 + (n_rows + 1) * 8  # float32 + int32 index
+    else:
+        x_bytes = n_rows * n_cols * 4
+    return IN_MEMORY_FACTOR * x_bytes
+
+
+def choose_mode(info: dict, mode: str = "auto") -> str:
+    """"memory" or "chunked"; auto = chunked when the estimate exceeds what is left of the memory cap"""
+    if mode != "auto":
+        return mode
+    budget = memory_budget_bytes()
+    if budget is None:
+        return "memory"
+    need = estimate_preprocess_bytes(info)
+    left = budget - current_rss_bytes()
+    if need > left:
+        print(f" Preprocess needs ~{need // 1024 ** 2} MB in memory, {left // 1024 ** 2} MB left "
+              f"under the cap -> out-of-core mode")
+        return "chunked"
+    return "memory"
+
+
+def _row_blocks(X, block_bytes: int):
+    """(start, CSR copy of rows start:stop) over a memory-mapped CSR or dense matrix"""
+    n_rows, n_cols = X.shape
+    if sparse.issparse(X):
+        row_bytes = max(8 * X.nnz // max(n_rows, 1), 1)
+    else:
+        row_bytes = 4 * max(n_cols, 1)
+    step = max(1, block_bytes // row_bytes)
+    for start in range(0, n_rows, step):
+        block = sparse.csr_matrix(X[start:start + step], dtype=np.float32)
+        block.eliminate_zeros()  # our copy, never the cache
+        yield start, block
+
+
+def preprocess_chunked(X, obs_names, var_names, meta_df: pd.DataFrame, out_dir: Path,
+                       scale_factor=10000, block_bytes: int = BLOCK_BYTES) -> None:
+    """Same filters + normalisation as runner.scanpy_preprocess_matrix, written to out_dir block by block"""
+    out_dir = Path(out_dir)
+    obs_names = pd.Index(obs_names)
+    if obs_names.duplicated().any():
+        raise ValueError("Duplicated sample IDs found in expression data.")
+    meta_df = align_metadata(meta_df, obs_names)  # labels follow sample IDs, not row order
+    n_rows, n_cols = X.shape
+
+    # --- pass 1: QC metrics ---
+    n_genes = np.empty(n_rows, dtype=np.int64)
+    cell_totals = np.empty(n_rows)
+    n_cells = np.zeros(n_cols, dtype=np.int64)
+    gene_totals = np.zeros(n_cols)
+    for start, block in _row_blocks(X, block_bytes):
+        stop = start + block.shape[0]
+        n_genes[start:stop] = np.diff(block.indptr)
+        cell_totals[start:stop] = np.asarray(block.sum(axis=1, dtype=np.float64)).ravel()
+        n_cells += np.bincount(block.indices, minlength=n_cols)
+        gene_totals += np.bincount(block.indices, weights=block.data, minlength=n_cols)
+
+    obs = meta_df.copy()
+    obs["oupSample.batchCond"] = obs["oupSample.batchCond"].astype("category")
+    obs["n_genes_by_counts"] = n_genes
+    obs["log1p_n_genes_by_counts"] = np.log1p(n_genes)
+    obs["total_counts"] = cell_totals
+    obs["log1p_total_counts"] = np.log1p(cell_totals)
+    var = pd.DataFrame(index=pd.Index(var_names).astype(str))
+    var["n_cells_by_counts"] = n_cells
+    var["mean_counts"] = gene_totals / n_rows
+    var["log1p_mean_counts"] = np.log1p(var["mean_counts"])
+    var["pct_dropout_by_counts"] = (1 - n_cells / n_rows) * 100
+    var["total_counts"] = gene_totals
+    var["log1p_total_counts"] = np.log1p(gene_totals)
+
+    # --- cell filter: 5% ~ 95% of gene count and RNA count ---
+    min_genes, max_genes = np.percentile(n_genes, [5, 95])
+    min_counts, max_counts = np.percentile(cell_totals, [5, 95])
+    cell_filter = ((n_genes >= min_genes) & (n_genes <= max_genes) &
+                   (cell_totals >= min_counts) & (cell_totals <= max_counts))
+    print(f"✅ After cell filtering → shape: {(int(cell_filter.sum()), n_cols)}")
+
+    # --- pass 2: genes expressed in >= 10 kept cells with >= 2 counts ---
+    hits = np.zeros(n_cols, dtype=np.int64)
+    for start, block in _row_blocks(X, block_bytes):
+        block = block[cell_filter[start:start + block.shape[0]]]
+        hits += np.bincount(block.indices[block.data >= 2], minlength=n_cols)
+    gene_filter = hits >= 10
+    n_kept_genes = int(gene_filter.sum())
+    print(f"✅ After gene filtering → shape: {(int(cell_filter.sum()), n_kept_genes)}")
+
+    # --- pass 3: subset, normalize_total(target_sum=scale_factor), log1p -> out_dir ---
+    indptr = [np.zeros(1, dtype=np.int64)]
+    nnz = 0
+    with open(out_dir / "X_data.bin", "wb") as data_f, open(out_dir / "X_indices.bin", "wb") as idx_f:
+        for start, block in _row_blocks(X, block_bytes):
+            block = block[cell_filter[start:start + block.shape[0]]][:, gene_filter]
+            counts = np.asarray(block.sum(axis=1, dtype=np.float64)).ravel() / scale_factor
+            counts += counts == 0  # empty cells stay 0, as in scanpy
+            block = sparse.csr_matrix(sparse.diags(1.0 / counts) @ block, dtype=np.float32)
+            np.log1p(block.data, out=block.data)
+            block.data.tofile(data_f)
+            block.indices.astype(np.int32).tofile(idx_f)
+            indptr.append(nnz + block.indptr[1:].astype(np.int64))
+            nnz += block.nnz
+    np.save(out_dir / "X_indptr.npy", np.concatenate(indptr))
+
+    obs[cell_filter].to_pickle(out_dir / "obs.pkl")
+    var[gene_filter].to_pickle(out_dir / "var.pkl")
+    (out_dir / MANIFEST).write_text(json.dumps({
+        "shape": [int(cell_filter.sum()), n_kept_genes], "nnz": int(nnz), "scale_factor": scale_factor,
+    }))
+    print("✅ Done normalisation and log1p (out-of-core)")
+
+
+def _open(path: Path, dtype, n: int) -> np.ndarray:
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n,)) if n else np.empty(0, dtype=dtype)
+
+
+def load_chunked(out_dir: Path):
+    """AnnData with X memory-mapped from a preprocess_chunked output dir (read-only)"""
+    out_dir = Path(out_dir)
+    info = json.loads((out_dir / MANIFEST).read_text())
+    X = sparse.csr_matrix((_open(out_dir / "X_data.bin", np.float32, info["nnz"]),
+                           _open(out_dir / "X_indices.bin", np.int32, info["nnz"]),
+                           np.load(out_dir / "X_indptr.npy", mmap_mode="r")),
+                          shape=tuple(info["shape"]), copy=False)
+    adata = sc.AnnData(X=X, obs=pd.read_pickle(out_dir / "obs.pkl"), var=pd.read_pickle(out_dir / "var.pkl"))
+    adata.uns["log1p"] = {"base": None}  # what sc.pp.log1p records
+    return adata
@@ -0,0 +1,56 @@
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")  # forked renderers never touch a display
+
+from pipeline.profiling import cpu_budget
+
+#? Parallel figure rendering
+##figures = [(filename, fn, kwargs)]: fn(**kwargs, output_path=...) draws + saves one file (the runner's plot_*)
+##the list (and the AnnData its kwargs point to) is parked in _SHARED before the pool forks,
+##so workers get it copy-on-write: nothing is pickled but the figure index and the finished file bytes
+##files are rendered into a temp dir and returned as bytes -> the caller publishes them atomically
+
+_SHARED = {}
+
+
+def _render_one(i: int, tmp_dir: str) -> bytes:
+    filename, fn, kwargs = _SHARED["figures"][i]
+    path = Path(tmp_dir) / filename
+    fn(**kwargs, output_path=path)
+    return path.read_bytes()
+
+
+def render_parallel(figures: list, n_jobs: int = 0) -> dict:
+    """
+    Render every figure, one forked process each (n_jobs <= 0: the job's CPU budget; 1 = inline)
+    -> {filename: file bytes}
+    """
+    n_jobs = min(n_jobs if n_jobs > 0 else cpu_budget(), len(figures))
+    tmp_dir = tempfile.mkdtemp(prefix="render-")
+    _SHARED["figures"] = figures
+    try:
+        if n_jobs <= 1:
+            files = [_render_one(i, tmp_dir) for i in range(len(figures))]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("fork")) as pool:
+                futures = [pool.submit(_render_one, i, tmp_dir) for i in range(len(figures))]
+                files = [f.result() for f in futures]
+    finally:
+        _SHARED.clear()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {filename: data for (filename, _, _), data in zip(figures, files)}
+
+
+def publish(files: dict, result_dir: Path) -> None:
+    """Write {filename: bytes} into result_dir, each via temp file + rename (never half-written when served)"""
+    for filename, data in files.items():
+        tmp = Path(result_dir) / f".{filename}.{os.getpid()}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, Path(result_dir) / filename)
@@ -0,0 +1,110 @@
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+#? Lightweight resource probes (stdlib only, safe to import from the web process)
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (Linux /proc, 0 if unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark RSS of this process (since start, or since the last reset_peak_rss)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return _maxrss_bytes(resource.getrusage(resource.RUSAGE_SELF))
+
+
+def _maxrss_bytes(usage) -> int:
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024  # Linux reports KiB
+
+
+def reset_peak_rss() -> bool:
+    """Reset VmHWM to the current RSS so the next peak is per stage (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def memory_budget_bytes() -> int | None:
+    """
+    Memory cap of this process: RLIMIT_DATA (warm workers without a cgroup: this process's share) and/or
+    the cgroup v2 memory.max (systemd-run --scope -p MemoryMax=..., PIPELINE_CGROUP), the lower one;
+    None if neither is set
+    """
+    limits = []
+    soft, _ = resource.getrlimit(resource.RLIMIT_DATA)
+    if soft != resource.RLIM_INFINITY:
+        limits.append(soft)
+    try:
+        with open("/proc/self/cgroup") as f:
+            cgroup = next(line.split(":", 2)[2].strip() for line in f if line.startswith("0::"))
+        with open(f"/sys/fs/cgroup{cgroup}/memory.max") as f:
+            value = f.read().strip()
+        if value != "max":
+            limits.append(int(value))
+    except (OSError, ValueError, StopIteration):
+        pass
+    return min(limits) if limits else None
+
+
+def cpu_budget() -> int:
+    """CPUs this job may use: PIPELINE_CPUS (set by the scheduler), else the CPUs it can run on"""
+    try:
+        return max(1, int(os.environ["PIPELINE_CPUS"]))
+    except (KeyError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def mb(n_bytes: float) -> float:
+    return round(n_bytes / 1024 ** 2, 1)
+
+
+@contextmanager
+def measure(name: str, verbose: bool = True, reset_peak: bool = False):
+    """
+    Time a block and record RSS before/after, the peak RSS and CPU time.
+    with measure("preprocess") as m: ...  -> m["seconds"], m["peak_rss_mb"], ...
+    reset_peak=True makes the peak this block's own (don't use it inside another measure)
+    CPU time and peak include the worker processes the block forked and reaped (process pools):
+    RUSAGE_CHILDREN CPU delta, and the largest child's max RSS when it grew during the block
+    """
+    if reset_peak:
+        reset_peak_rss()
+    m = {"stage": name, "rss_before_mb": mb(current_rss_bytes())}
+    cpu0 = time.process_time()
+    children0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    t0 = time.perf_counter()
+    try:
+        yield m
+    finally:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        child_cpu = (children.ru_utime + children.ru_stime) - (children0.ru_utime + children0.ru_stime)
+        child_peak = _maxrss_bytes(children) if children.ru_maxrss > children0.ru_maxrss else 0
+        m["seconds"] = round(time.perf_counter() - t0, 3)
+        m["cpu_seconds"] = round(time.process_time() - cpu0 + child_cpu, 3)
+        m["rss_after_mb"] = mb(current_rss_bytes())
+        m["peak_rss_mb"] = mb(max(peak_rss_bytes(), child_peak))
+        if verbose:
+            print(f"⏱ {name}: {m['seconds']}s, RSS {m['rss_before_mb']} -> {m['rss_after_mb']} MB "
+                  f"(peak {m['peak_rss_mb']} MB)")
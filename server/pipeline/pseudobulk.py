@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+#? Pseudobulk aggregation: cell-level counts -> one summed profile per (sample, cell type)
+##one sparse indicator matrix G (profiles x cells, G[p, c] = 1 when cell c belongs to profile p)
+##-> profiles x genes = G @ X in ONE sparse product (X stays CSR / memory-mapped, no groupby over cells)
+##obs of the profiles: sample + cell type, every covariate constant within a profile (condition ...),
+##n_cells; profiles with fewer than min_cells cells are dropped
+##the result has the same layout as the uploaded pseudobulk tables (e.g. GSE138852_pseudobulk_astro_*)
+
+
+def is_cell_level(meta_df: pd.DataFrame, p: dict) -> bool:
+    """aggregate: true / false, or "auto" = the covariates have a sample column with repeated samples"""
+    if p["aggregate"] != "auto":
+        return bool(p["aggregate"])
+    return p["sample_col"] in meta_df and meta_df[p["sample_col"]].duplicated().any()
+
+
+def indicator_matrix(codes: np.ndarray, n_groups: int, dtype=np.float64) -> sparse.csr_matrix:
+    """groups x items 0/1 CSR matrix of a group code per item"""
+    codes = np.asarray(codes)
+    return sparse.csr_matrix((np.ones(len(codes), dtype=dtype), (codes, np.arange(len(codes)))),
+                             shape=(n_groups, len(codes)))
+
+
+def pseudobulk(X, meta_df: pd.DataFrame, sample_col: str, celltype_col: str | None = None,
+               min_cells: int = 10):
+    """
+    X: cells x genes counts (CSR or dense, rows in meta_df order) ->
+    (profiles x genes summed counts, CSR float64; profiles obs DataFrame, index "<sample>_<cell type>")
+    """
+    if sample_col not in meta_df:
+        raise KeyError(f"Covariates have no {sample_col} column to aggregate cells by")
+    if X.shape[0] != len(meta_df):
+        raise ValueError(f"{X.shape[0]} expression rows for {len(meta_df)} covariate rows")
+    by = [sample_col] + ([celltype_col] if celltype_col and celltype_col in meta_df else [])
+    codes, profiles = pd.MultiIndex.from_frame(meta_df[by].astype(str)).factorize()
+    n_cells = np.bincount(codes, minlength=len(profiles))
+
+    keep = n_cells >= min_cells
+    if not keep.any():
+        raise ValueError(f"No {' x '.join(by)} group has at least {min_cells} cells")
+    G = indicator_matrix(codes, len(profiles))[keep]
+    counts = sparse.csr_matrix(G @ X)
+
+    #covariates that are the same for every cell of a profile carry over (condition, batch ...)
+    grouped = meta_df.groupby(codes, sort=True)
+    constant = grouped.nunique(dropna=False).max() <= 1
+    obs = grouped.first().loc[:, constant[constant].index].reset_index(drop=True)
+    obs = obs.loc[keep].reset_index(drop=True)
+    obs[by] = profiles.to_frame(index=False)[by].loc[keep].to_numpy()
+    obs["n_cells"] = n_cells[keep]
+    obs.index = pd.Index(["_".join(p) for p in profiles[keep]])
+    print(f" Pseudobulk: {X.shape[0]} cells -> {len(obs)} {' x '.join(by)} profiles "
+          f"({int((~keep).sum())} with < {min_cells} cells dropped)")
+    return counts, obs
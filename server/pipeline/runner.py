@@ -1,5 +1,8 @@
+import argparse
+import json
 import os
 import sys
+import time
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -7,56 +10,65 @@ import numpy as np
 import pandas as pd
 import scanpy as sc
 import seaborn as sns
-import umap.umap_ as umap
-from gseapy import enrichr
+from scipy import sparse
 from gseapy.plot import barplot, dotplot
-from scipy.stats import ttest_ind  # t-test
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from statsmodels.stats.multitest import multipletests  # FDR p-value
+
+from pipeline.artifacts import write_artifacts  # results/artifacts.json + .gz twins for /results, /bundle
+from pipeline.checkpoint import StageCache, stage_key
+from pipeline.clustering import leiden_sweep  # Leiden resolution sweep on the shared graph
+from pipeline.contrasts import celltype_contrasts  # per-cell-type AD vs CT
+from pipeline.deg import welch_deg_table  # batched Welch t-test + FDR
+from pipeline.deg_store import DEG_DB, write_deg_store
+from pipeline.embedding import compute_embedding  # shared PCA / kNN / UMAP
+from pipeline.enrichment import enrich, load_library  # offline GO enrichment
+from pipeline.export import VIZ_DIR, build_payload  # binary arrays for the client-side plots
+from pipeline.ingest import (align_metadata, ingest, load_expression_cache,
+                             load_metadata_cache, read_manifest)
+from pipeline.plotting import publish, render_parallel  # forked figure rendering
+from pipeline.outofcore import choose_mode, load_chunked, preprocess_chunked  # X above the memory cap
+from pipeline.profiling import current_rss_bytes, mb, measure
+from pipeline.pseudobulk import is_cell_level, pseudobulk  # cell-level counts -> sample x cell type profiles
+from pipeline.telemetry import StageEvents
+from pipeline.worker import parse_size
 
 # from statsmodels.stats.multitest import fdrcorrection
 
 #configuration
-##pipeline/runner.py
-##data/xxx.csv
+##python -m pipeline.runner --job-dir jobs/<job_id>
+##jobs/<job_id>/data/xxx__expr.csv, xxx__cov.csv -> jobs/<job_id>/results/
 # BASE_DIR = Path(__file__).parent.parent.resolve()  # server/pipeline -> server
-BASE_DIR = Path("/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server") #!AWS EC2
-DATA_DIR = BASE_DIR / 'data'
-RESULT_DIR = BASE_DIR / 'results'
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-RESULT_DIR.mkdir(parents=True, exist_ok=True)#if not make a dir, avoid error
+BASE_DIR = Path("/home/ubuntu/hosting_transcp_webapp/transp_expr_webapp/server") #!AWS EC2, default job dir
+#shared binary caches (content-addressed, re-used across jobs)
+CACHE_DIR = Path(os.environ.get("PIPELINE_CACHE_DIR", BASE_DIR / "cache"))
+#GMT gene-set libraries for offline enrichment
+GENESET_DIR = Path(os.environ.get("GENESET_DIR", BASE_DIR / "genesets"))
 
 # EXPR_FILE = "../data/GSE138852_pseudobulk_astro_counts.csv"
 # META_FILE = "../data/GSE138852_pseudobulk_astro_metadata.csv"
 
-#loop the dir and take out the target file
-expr_files = [f for f in DATA_DIR.iterdir() if f.is_file() and '__expr' in f.name.lower() and f.suffix in ['.csv', '.tsv']]
-cov_files  = [f for f in DATA_DIR.iterdir() if f.is_file() and '__cov'  in f.name.lower() and f.suffix in ['.csv', '.tsv']]
-
+AD_RELEVANT_GENES = ["APOE", "CLU", "TREM2", "BIN1", "PICALM", 
+                    "MAPT", "PSEN1", "PSEN2", "APP", "CR1"]
 
-if not expr_files:
-    print('Error: No expression file with "__expr" found in ./data')
-    sys.exit(1)
-if not cov_files:
-    print('Error: No covariate file with "__cov" found in ./data')
-    sys.exit(1)
 
-# Use the first match
-EXPR_FILE = expr_files[0]
-META_FILE = cov_files[0]
+def find_input_files(data_dir: Path):
+    """Loop the data dir and take out the __expr / __cov files (first match)"""
+    expr_files = [f for f in data_dir.iterdir() if f.is_file() and '__expr' in f.name.lower() and f.suffix in ['.csv', '.tsv']]
+    cov_files  = [f for f in data_dir.iterdir() if f.is_file() and '__cov'  in f.name.lower() and f.suffix in ['.csv', '.tsv']]
 
-OUTPUT_DEG_CSV = f"{RESULT_DIR}/DEG_df.csv"
-AD_RELEVANT_GENES = ["APOE", "CLU", "TREM2", "BIN1", "PICALM", 
-                    "MAPT", "PSEN1", "PSEN2", "APP", "CR1"]
+    if not expr_files:
+        raise FileNotFoundError(f'No expression file with "__expr" found in {data_dir}')
+    if not cov_files:
+        raise FileNotFoundError(f'No covariate file with "__cov" found in {data_dir}')
+    return expr_files[0], cov_files[0]
 
 
 #expression matrix: genes VS samples_id
-def load_expression_data(expr_file: str) -> pd.DataFrame: #type hints
-    """Load and preprocess expression table"""
+def load_expression_data(expr_file: str, dtype: str = "float32") -> pd.DataFrame: #type hints
+    """Load and preprocess expression table (values parsed straight into dtype, no float64 pass)"""
     if not os.path.exists(expr_file):
         raise FileNotFoundError(f"file not found: {expr_file}")
-    df = pd.read_csv(expr_file, index_col=0)
+    columns = pd.read_csv(expr_file, index_col=0, nrows=0).columns
+    df = pd.read_csv(expr_file, index_col=0, dtype={c: dtype for c in columns})
     df = df.dropna(how='any') #dropna row
     print(f" Expression matrix loaded. Shape: {df.shape}")
     return df
@@ -74,69 +86,152 @@ def load_metadata(meta_file: str) -> pd.DataFrame:
 
 
 #QC
-def scanpy_preprocess(expr_df: pd.DataFrame, meta_df: pd.DataFrame, scale_factor=10000):
+def scanpy_preprocess(expr_df: pd.DataFrame, meta_df: pd.DataFrame, scale_factor=10000, dtype="float32"):
     """
     Input: dfs -> Output: processed dfs
     """
 
     # --- 1. Transpose expression (genes x cells → cells x genes) ---
     expr_df = expr_df.T
+    return scanpy_preprocess_matrix(expr_df.to_numpy(), expr_df.index, expr_df.columns,
+                                    meta_df, scale_factor=scale_factor, as_dataframe=True, dtype=dtype)
+
+
+def _subset_matrix(X, cell_filter: np.ndarray, gene_filter: np.ndarray):
+    """Rows + columns of X in ONE copy (CSR stays CSR, never densified)"""
+    if not sparse.issparse(X):
+        return np.asarray(X)[np.ix_(cell_filter, gene_filter)]
+    X = sparse.csr_matrix(X, copy=False)
+    keep = np.repeat(cell_filter, np.diff(X.indptr)) & gene_filter[X.indices]
+    new_col = np.cumsum(gene_filter) - 1  # old gene position -> new position
+    kept_cum = np.concatenate([[0], np.cumsum(keep)])
+    kept_per_row = kept_cum[X.indptr[1:]] - kept_cum[X.indptr[:-1]]
+    indptr = np.concatenate([[0], np.cumsum(kept_per_row[cell_filter])])
+    return sparse.csr_matrix(
+        (X.data[keep], new_col[X.indices[keep]].astype(X.indices.dtype), indptr),
+        shape=(int(cell_filter.sum()), int(gene_filter.sum())),
+    )
+
+
+def _cells_with_min_counts(X, cell_filter: np.ndarray, min_counts: float) -> np.ndarray:
+    """Per gene: number of kept cells with >= min_counts (no dense comparison matrix)"""
+    if not sparse.issparse(X):
+        return (np.asarray(X)[cell_filter] >= min_counts).sum(axis=0)
+    X = sparse.csr_matrix(X, copy=False)
+    hit = np.repeat(cell_filter, np.diff(X.indptr)) & (X.data >= min_counts)
+    return np.bincount(X.indices[hit], minlength=X.shape[1])
+
+
+def qc_metrics(adata) -> None:
+    """
+    Per-cell / per-gene count QC (same columns as sc.pp.calculate_qc_metrics without percent_top),
+    read-only on X: works on the memory-mapped cache, no eliminate_zeros rewrite, no top-N sorting
+    """
+    X = adata.X
+    if sparse.issparse(X):
+        X = sparse.csr_matrix(X, copy=False)
+        nonzero = X.data != 0
+        nonzero_cum = np.concatenate([[0], np.cumsum(nonzero)])
+        n_genes = nonzero_cum[X.indptr[1:]] - nonzero_cum[X.indptr[:-1]]
+        n_cells = np.bincount(X.indices[nonzero], minlength=X.shape[1])
+    else:
+        X = np.asarray(X)
+        n_genes = np.count_nonzero(X, axis=1)
+        n_cells = np.count_nonzero(X, axis=0)
+    cell_totals = np.asarray(X.sum(axis=1, dtype=np.float64)).ravel()
+    gene_totals = np.asarray(X.sum(axis=0, dtype=np.float64)).ravel()
+
+    adata.obs["n_genes_by_counts"] = n_genes
+    adata.obs["log1p_n_genes_by_counts"] = np.log1p(n_genes)
+    adata.obs["total_counts"] = cell_totals
+    adata.obs["log1p_total_counts"] = np.log1p(cell_totals)
+
+    adata.var["n_cells_by_counts"] = n_cells
+    adata.var["mean_counts"] = gene_totals / X.shape[0]
+    adata.var["log1p_mean_counts"] = np.log1p(adata.var["mean_counts"])
+    adata.var["pct_dropout_by_counts"] = (1 - n_cells / X.shape[0]) * 100
+    adata.var["total_counts"] = gene_totals
+    adata.var["log1p_total_counts"] = np.log1p(gene_totals)
+
+
+def expr_frame(adata) -> pd.DataFrame:
+    """Dense cells x genes DataFrame view of adata.X, only for stages that need one"""
+    X = adata.X.toarray() if sparse.issparse(adata.X) else adata.X
+    return pd.DataFrame(X, index=adata.obs_names, columns=adata.var_names)
+
+
+def scanpy_preprocess_matrix(X, obs_names, var_names, meta_df: pd.DataFrame, scale_factor=10000,
+                             as_dataframe: bool = False, dtype="float32"):
+    """
+    Input: cells x genes matrix (CSR or dense, e.g. memory-mapped ingest cache) + metadata
+    Output: (expr_df or None, meta_df, adata, adata.obs) - X stays CSR from ingest to log1p,
+    expr_df is only built when as_dataframe=True (see expr_frame)
+    dtype: precision of the filtered / normalised X (QC totals are float64 sums either way)
+    """
+    obs_names = pd.Index(obs_names)
 
     #Check duplicated reads
-    if expr_df.index.duplicated().any():
-        dup_rows = expr_df.index[expr_df.index.duplicated()].tolist()
+    if obs_names.duplicated().any():
+        dup_rows = obs_names[obs_names.duplicated()].tolist()
         print(f"Warning: Found duplicated row names: {dup_rows}")
         raise ValueError("Duplicated sample IDs found in expression data.")
     else:
         print("No duplicated sample IDs found after transposing.")
-    assert expr_df.shape[0] == meta_df.shape[0], "Cell IDs must match"
-
-    # --- 2. Create AnnData object ---
-    #? Parse to adata & adata.obs objects for more convenient data handling
-    adata = sc.AnnData(X=expr_df)
-    adata = adata.copy()
-    adata.obs = meta_df.copy()
-    adata.obs["oupSample.batchCond"] = adata.obs["oupSample.batchCond"].astype("category")
-
-    # --- 3. Filter cells (5% ~ 95% of gene count and RNA count) ---
-    #set qc filter
-    sc.pp.calculate_qc_metrics(adata, inplace=True)
-    min_genes = np.percentile(adata.obs["n_genes_by_counts"], 5)
-    max_genes = np.percentile(adata.obs["n_genes_by_counts"], 95)
-    min_counts = np.percentile(adata.obs["total_counts"], 5)
-    max_counts = np.percentile(adata.obs["total_counts"], 95)
-
-    adata = adata[
-        (adata.obs["n_genes_by_counts"] >= min_genes) &
-        (adata.obs["n_genes_by_counts"] <= max_genes) &
-        (adata.obs["total_counts"] >= min_counts) &
-        (adata.obs["total_counts"] <= max_counts)
-    ].copy()
-    print(f"✅ After cell filtering → shape: {adata.shape}")
-
-    # --- 5. Filter genes ---
-    # 1. remove genes with all 0s
-    # 2. keep genes expressed in ≥10 cells with ≥2 counts
-    gene_filter = np.array((adata.X >= 2).sum(axis=0)).flatten() >= 10
-    adata = adata[:, gene_filter]
-    print(f"✅ After gene filtering → shape: {adata.shape}")
-
-    # --- 6. Normalisation + log1p ---
-    sc.pp.normalize_total(adata, target_sum=scale_factor)
-    sc.pp.log1p(adata)
-    print("✅ Done normalisation and log1p")
-
-    # --- 7. Convert back to DataFrame ---
-    expr_df_processed = pd.DataFrame(adata.X,
-                                     index=adata.obs_names,
-                                     columns=adata.var_names)
+    meta_df = align_metadata(meta_df, obs_names)  # labels follow sample IDs, not row order
+
+    with measure("scanpy_preprocess") as m:
+        # --- 2. Create AnnData object ---
+        #? Parse to adata & adata.obs objects for more convenient data handling
+        ##no copy here: QC only reads X, the filters below copy just the kept part once
+        adata = sc.AnnData(X=X,
+                           obs=pd.DataFrame(index=obs_names.astype(str)),
+                           var=pd.DataFrame(index=pd.Index(var_names).astype(str)))
+        adata.obs = meta_df.copy()
+        adata.obs["oupSample.batchCond"] = adata.obs["oupSample.batchCond"].astype("category")
+
+        # --- 3. Filter cells (5% ~ 95% of gene count and RNA count) ---
+        #set qc filter
+        qc_metrics(adata)
+        min_genes = np.percentile(adata.obs["n_genes_by_counts"], 5)
+        max_genes = np.percentile(adata.obs["n_genes_by_counts"], 95)
+        min_counts = np.percentile(adata.obs["total_counts"], 5)
+        max_counts = np.percentile(adata.obs["total_counts"], 95)
+
+        cell_filter = (
+            (adata.obs["n_genes_by_counts"] >= min_genes) &
+            (adata.obs["n_genes_by_counts"] <= max_genes) &
+            (adata.obs["total_counts"] >= min_counts) &
+            (adata.obs["total_counts"] <= max_counts)
+        ).to_numpy()
+        print(f"✅ After cell filtering → shape: {(int(cell_filter.sum()), adata.n_vars)}")
+
+        # --- 5. Filter genes ---
+        # 1. remove genes with all 0s
+        # 2. keep genes expressed in ≥10 cells with ≥2 counts
+        gene_filter = _cells_with_min_counts(adata.X, cell_filter, 2) >= 10
+        adata = sc.AnnData(X=_subset_matrix(adata.X, cell_filter, gene_filter).astype(dtype, copy=False),
+                           obs=adata.obs[cell_filter].copy(),
+                           var=adata.var[gene_filter].copy())
+        print(f"✅ After gene filtering → shape: {adata.shape}")
+
+        # --- 6. Normalisation + log1p ---
+        sc.pp.normalize_total(adata, target_sum=scale_factor)
+        sc.pp.log1p(adata)
+        adata.X = adata.X.astype(dtype, copy=False)  # scanpy may upcast, PCA / kNN / DEG read this precision
+        print(f"✅ Done normalisation and log1p ({adata.X.dtype})")
+    print(f"✅ Preprocessing peak RSS: {m['peak_rss_mb']} MB "
+          f"({'CSR' if sparse.issparse(adata.X) else 'dense'} X)")
+
+    # --- 7. DataFrame view only on request ---
+    expr_df_processed = expr_frame(adata) if as_dataframe else None
 
     meta_df_processed = adata.obs.copy()
 
     return expr_df_processed, meta_df_processed, adata, adata.obs
 
 #Differential expressed genes scanpy
-def calculate_deg_scanpy_df(expr_df: pd.DataFrame, meta_df: pd.DataFrame) -> pd.DataFrame:
+def calculate_deg_scanpy_df(expr_df: pd.DataFrame, meta_df: pd.DataFrame,
+                            output_csv: Path | None = None) -> pd.DataFrame:
     """To perform DE analysis using t-test and log2 fold change"""
 
     # Ensure matched cells
@@ -144,77 +239,51 @@ def calculate_deg_scanpy_df(expr_df: pd.DataFrame, meta_df: pd.DataFrame) -> pd.
     expr_df = expr_df.loc[common]
     meta_df = meta_df.loc[common]
 
-    # Identify sample and control groups
-    ad_cells = meta_df[meta_df['oupSample.batchCond'] == 'AD'].index
-    ct_cells = meta_df[meta_df['oupSample.batchCond'] == 'CT'].index
-
-    # Analyse each gene: AD vs CT
-    results, pvals = [], []
-
-    for gene in expr_df.columns:
-        ad_vals = expr_df.loc[ad_cells, gene]
-        ct_vals = expr_df.loc[ct_cells, gene]
-
-        log2fc = np.log2(ad_vals.mean() + 1e-6) - np.log2(ct_vals.mean() + 1e-6)
-        stat, pval = ttest_ind(ad_vals, ct_vals, equal_var=False)
-        results.append((gene, log2fc, pval))
-        pvals.append(pval)
-
-    # FDR correction, for p-value => FDR < 0.05
-    _, fdr_vals, _, _ = multipletests(pvals, method="fdr_bh")
-
-    deg_df = pd.DataFrame(results, columns=["gene", "logfoldchanges", "pval"])
-    deg_df["FDR"] = fdr_vals
+    # Analyse all genes at once: AD vs CT (vectorised Welch t-test + BH FDR)
+    group = meta_df['oupSample.batchCond'].to_numpy()
+    deg_df = welch_deg_table(expr_df.to_numpy(), expr_df.columns,
+                             ad_index=(group == 'AD'), ct_index=(group == 'CT'))
     deg_df = deg_df.sort_values(by="FDR") #sorting
 
     # Save results
-    deg_df.to_csv(OUTPUT_DEG_CSV, index=False)
-    print(f"Saved DEG to {OUTPUT_DEG_CSV} – {deg_df.shape[0]} genes")
+    if output_csv is not None:
+        deg_df.to_csv(output_csv, index=False)
+        print(f"Saved DEG to {output_csv} – {deg_df.shape[0]} genes")
 
     return deg_df
 
 
-def plot_umap(expr_df: pd.DataFrame,
-                      meta_df: pd.DataFrame,
-                      group_col: str,
-                      title: str = "UMAP",
-                      output_path: str = RESULT_DIR / "umap_plot.png"):
+def plot_umap(adata,
+              group_col: str,
+              title: str = "UMAP",
+              output_path: str = "umap_plot.png",
+              dpi: int = 300):
     """
-    Run UMAP using expression DataFrame and plot grouped by a specified metadata column.
+    Scatter of the shared UMAP (adata.obsm["X_umap"]) grouped by a metadata column.
+    The embedding is computed only if no earlier stage did (pipeline/embedding.py).
     """
-    # --- 1. Align index ---
-    common_ids = expr_df.index.intersection(meta_df.index)
-    expr_df = expr_df.loc[common_ids]
-    meta_df = meta_df.loc[common_ids]
-
-    #? --- 2. Standardise data ---
-    scaled_data = StandardScaler().fit_transform(expr_df)
-
-    #? --- 3. Reduce to 30 PC dimensions (faster UMAP) ---
-    pca_data = PCA(n_components=10).fit_transform(scaled_data)
+    # --- 1. Reuse PCA / neighbours / UMAP of the embedding stage ---
+    compute_embedding(adata, **{k: v for k, v in DEFAULT_PARAMS["embedding"].items()
+                                if k in ("n_neighbors", "n_pcs", "knn")})
 
-    # --- 4. UMAP ---
-    reducer = umap.UMAP(n_components=2, random_state=42)
-    embedding = reducer.fit_transform(pca_data)
+    # --- 2. Prepare DataFrame for plotting ---
+    plot_df = adata.obs[[group_col]].copy()
+    plot_df["UMAP1"] = adata.obsm["X_umap"][:, 0]
+    plot_df["UMAP2"] = adata.obsm["X_umap"][:, 1]
 
-    # --- 5. Prepare DataFrame for plotting ---
-    plot_df = meta_df.copy()
-    plot_df["UMAP1"] = embedding[:, 0]
-    plot_df["UMAP2"] = embedding[:, 1]
-
-    # --- 6. Plot using Seaborn ---
+    # --- 3. Plot using Seaborn ---
     plt.figure(figsize=(8, 6))
     sns.scatterplot(data=plot_df, x="UMAP1", y="UMAP2",
                     hue=group_col, palette="Set1", s=50, edgecolor="k")
     plt.title(title)
     plt.tight_layout()
-    plt.savefig(output_path, dpi=300)
+    plt.savefig(output_path, dpi=dpi)
     plt.close()
     print(f"Saved: {output_path}")
 
 
 
-def plot_volcano(deg_df, output_path= RESULT_DIR / "volcano_plot_AD.png"):
+def plot_volcano(deg_df, output_path="volcano_plot_AD.png", dpi=600, rasterized=False):
     # addcol -log10(FDR)
     deg_df["-log10(FDR)"] = -np.log10(deg_df["pvals_adj"] + 1e-10)
 
@@ -229,102 +298,229 @@ def plot_volcano(deg_df, output_path= RESULT_DIR / "volcano_plot_AD.png"):
         y="-log10(FDR)",
         hue="significant",
         palette={True: "red", False: "grey"},
-        legend=False
+        legend=False,
+        rasterized=rasterized  # vector output: one image for the points, text + axes stay vector
     )
     plt.title("Volcano Plot: AD vs CT")
     plt.xlabel("log2 Fold Change")
     plt.ylabel("-log10(FDR)")
     plt.tight_layout()
-    plt.savefig(output_path, dpi=600)
+    plt.savefig(output_path, dpi=dpi)
     plt.close()
     print(f"✅ Volcano plot saved to: {output_path}")
 
-def run_go_bp_enrichment(genes, label, result_dir: Path,
+def run_go_bp_enrichment(gene_lists: dict, result_dir: Path,
                          gene_sets="GO_Biological_Process_2021",
-                         organism="Human", cutoff=0.05, top_terms=20):
-
-    subdir = result_dir / f"enrichr_go_{label}_bp"
-    subdir.mkdir(parents=True, exist_ok=True)
-
-    # 1. Enrichment
-    enr = enrichr(
-        gene_list=genes,
-        gene_sets=gene_sets,
-        organism=organism,
-        outdir=str(subdir),
-        cutoff=cutoff
-    )
-
-    # 2. Dotplot of top terms
-    out_png = subdir / f"go_bp_{label.lower()}_dotplot.png"
-    dotplot(
-        enr.results,
-        title=f"GO Biological Process – {label}",
-        top_term=top_terms,
-        ofname=str(out_png)
-    )
-    print(f"▶ GO BP {label} dotplot saved to {out_png}")
-
-
+                         organism="Human", cutoff=0.05, top_terms=20,
+                         geneset_dir: Path = None):
+    """
+    Offline GO enrichment for several gene lists at once ({label: genes}),
+    writes enrichr-style reports + dotplots to results/enrichr_go_<label>_bp/
+    """
+    # 1. Enrichment: local GMT library, all lists in one batched test
+    index = load_library(gene_sets, geneset_dir or GENESET_DIR)
+    results = enrich(index, gene_lists)
+
+    for label, res in results.items():
+        subdir = result_dir / f"enrichr_go_{label}_bp"
+        subdir.mkdir(parents=True, exist_ok=True)
+        res.to_csv(subdir / f"{gene_sets}.{organism}.enrichr.reports.txt", sep="\t", index=False)
+
+        # 2. Dotplot of top terms
+        out_png = subdir / f"go_bp_{label.lower()}_dotplot.png"
+        try:
+            dotplot(
+                res,
+                title=f"GO Biological Process – {label}",
+                cutoff=cutoff,
+                top_term=top_terms,
+                ofname=str(out_png)
+            )
+            print(f"▶ GO BP {label} dotplot saved to {out_png}")
+        except ValueError as e:  # no term under the cutoff
+            print(f"▶ GO BP {label}: no dotplot ({e})")
+    return results
+
+
+#? Pipeline parameters - defaults, override per job with <job_dir>/params.json
+##every stage's params are part of its checkpoint key
+DEFAULT_PARAMS = {
+    "pseudobulk": {"aggregate": "auto", "sample_col": "oupSample.sampleID",  # auto: only for cell-level uploads
+                   "celltype_col": "oupSample.cellType", "min_cells": 10},
+    "preprocess": {"scale_factor": 10000, "mode": "auto",  # auto / memory / chunked (out-of-core)
+                   "dtype": "float32"},  # X precision for normalisation, PCA, kNN, DEG (chunked: float32)
+    "embedding": {"n_neighbors": 5, "n_pcs": 30, "knn": "auto", "resolution": 0.5, "n_iterations": 2},
+    "deg": {"groupby": "oupSample.batchCond", "group": "AD", "method": "wilcoxon", "n_genes": 1000},
+    "celltype_deg": {"split_col": "oupSample.cellType", "groupby": "oupSample.batchCond", "group": "AD",
+                     "reference": "CT", "methods": ["wilcoxon", "welch"], "min_cells": 3,
+                     "n_jobs": 0},  # 0 = one process per CPU
+    "plots": {"dpi": 600, "top_n": 20, "preview_dpi": 100, "formats": ["png", "svg"],
+              "n_jobs": 0},  # previews in the job, dpi + vector formats by runner.render() afterwards
+    "export": {"max_points": 50000, "grid": 64, "min_per_bin": 8, "seed": 0,  # density-preserving sample above max_points
+               "obs": ["oupSample.batchCond", "oupSample.cellType", "oupSample.cellType_batchCond", "leiden"]},
+    "sweep": {"resolutions": [0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0], "seeds": 3, "n_iterations": 2,
+              "n_jobs": 0},  # runner.sweep() only, overridden by <job_dir>/sweep.json
+}
+STAGE_CACHE_MAX = os.environ.get("PIPELINE_STAGE_CACHE_MAX", "5G")
+RENDER_PENDING = ".render_pending"  # results/ marker: previews published, runner.render() still to run
+
+
+def load_params(job_dir: Path) -> dict:
+    """DEFAULT_PARAMS updated with the job's params.json (stage -> {param: value})"""
+    params = {stage: dict(p) for stage, p in DEFAULT_PARAMS.items()}
+    params_file = Path(job_dir) / "params.json"
+    if params_file.exists():
+        for stage, overrides in json.loads(params_file.read_text()).items():
+            params.setdefault(stage, {}).update(overrides)
+    return params
+
+
+def stage_keys(params: dict, caches: dict) -> dict:
+    """Checkpoint key of every stage (n_jobs / mode only change speed and memory, so they are left out)"""
+    def p(stage):
+        return {k: v for k, v in params[stage].items() if k not in ("n_jobs", "mode")}
+    keys = {"pseudobulk": stage_key("pseudobulk", p("pseudobulk"),
+                                    caches["expression"].name, caches["metadata"].name)}
+    keys["preprocess"] = stage_key("preprocess", p("preprocess"), keys["pseudobulk"])
+    keys["preprocess_chunked"] = stage_key("preprocess_chunked", None, keys["preprocess"])
+    keys["embedding"] = stage_key("embedding", p("embedding"), keys["preprocess"])
+    keys["rank_genes_groups"] = stage_key("rank_genes_groups", p("deg"), keys["preprocess"])
+    keys["celltype_deg"] = stage_key("celltype_deg", p("celltype_deg"), keys["preprocess"])
+    keys["plots"] = stage_key("plots", p("plots"), keys["embedding"], keys["rank_genes_groups"])
+    keys["plots_full"] = stage_key("plots_full", p("plots"), keys["embedding"], keys["rank_genes_groups"])
+    keys["viz_export"] = stage_key("viz_export", p("export"), keys["embedding"], keys["rank_genes_groups"])
+    keys["leiden_sweep"] = stage_key("leiden_sweep", p("sweep"), keys["embedding"])
+    return keys
+
+
+#i. cell-level uploads: sum the cells of every sample x cell type (one sparse product, see pipeline/pseudobulk.py)
+def run_pseudobulk(caches: dict, p: dict) -> dict:
+    X, obs_names, var_names = load_expression_cache(caches["expression"])
+    meta_df = align_metadata(load_metadata_cache(caches["metadata"]), obs_names)
+    counts, obs = pseudobulk(X, meta_df, p["sample_col"], p["celltype_col"], min_cells=p["min_cells"])
+    return {"X": counts, "obs": obs, "var_names": pd.Index(var_names)}
+
+
+def load_pseudobulk(stages: StageCache, keys: dict, caches: dict, p: dict) -> dict | None:
+    """Pseudobulk profiles of a cell-level upload (checkpointed), None when the upload is per sample"""
+    if not stages.has(keys["pseudobulk"]) and not is_cell_level(load_metadata_cache(caches["metadata"]), p):
+        return None
+    return stages.get_or_compute(keys["pseudobulk"], lambda: run_pseudobulk(caches, p), stage="pseudobulk")
+
+
+#i-iii. load the ingest cache (or the pseudobulk profiles) + filter / normalise / log1p
+def run_preprocess(caches: dict, p: dict, profiles: dict | None = None):
+    if profiles is not None:
+        obs = profiles["obs"]
+        _, _, adata, _ = scanpy_preprocess_matrix(profiles["X"], obs.index, profiles["var_names"], obs,
+                                                  scale_factor=p["scale_factor"], dtype=p["dtype"])
+        return adata
+    rss_before = current_rss_bytes()
+    t0 = time.perf_counter()
+    X, obs_names, var_names = load_expression_cache(caches["expression"])
+    print(f" Expression matrix loaded (cells x genes). Shape: {X.shape}")
 
-#? Main function
-def main():
-    # I. Data loading and preprocessing
-    #i. load expression profile table: gene vs samples
-    expr_df = load_expression_data(EXPR_FILE)
-    print(expr_df.head())
-    print(expr_df.describe())
-    
     #ii. load sample metadata: samples vs condition
-    meta_df = load_metadata(META_FILE)
+    meta_df = load_metadata_cache(caches["metadata"])
+    print(f" Metadata loaded. Shape: {meta_df.shape}")
     print(meta_df.head())
+    ingest_info = read_manifest(caches["expression"])
+    print(f" Load took {time.perf_counter() - t0:.2f}s (CSV parse on first ingest: {ingest_info['parse_seconds']}s), "
+          f"RSS {mb(rss_before)} -> {mb(current_rss_bytes())} MB")
 
     #iii. Prepreocessing
     #filtered and normalised + log1p
-    expr_df, meta_df, adata, adata.obs = scanpy_preprocess(expr_df, meta_df)
-    print(expr_df.head())
-    print(expr_df.describe())
-    print(meta_df.head())
+    _, _, adata, _ = scanpy_preprocess_matrix(X, obs_names, var_names, meta_df, scale_factor=p["scale_factor"],
+                                              dtype=p["dtype"])
+    return adata
 
-    #iv. exploratory PCA: group by conditions 
+
+def load_preprocessed(stages: StageCache, keys: dict, caches: dict, params: dict):
+    """
+    Preprocessed AnnData from whichever checkpoint exists, else computed in memory (on the pseudobulk
+    profiles of a cell-level upload) or - when X would not fit the memory cap (or mode="chunked") -
+    out-of-core with adata.X memory-mapped
+    """
+    p = params["preprocess"]
+    if not stages.has(keys["preprocess"]):
+        profiles = load_pseudobulk(stages, keys, caches, params["pseudobulk"])
+        if profiles is not None:  # a few hundred profiles: always in memory
+            return stages.get_or_compute(keys["preprocess"], lambda: run_preprocess(caches, p, profiles),
+                                         stage="preprocess")
+    if not stages.has(keys["preprocess"]) and (
+            stages.has(keys["preprocess_chunked"])
+            or choose_mode(read_manifest(caches["expression"]), p.get("mode", "auto")) == "chunked"):
+        def build(out_dir):
+            X, obs_names, var_names = load_expression_cache(caches["expression"])
+            preprocess_chunked(X, obs_names, var_names, load_metadata_cache(caches["metadata"]), out_dir,
+                               scale_factor=p["scale_factor"])
+        return load_chunked(stages.get_or_build_dir(keys["preprocess_chunked"], build, stage="preprocess"))
+    return stages.get_or_compute(keys["preprocess"], lambda: run_preprocess(caches, p), stage="preprocess")
+
+
+#iv. exploratory PCA/UMAP + clustering: returns only what it adds to adata (checkpointed without X)
+def run_embedding(adata, p: dict) -> dict:
+    #one PCA (truncated SVD, X stays sparse) -> one kNN graph -> one UMAP, reused by every plot + clustering
+    timings = compute_embedding(adata, n_neighbors=p["n_neighbors"], n_pcs=p["n_pcs"], knn=p["knn"])
+    print(f" Embedding steps (s): {timings}")
+    sc.tl.leiden(adata, resolution=p["resolution"], flavor="igraph", directed=False,
+                 n_iterations=p["n_iterations"])
+    return {
+        "obs": {"leiden": adata.obs["leiden"]},
+        "obsm": dict(adata.obsm),
+        "obsp": dict(adata.obsp),
+        "varm": dict(adata.varm),
+        "uns": {k: adata.uns[k] for k in ("pca", "neighbors", "umap", "leiden") if k in adata.uns},
+    }
+
+
+def attach_embedding(adata, emb: dict) -> None:
+    for col, values in emb["obs"].items():
+        adata.obs[col] = values.to_numpy()
+    for slot in ("obsm", "obsp", "varm", "uns"):
+        getattr(adata, slot).update(emb[slot])
+
+
+#v. DEG
+def run_rank_genes(adata, p: dict) -> pd.DataFrame:
+    sc.tl.rank_genes_groups(
+        adata,
+        groupby=p["groupby"],  # 
+        method=p["method"],                # "wilcoxon"
+        use_raw=False,
+        n_genes=p["n_genes"] #show most DE 1000 genes
+    )
+    return sc.get.rank_genes_groups_df(adata, group=p["group"])  # AD ->VS CT
 
 
-    sc.pp.neighbors(adata, n_neighbors=5, n_pcs=30)  # builds the neighbour graph
-    sc.tl.umap(adata)  # Running UMAP, computes the UMAP and stores in .obsm["X_umap"]
-    sc.tl.leiden(adata, resolution=0.5, flavor="igraph", directed=False, n_iterations=2)
+def run_celltype_deg(adata, p: dict) -> pd.DataFrame:
+    return celltype_contrasts(adata.X, adata.var_names, adata.obs, **p)
 
+
+def top_up_down(deg_df: pd.DataFrame, n: int = 20):
+    #pick top 20 genes
+    # 揀 top 20 upregulated + 20 downregulated
+    deg_df_sorted = deg_df.sort_values(by="logfoldchanges", ascending=False)
+    return deg_df_sorted.head(n), deg_df_sorted.tail(n) #Pos: UP, Neg: DOWN
+
+
+#vi. Plots: UMAP, heatmap, volcano -> {filename: png bytes} (checkpointed as bytes)
+def plot_umap_explorative(adata, output_path, dpi=600, rasterized=False):
     sc.pl.umap(
     adata,
     color=["oupSample.batchCond", "oupSample.cellType_batchCond"],
     ncols=2,
     title=["AD vs CT", "AD vs CT - Cell Types"],
     # save="UMAP_plot_explorative.png"
-    show=False
+    show=False,
+    rasterized=rasterized
     )
     # Save manually with tight bounding box
-    plt.savefig(RESULT_DIR / "UMAP_plot_explorative.png", dpi=600, bbox_inches="tight")
+    plt.savefig(output_path, dpi=dpi, bbox_inches="tight")
     plt.close()
 
 
-    #iv. DEG
-    
-    sc.tl.rank_genes_groups(
-        adata,
-        groupby="oupSample.batchCond",  # 
-        method="wilcoxon",                # "wilcoxon"
-        use_raw=False,
-        n_genes=1000 #show most DE 1000 genes
-    )
-    deg_df = sc.get.rank_genes_groups_df(adata, group="AD")  # AD ->VS CT
-    deg_df.to_csv(RESULT_DIR / "scanpy_deg_AD.csv", index=False) 
-
-    #pick top 20 genes
-    # 揀 top 20 upregulated + 20 downregulated
-    deg_df_sorted = deg_df.sort_values(by="logfoldchanges", ascending=False)
-    top20_up = deg_df_sorted.head(20) #Pos: UP
-    top20_down = deg_df_sorted.tail(20) #Neg: DOWN
-    top_genes = pd.concat([top20_up, top20_down])["names"].tolist()
-
+def plot_heatmap(adata, top_genes: list, output_path, dpi=600):
     #plot Heatmap for top 20 genes: Cell tyeps vs Genes
     sc.pl.heatmap(
         adata,
@@ -339,54 +535,273 @@ def main():
     )
 
     # Save manually with tight bounding box
-    plt.savefig(RESULT_DIR / "heatmap_ADvsCT.png", dpi=600, bbox_inches="tight")
+    plt.savefig(output_path, dpi=dpi, bbox_inches="tight")
     plt.close()
 
-    #Volcano plots
-    plot_volcano(deg_df)
 
-    #v. Pathway Enrichment Analysis
+def plot_figures(adata, deg_df: pd.DataFrame, p: dict, dpi: int, fmt: str = "png",
+                 rasterized: bool = False) -> list:
+    """[(filename, plot fn, kwargs)] for pipeline.plotting.render_parallel"""
+    top_up, top_down = top_up_down(deg_df, p["top_n"])
+    top_genes = pd.concat([top_up, top_down])["names"].tolist()
+    return [
+        (f"UMAP_plot_explorative.{fmt}", plot_umap_explorative, {"adata": adata, "dpi": dpi, "rasterized": rasterized}),
+        (f"heatmap_ADvsCT.{fmt}", plot_heatmap, {"adata": adata, "top_genes": top_genes, "dpi": dpi}),
+        #Volcano plots
+        (f"volcano_plot_AD.{fmt}", plot_volcano, {"deg_df": deg_df.copy(), "dpi": dpi, "rasterized": rasterized}),
+    ]
+
+
+def render_plots(adata, deg_df: pd.DataFrame, p: dict, preview: bool = True) -> dict:
+    """
+    Every figure in parallel worker processes -> {filename: bytes}
+    preview: PNGs at preview_dpi (what the job publishes before reporting done)
+    full: PNGs at dpi + each other format in p["formats"] (vector, scatter points rasterized)
+    """
+    try:
+        #heatmap dendrogram once here, every forked heatmap render reuses adata.uns
+        sc.tl.dendrogram(adata, groupby="oupSample.cellType")
+    except (KeyError, ValueError) as e:
+        print(f" Dendrogram left to sc.pl.heatmap: {e}")
+    if preview:
+        figures = plot_figures(adata, deg_df, p, p["preview_dpi"])
+    else:
+        figures = plot_figures(adata, deg_df, p, p["dpi"])
+        for fmt in p["formats"]:
+            if fmt != "png":
+                figures += plot_figures(adata, deg_df, p, p["dpi"], fmt=fmt, rasterized=True)
+    return render_parallel(figures, p["n_jobs"])
+
+
+#? Main function
+def main(job_dir: Path = BASE_DIR, cache_dir: Path = CACHE_DIR):
+    data_dir = Path(job_dir) / 'data'
+    result_dir = Path(job_dir) / 'results'
+    result_dir.mkdir(parents=True, exist_ok=True) #if not make a dir, avoid error
+    EXPR_FILE, META_FILE = find_input_files(data_dir)
+    params = load_params(job_dir)
+
+    #per-stage start/end events -> jobs/<job_id>/events.jsonl (progress + ETA in /analysis, /metrics)
+    events = StageEvents(job_dir)
+
+    # I. Data loading and preprocessing
+    #i. load expression profile table: gene vs samples
+    ##CSV is parsed once into the binary ingest cache (usually already done by /upload),
+    ##the cache dirs are named by file sha256 = the root of every checkpoint key
+    with events.stage("ingest") as s:
+        caches = ingest(EXPR_FILE, META_FILE, cache_dir)
+        s["rows"], s["cols"] = read_manifest(caches["expression"])["shape"]
+    stages = StageCache(Path(cache_dir) / "stages", max_bytes=parse_size(STAGE_CACHE_MAX))
+    keys = stage_keys(params, caches)
+    k_emb, k_deg, k_ct, k_plot = (keys[k] for k in ("embedding", "rank_genes_groups", "celltype_deg", "plots"))
+
+    #stages below only pull in what a checkpoint miss actually needs: the AnnData is loaded by the first
+    ##compute that runs, never decided from has() alone (an entry can be evicted between has() and get)
+    _adata = {}
+    def preprocessed():
+        if "pre" not in _adata:
+            with events.stage("preprocess") as s:
+                _adata["pre"] = load_preprocessed(stages, keys, caches, params)
+                s["rows"], s["cols"] = _adata["pre"].shape
+                s["cached"] = "preprocess" in stages.hits
+            print(_adata["pre"])
+        return _adata["pre"]
+
+    def embedded():
+        adata = preprocessed()
+        if "emb" not in _adata:
+            with events.stage("embedding") as s:
+                emb = stages.get_or_compute(k_emb, lambda: run_embedding(adata, params["embedding"]),
+                                            stage="embedding")
+                attach_embedding(adata, emb)  # no-op when just computed, restores it on a checkpoint hit
+                s["rows"], s["cols"] = adata.shape
+                s["cached"] = "embedding" in stages.hits
+            _adata["emb"] = True
+        return adata
+
+    full_plots = stages.has(keys["plots_full"])  # high-res + vector figures from an earlier run
+    #cell-level upload: profiles written in the same layout as an uploaded pseudobulk table
+    with events.stage("pseudobulk") as s:
+        profiles = load_pseudobulk(stages, keys, caches, params["pseudobulk"])
+        if profiles is None:
+            s["skipped"] = "covariates are per sample"
+        else:
+            pd.DataFrame(profiles["X"].T.toarray(), index=profiles["var_names"],
+                         columns=profiles["obs"].index).to_csv(result_dir / "pseudobulk_counts.csv")
+            profiles["obs"].to_csv(result_dir / "pseudobulk_covariates.csv")
+            s["rows"], s["cols"] = profiles["X"].shape
+            s["cached"] = "pseudobulk" in stages.hits
+        del profiles
+
+    #loaded ahead when a miss is expected, only so preprocess is timed as its own stage rather than
+    ##inside the first miss; the computes below go through preprocessed() / embedded() regardless
+    if not all(stages.has(k) for k in (k_deg, k_ct, keys["viz_export"])) or not (
+            full_plots or stages.has(k_plot)):
+        preprocessed()
+
+    with events.stage("rank_genes_groups") as s:
+        deg_df = stages.get_or_compute(k_deg, lambda: run_rank_genes(preprocessed(), params["deg"]),
+                                       stage="rank_genes_groups")
+        s["rows"] = len(deg_df)
+        s["cached"] = "rank_genes_groups" in stages.hits
+    deg_df.to_csv(result_dir / "scanpy_deg_AD.csv", index=False) 
+
+    #AD vs CT within each cell type (process pool, per-contrast FDR), one long table
+    deg_tables = {("rank_genes_groups", f"{params['deg']['group']}_vs_rest"): deg_df}
+    with events.stage("celltype_deg") as s:
+        try:
+            ct_df = stages.get_or_compute(k_ct, lambda: run_celltype_deg(preprocessed(), params["celltype_deg"]),
+                                          stage="celltype_deg")
+        except (KeyError, ValueError) as e:  # no cell type column / no cell type with both groups
+            print(f"Skipping per-cell-type DEG: {e}")
+            s["skipped"] = str(e)
+        else:
+            ct_df.to_csv(result_dir / "celltype_deg.csv", index=False)
+            for (method, contrast), table in ct_df.groupby(["method", "contrast"], sort=False):
+                deg_tables[(f"celltype_{method}", contrast)] = table.sort_values("scores", ascending=False)
+            s["rows"] = ct_df["contrast"].nunique()
+            s["cached"] = "celltype_deg" in stages.hits
+
+    #indexed copy for the paginated /deg API (filters, gene search, sorting without shipping the CSV)
+    write_deg_store(result_dir / DEG_DB, deg_tables)
+
+    if not (full_plots or stages.has(k_plot)) or not stages.has(keys["viz_export"]):
+        embedded()  # same reason: embedding timed before the figures, not inside them
+    with events.stage("plots") as s:
+        if full_plots:
+            files = stages.get_or_compute(keys["plots_full"],
+                                          lambda: render_plots(embedded(), deg_df, params["plots"], preview=False),
+                                          stage="plots")
+            (result_dir / RENDER_PENDING).unlink(missing_ok=True)
+        else:
+            #fast low-dpi previews now, runner.render() replaces them once the job reported done
+            files = stages.get_or_compute(k_plot, lambda: render_plots(embedded(), deg_df, params["plots"]),
+                                          stage="plots")
+            (result_dir / RENDER_PENDING).write_text("")
+        publish(files, result_dir)
+        s["rows"] = len(files)
+        s["cached"] = "plots" in stages.hits
+    #UMAP coordinates, covariate codes and DEG arrays for the WebGL / canvas plots of the Result page
+    with events.stage("viz_export") as s:
+        viz = stages.get_or_compute(keys["viz_export"],
+                                    lambda: build_payload(embedded(), deg_df, params["export"], keys["viz_export"][:16]),
+                                    stage="viz_export")
+        (result_dir / VIZ_DIR).mkdir(exist_ok=True)
+        publish(viz, result_dir / VIZ_DIR)
+        s["rows"] = len(viz)
+        s["cached"] = "viz_export" in stages.hits
+    print(f"Checkpoints: hit {stages.hits or '-'}, recomputed {stages.misses or '-'}")
+
+    top20_up, top20_down = top_up_down(deg_df, params["plots"]["top_n"])
+
+    #v. Pathway Enrichment Analysis (offline GMT library, see pipeline/enrichment.py)
     up_genes = top20_up["names"].tolist()
     down_genes = top20_down["names"].tolist()
-
-    # # GO
-    # # Example: GO Biological Process enrichment
-    # (RESULT_DIR / "enrichr_go_UP_bp").mkdir(parents=True, exist_ok=True)
-    # enr = enrichr(
-    #     gene_list=up_genes,
-    #     gene_sets="GO_Biological_Process_2021",
-    #     organism="Human",
-    #     outdir=str(RESULT_DIR / "enrichr_go_UP_bp"),
-    #     cutoff=0.05
-    # )
-
-    # # Dot plot of top 20 terms
-    # dotplot(enr.results, 
-    #     title="GO Biological Process – UP", 
-    #     top_term=20,
-    #     ofname= str(RESULT_DIR / "/go_bp_up_dotplot.png"))
-
-    # (RESULT_DIR / "enrichr_go_DOWN_bp").mkdir(parents=True, exist_ok=True)
-    # enr = enrichr(
-    #     gene_list=down_genes,
-    #     gene_sets="GO_Biological_Process_2021",
-    #     organism="Human",
-    #     outdir=str(RESULT_DIR / "enrichr_go_DOWN_bp"),
-    #     cutoff=0.05
-    # )
-
-    # # Dot plot of top 20 terms
-    # dotplot(enr.results, 
-    #     title="GO Biological Process – DOWN", 
-    #     top_term=20,
-    #     ofname=str(RESULT_DIR / "enrichr_go_DOWN_bp/go_bp_down_dotplot.png"))
-
-
-    # #flag file - completion #!
-    # flag_file = RESULT_DIR / 'completed.flag'
-    # flag_file.write_text('done')
+    with events.stage("enrichment") as s:
+        try:
+            run_go_bp_enrichment({"UP": up_genes, "DOWN": down_genes}, result_dir)
+        except FileNotFoundError as e:
+            print(f"Skipping GO enrichment: {e}")
+            s["skipped"] = str(e)
+
+
+    #artifact index (size, sha256, ETag) + gzip twins, written once the outputs are final
+    write_artifacts(result_dir)
+
+    #flag file - completion #!
+    flag_file = result_dir / 'completed.flag'
+    flag_file.write_text('done')
+
+
+#? Clustering sweep: Leiden at many resolutions on the cached neighbour graph
+##POST /cluster/sweep writes <job_dir>/sweep.json and runs this instead of main(): ingest, preprocess and
+##embedding come from their checkpoints, only the Leiden runs are new
+def sweep(job_dir: Path = BASE_DIR, cache_dir: Path = CACHE_DIR):
+    data_dir = Path(job_dir) / 'data'
+    result_dir = Path(job_dir) / 'results'
+    result_dir.mkdir(parents=True, exist_ok=True)
+    EXPR_FILE, META_FILE = find_input_files(data_dir)
+    params = load_params(job_dir)
+    sweep_file = Path(job_dir) / "sweep.json"
+    if sweep_file.exists():
+        params["sweep"].update(json.loads(sweep_file.read_text()))
+
+    events = StageEvents(job_dir)
+    with events.stage("ingest") as s:
+        caches = ingest(EXPR_FILE, META_FILE, cache_dir)
+        s["rows"], s["cols"] = read_manifest(caches["expression"])["shape"]
+    stages = StageCache(Path(cache_dir) / "stages", max_bytes=parse_size(STAGE_CACHE_MAX))
+    keys = stage_keys(params, caches)
+
+    def embedding():
+        adata = load_preprocessed(stages, keys, caches, params)
+        return run_embedding(adata, params["embedding"])
+
+    with events.stage("embedding") as s:
+        emb = stages.get_or_compute(keys["embedding"], embedding, stage="embedding")
+        s["rows"] = len(emb["obs"]["leiden"])
+        s["cached"] = "embedding" in stages.hits
+    with events.stage("leiden_sweep") as s:
+        p = params["sweep"]
+        summary, labels = stages.get_or_compute(
+            keys["leiden_sweep"],
+            lambda: leiden_sweep(emb["obsp"]["connectivities"], p["resolutions"], p["seeds"],
+                                 p["n_iterations"], p["n_jobs"]),
+            stage="leiden_sweep")
+        s["rows"] = len(summary)
+        s["cached"] = "leiden_sweep" in stages.hits
+    print(summary.to_string(index=False))
+
+    #summary -> /cluster/sweep, labels (cells x resolutions, seed 0) for download
+    labels.index = emb["obs"]["leiden"].index
+    labels.to_csv(result_dir / "leiden_sweep_labels.csv", index_label="cell")
+    (result_dir / "leiden_sweep.json").write_text(summary.to_json(orient="records"))
+    write_artifacts(result_dir)
+
+
+#? Deferred rendering: dpi PNGs + vector versions of the figures, replacing the previews
+##queued by the web server as background work once a run that published previews (RENDER_PENDING) is done,
+##the job already reports done; only the figures of this render are new, everything else is a checkpoint
+def render(job_dir: Path = BASE_DIR, cache_dir: Path = CACHE_DIR):
+    result_dir = Path(job_dir) / 'results'
+    EXPR_FILE, META_FILE = find_input_files(Path(job_dir) / 'data')
+    params = load_params(job_dir)
+    caches = ingest(EXPR_FILE, META_FILE, cache_dir)
+    stages = StageCache(Path(cache_dir) / "stages", max_bytes=parse_size(STAGE_CACHE_MAX))
+    keys = stage_keys(params, caches)
+
+    def full():
+        adata = load_preprocessed(stages, keys, caches, params)
+        emb = stages.get_or_compute(keys["embedding"], lambda: run_embedding(adata, params["embedding"]),
+                                    stage="embedding")
+        attach_embedding(adata, emb)
+        deg_df = stages.get_or_compute(keys["rank_genes_groups"], lambda: run_rank_genes(adata, params["deg"]),
+                                       stage="rank_genes_groups")
+        return render_plots(adata, deg_df, params["plots"], preview=False)
+
+    with measure("render"):
+        files = stages.get_or_compute(keys["plots_full"], full, stage="plots_full")
+    publish(files, result_dir)
+    (result_dir / RENDER_PENDING).unlink(missing_ok=True)
+    write_artifacts(result_dir)  # re-hashes only the replaced figures + the new vector files
+    print(f"Published {sorted(files)}")
 
 
 #! Main execution
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Expression matrix analysis pipeline")
+    parser.add_argument("--job-dir", type=Path, default=BASE_DIR,
+                        help="job workspace holding data/ (inputs) and results/ (outputs)")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR,
+                        help="shared binary cache directory")
+    parser.add_argument("--sweep", action="store_true",
+                        help="only run the Leiden resolution sweep (params from <job-dir>/sweep.json)")
+    parser.add_argument("--render", action="store_true",
+                        help="only render the high-resolution + vector figures (after a run with previews)")
+    args = parser.parse_args()
+    try:
+        entry = sweep if args.sweep else render if args.render else main
+        entry(args.job_dir, args.cache_dir)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
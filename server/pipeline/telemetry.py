@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from pipeline.profiling import measure
+
+#? Per-stage telemetry (stdlib only, safe to import from the web process)
+##runner side: StageEvents appends one JSON line per stage start/end to jobs/<job_id>/events.jsonl
+##web side: read_events + StageStats turn those lines into /analysis progress, ETA and /metrics
+
+EVENTS_FILE = "events.jsonl"
+
+
+class StageEvents:
+    """Writer of jobs/<job_id>/events.jsonl (truncated at the start of every run)"""
+
+    def __init__(self, job_dir: Path):
+        self.path = Path(job_dir) / EVENTS_FILE
+        self.path.write_text("")
+
+    def emit(self, event: str, stage: str, **fields) -> None:
+        record = {"event": event, "stage": stage, "time": round(time.time(), 3), **fields}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        with events.stage("preprocess") as s: ...; s["rows"], s["cols"] = adata.shape
+        -> start event, then end (or error) event with seconds, cpu_seconds, peak_rss_mb + whatever was set on s
+        """
+        self.emit("start", name)
+        try:
+            with measure(name, verbose=False, reset_peak=True) as m:
+                yield m
+        except BaseException as e:
+            self.emit("error", name, error=f"{type(e).__name__}: {e}",
+                      **{k: v for k, v in m.items() if k != "stage"})
+            raise
+        self.emit("end", name, **{k: v for k, v in m.items() if k != "stage"})
+
+
+def read_events(job_dir: Path) -> list[dict]:
+    """Every event written so far (a half-written last line is skipped)"""
+    events = []
+    try:
+        with open(Path(job_dir) / EVENTS_FILE) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return events
+
+
+def stage_table(events: list[dict]) -> list[dict]:
+    """Fold start/end events into one row per stage, in run order"""
+    stages = {}
+    for e in events:
+        row = stages.setdefault(e["stage"], {"stage": e["stage"], "state": "running", "started": e["time"]})
+        if e["event"] in ("end", "error"):
+            row.update({k: v for k, v in e.items() if k not in ("event", "stage", "time")})
+            row["state"] = "done" if e["event"] == "end" else "error"
+            row["finished"] = e["time"]
+    return list(stages.values())
+
+
+class StageStats:
+    """
+    Running per-stage totals over finished jobs: feeds the ETA and the Prometheus /metrics text.
+    Persisted as a small JSON file so averages survive restarts.
+    """
+
+    def __init__(self, path: Path, alpha: float = 0.3):
+        self.path = Path(path)
+        self.alpha = alpha  # weight of the newest run in the moving average
+        self._lock = threading.Lock()
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        self.stages: dict[str, dict] = data.get("stages", {})
+        self.order: list[str] = data.get("order", [])  # stage order of the last complete run
+
+    def record(self, events: list[dict]) -> None:
+        """Add one finished job's stages"""
+        rows = [r for r in stage_table(events) if r["state"] != "running"]
+        if not rows:
+            return
+        with self._lock:
+            for r in rows:
+                s = self.stages.setdefault(r["stage"], {"runs": 0, "errors": 0, "seconds": 0.0,
+                                                        "cpu_seconds": 0.0, "avg_seconds": None,
+                                                        "max_peak_rss_mb": 0.0})
+                s["runs"] += 1
+                s["errors"] += r["state"] == "error"
+                s["seconds"] += r.get("seconds", 0.0)
+                s["cpu_seconds"] += r.get("cpu_seconds", 0.0)
+                s["max_peak_rss_mb"] = max(s["max_peak_rss_mb"], r.get("peak_rss_mb", 0.0))
+                if r["state"] == "done" and not r.get("cached"):  # checkpoint hits would drag it to ~0
+                    avg = s["avg_seconds"]
+                    s["avg_seconds"] = r["seconds"] if avg is None else \
+                        round(self.alpha * r["seconds"] + (1 - self.alpha) * avg, 3)
+            if all(r["state"] == "done" and not r.get("cached") for r in rows):  # full run: every stage present
+                self.order = [r["stage"] for r in rows]
+            self._save()
+
+    def _save(self) -> None:
+        try:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"stages": self.stages, "order": self.order}, indent=1))
+            tmp.replace(self.path)
+        except OSError:
+            pass  # stats are best effort
+
+    def eta(self, events: list[dict], now: float | None = None) -> float | None:
+        """Seconds left: average of every stage not finished yet minus time spent in the current one"""
+        if not self.order:
+            return None
+        now = now or time.time()
+        table = {r["stage"]: r for r in stage_table(events)}
+        reached = max((i for i, stage in enumerate(self.order) if stage in table), default=-1)
+        left = 0.0
+        for i, stage in enumerate(self.order):
+            avg = self.stages.get(stage, {}).get("avg_seconds")
+            row = table.get(stage)
+            if avg is None or (i < reached and row is None) or (row and row["state"] != "running"):
+                continue  # skipped (checkpoint) or finished
+            left += max(avg - (now - row["started"]), 0.0) if row else avg
+        return round(left, 1)
+
+    def prometheus(self) -> list[str]:
+        """Prometheus text-format lines for the per-stage totals"""
+        metrics = [
+            ("pipeline_stage_runs_total", "counter", "Finished runs of a pipeline stage", "runs", 1),
+            ("pipeline_stage_errors_total", "counter", "Failed runs of a pipeline stage", "errors", 1),
+            ("pipeline_stage_seconds_total", "counter", "Wall time spent in a pipeline stage", "seconds", 1),
+            ("pipeline_stage_cpu_seconds_total", "counter", "CPU time spent in a pipeline stage", "cpu_seconds", 1),
+            ("pipeline_stage_peak_rss_bytes", "gauge", "Largest peak RSS seen in a pipeline stage",
+             "max_peak_rss_mb", 1024 ** 2),
+        ]
+        lines = []
+        with self._lock:
+            for name, kind, help_text, field, scale in metrics:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for stage, s in sorted(self.stages.items()):
+                    lines.append(f'{name}{{stage="{stage}"}} {round(s[field] * scale, 3)}')
+        return lines
@@ -0,0 +1,306 @@
+import multiprocessing as mp
+import os
+import queue
+import resource
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from pipeline.profiling import cpu_budget, current_rss_bytes
+
+#? Warm pipeline workers
+##each worker process imports pipeline.runner (scanpy, umap, gseapy, ...) ONCE,
+##then forks a short-lived child per job: the child starts with every library
+##already loaded and gets its own memory cap + cpu share (PIPELINE_CPUS)
+##memory cap, covering the job's whole process tree (its forked pools too) like MemoryMax= in cold mode:
+##  PIPELINE_CGROUP = a delegated cgroup v2 dir with "memory" in cgroup.subtree_control (e.g. a systemd
+##  unit with Delegate=yes) -> every job runs in its own <PIPELINE_CGROUP>/job-<pid> with memory.max set
+##  without it: RLIMIT_DATA, which is per process (private writable memory, inherited by every fork) ->
+##  split over the processes the job can run at once (itself + a pool of PIPELINE_CPUS), so the tree stays
+##  under memory_max but each process gets only its share - a weaker cap, configure the cgroup if you can
+##workers recycle themselves after N jobs or when their own RSS grows too large
+
+PIPELINE_CGROUP = os.environ.get("PIPELINE_CGROUP")
+
+
+def parse_size(size: str) -> int:
+    """'3G' / '512M' / '1024' -> bytes"""
+    size = str(size).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def _job_cgroup(pid: int) -> Path | None:
+    return Path(PIPELINE_CGROUP) / f"job-{pid}" if PIPELINE_CGROUP else None
+
+
+def _enter_cgroup(memory_max: int) -> bool:
+    """Move this process into its own cgroup with memory.max (children follow), False if unavailable"""
+    cgroup = _job_cgroup(os.getpid())
+    if cgroup is None:
+        return False
+    try:
+        cgroup.mkdir(exist_ok=True)
+        (cgroup / "memory.max").write_text(str(memory_max))
+        (cgroup / "memory.swap.max").write_text("0")
+        (cgroup / "cgroup.procs").write_text(str(os.getpid()))
+        return True
+    except OSError as e:
+        print(f"Cannot use cgroup {cgroup}: {e}, falling back to RLIMIT_DATA", file=sys.stderr)
+        return False
+
+
+def _limit_memory(memory_max: int, cpus: int | None) -> None:
+    if _enter_cgroup(memory_max):
+        return
+    n = cpus or cpu_budget()
+    processes = 1 if n <= 1 else n + 1  # the job + its pool workers (pools run inline with one CPU)
+    limit = memory_max // processes
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+
+def _run_job(job_dir: str, memory_max: int, err_fd: int, task: str = "pipeline",
+             cpus: int | None = None) -> None:
+    """Forked child: cap memory, send output to the job log, run the task (pipeline / sweep / render)"""
+    error = None
+    try:
+        if memory_max:
+            _limit_memory(memory_max, cpus)
+        if cpus:
+            os.environ["PIPELINE_CPUS"] = str(cpus)  # size of the job's process pools
+        log_name = "pipeline.log" if task in ("pipeline", "sweep") else f"{task}.log"  # render keeps the run's log
+        log_fd = os.open(Path(job_dir) / log_name,
+                         os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+
+        from pipeline import runner  # already imported by the parent: no startup cost
+        entry = {"pipeline": runner.main, "sweep": runner.sweep, "render": runner.render}[task]
+        entry(Path(job_dir))
+    except MemoryError:
+        error = f"Pipeline exceeded its memory limit ({memory_max // 1024 ** 2} MB)"
+    except BaseException as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if error:
+            os.write(err_fd, error.encode()[:65536])
+        os.close(err_fd)
+        os._exit(1 if error else 0)
+
+
+def _fork_job(job_dir: str, memory_max: int, task: str = "pipeline", cpus: int | None = None) -> str | None:
+    """Run one job in a forked child, return its error message (None = success)"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _run_job(job_dir, memory_max, write_fd, task, cpus)  # never returns
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as pipe:
+        error = pipe.read().decode(errors="replace") or None
+    _, status = os.waitpid(pid, 0)
+    code = os.waitstatus_to_exitcode(status)
+    oom_killed = _release_cgroup(pid)
+    if code and error is None:
+        # killed before it could report (e.g. by the kernel OOM killer)
+        error = (f"Pipeline exceeded its memory limit ({memory_max // 1024 ** 2} MB)" if oom_killed
+                 else f"Pipeline process died with exit code {code}")
+    return error
+
+
+def _release_cgroup(pid: int) -> bool:
+    """Remove the job's cgroup once its processes are gone -> whether the kernel OOM-killed one of them"""
+    cgroup = _job_cgroup(pid)
+    if cgroup is None or not cgroup.is_dir():
+        return False
+    oom_killed = False
+    try:
+        for line in (cgroup / "memory.events").read_text().splitlines():
+            key, value = line.split()
+            oom_killed |= key == "oom_kill" and int(value) > 0
+    except (OSError, ValueError):
+        pass
+    for _ in range(50):  # pool workers may still be exiting
+        try:
+            cgroup.rmdir()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return oom_killed
+
+
+def serve(job_queue, result_queue, max_jobs: int, max_rss: int) -> None:
+    """Worker process main loop"""
+    pid = os.getpid()
+    t0 = time.perf_counter()
+    from pipeline import runner  # noqa: F401 - the expensive part, paid once per worker
+    from pipeline.embedding import warm_up
+    try:
+        warm_up()  # numba JIT of the UMAP / kNN kernels, otherwise paid again by every forked job
+    except Exception as e:
+        print(f"Embedding warm-up failed (jobs will compile on first use): {e}", file=sys.stderr)
+    result_queue.put(("ready", pid, time.perf_counter() - t0))
+
+    jobs_done = 0
+    while True:
+        item = job_queue.get()
+        if item is None:  # shutdown
+            break
+        job_id, job_dir, memory_max, task, cpus = item
+        result_queue.put(("start", pid, job_id))
+
+        error = _fork_job(job_dir, memory_max, task, cpus)
+        result_queue.put(("done", pid, job_id, error))
+
+        #recycle: let the pool start a fresh worker
+        jobs_done += 1
+        if jobs_done >= max_jobs:
+            result_queue.put(("recycle", pid, f"served {jobs_done} jobs"))
+            break
+        if max_rss and current_rss_bytes() > max_rss:
+            result_queue.put(("recycle", pid, f"RSS {current_rss_bytes() // 1024 ** 2} MB"))
+            break
+
+
+class WorkerPool:
+    """
+    Pool of warm worker processes fed through a local multiprocessing queue.
+    run(job_id, job_dir) blocks the calling thread until the job finishes.
+    """
+
+    def __init__(self, size: int = 1, memory_max: str = "3G",
+                 max_jobs_per_worker: int = 20, max_worker_rss: str = "2G",
+                 python: str | None = None):
+        self.size = size
+        self.memory_max = parse_size(memory_max)
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_worker_rss = parse_size(max_worker_rss)
+
+        #spawn, not fork: the web process has threads and must not share state with workers
+        self._ctx = mp.get_context("spawn")
+        if python:
+            self._ctx.set_executable(python)
+        self._job_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+
+        self._lock = threading.Lock()
+        self._workers: dict[int, mp.Process] = {}
+        self._running: dict[int, str] = {}      # worker pid -> job_id
+        self._waiting: dict[str, dict] = {}     # job_id -> {"event", "error"}
+        self.startup_seconds: list[float] = []  # import time of each worker
+        self._closed = False
+        self._threads = []
+
+    def start(self) -> None:
+        for _ in range(self.size):
+            self._spawn_worker()
+        for target in (self._collect_results, self._supervise):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _spawn_worker(self) -> None:
+        proc = self._ctx.Process(
+            target=serve,
+            args=(self._job_queue, self._result_queue,
+                  self.max_jobs_per_worker, self.max_worker_rss),
+            daemon=True,
+        )
+        proc.start()
+        with self._lock:
+            self._workers[proc.pid] = proc
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """Block until every worker finished importing (for benchmarks / warm-up)"""
+        deadline = None if timeout is None else time.time() + timeout
+        while len(self.startup_seconds) < self.size:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def run(self, job_id: str, job_dir: Path, memory_max: int | None = None, task: str = "pipeline",
+            cpus: int | None = None) -> None:
+        """Queue a job (task: "pipeline", "sweep" or "render") and wait for it, raises RuntimeError if it failed"""
+        if self._closed:
+            raise RuntimeError("Worker pool is shut down")
+        waiter = {"event": threading.Event(), "error": None}
+        with self._lock:
+            self._waiting[job_id] = waiter
+        self._job_queue.put((job_id, str(job_dir), memory_max or self.memory_max, task, cpus))
+        waiter["event"].wait()
+        if waiter["error"]:
+            raise RuntimeError(waiter["error"])
+
+    def _finish(self, job_id: str, error: str | None) -> None:
+        with self._lock:
+            waiter = self._waiting.pop(job_id, None)
+        if waiter is not None:
+            waiter["error"] = error
+            waiter["event"].set()
+
+    def _collect_results(self) -> None:
+        while not self._closed:
+            try:
+                msg = self._result_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            kind, pid = msg[0], msg[1]
+            if kind == "ready":
+                self.startup_seconds.append(msg[2])
+                print(f"Pipeline worker {pid} warm after {msg[2]:.1f}s of imports + JIT warm-up")
+            elif kind == "start":
+                with self._lock:
+                    self._running[pid] = msg[2]
+            elif kind == "done":
+                with self._lock:
+                    self._running.pop(pid, None)
+                self._finish(msg[2], msg[3])
+            elif kind == "recycle":
+                print(f"Pipeline worker {pid} recycling: {msg[2]}")
+
+    def _supervise(self) -> None:
+        """Replace workers that exited (recycled or crashed)"""
+        exited = {}  # pid -> time it was found dead
+        while not self._closed:
+            time.sleep(0.5)
+            with self._lock:
+                dead = [pid for pid, p in self._workers.items() if not p.is_alive()]
+                for pid in dead:
+                    self._workers.pop(pid).join(timeout=0)
+                    exited[pid] = time.time()
+            for _ in dead:
+                if not self._closed:
+                    self._spawn_worker()
+            # a worker that crashed mid-job never sent "done"
+            ##(grace period: its last messages may still be in the result queue)
+            for pid, when in list(exited.items()):
+                if time.time() - when < 2.0:
+                    continue
+                del exited[pid]
+                with self._lock:
+                    job_id = self._running.pop(pid, None)
+                if job_id is not None:
+                    self._finish(job_id, "Pipeline worker crashed")
+
+    def shutdown(self) -> None:
+        self._closed = True
+        for _ in range(len(self._workers)):
+            self._job_queue.put(None)
+        for proc in list(self._workers.values()):
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        with self._lock:
+            pending = list(self._waiting)
+        for job_id in pending:
+            self._finish(job_id, "Worker pool shut down")
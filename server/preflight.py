@@ -0,0 +1,152 @@
+import csv
+import json
+import math
+from pathlib import Path
+
+#? Pre-flight check of an upload (stdlib only: runs in the web process, no pandas / scanpy)
+##expression (genes x cells CSV): header = sample IDs, first SAMPLE_ROWS rows parsed, the rest only newline-counted
+##covariates (samples x covariates CSV): small, read whole
+##rejects what would otherwise fail minutes later inside the runner, with the exact row / column:
+##  duplicate or mismatched sample IDs, missing oupSample.* columns, non-numeric expression values
+##-> shape + density recorded in <job_dir>/preflight.json for the scheduler (resources.py)
+
+REQUIRED_COVARIATES = ("oupSample.batchCond", "oupSample.cellType")
+SAMPLE_ROWS = 200
+SCAN_CHUNK = 4 * 1024 * 1024
+MISSING = {"", "na", "nan", "null"}  # pandas reads these as NaN, the runner drops those rows
+PREFLIGHT_FILE = "preflight.json"
+
+
+class PreflightError(ValueError):
+    pass
+
+
+def _examples(values, n: int = 5) -> str:
+    values = list(values)
+    shown = ", ".join(repr(v) for v in values[:n])
+    return shown + (f" (+{len(values) - n} more)" if len(values) > n else "")
+
+
+def _duplicates(values) -> list:
+    seen, dup = set(), []
+    for v in values:
+        if v in seen:
+            dup.append(v)
+        seen.add(v)
+    return dup
+
+
+def _header(path: Path, line: str, what: str) -> list[str]:
+    if not line.strip():
+        raise PreflightError(f"{path.name}: empty file")
+    fields = next(csv.reader([line]))
+    if len(fields) < 2:
+        sep = "tab" if "\t" in line else "no separator"
+        raise PreflightError(f"{path.name}: the {what} header has a single column ({sep}); "
+                             f"expected comma-separated values")
+    return fields
+
+
+def check_expression(path: Path, sample_rows: int = SAMPLE_ROWS) -> dict:
+    """Header + first rows of the genes x cells table -> {"samples", "genes", "density"}"""
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        samples = [s.strip() for s in _header(path, f.readline(), "expression")[1:]]
+        dup = _duplicates(samples)
+        if dup:
+            raise PreflightError(f"{path.name}: duplicated sample IDs in the header: {_examples(dup)}")
+
+        genes = zeros = values = 0
+        for line_no, row in enumerate(csv.reader(f), start=2):
+            if not row:
+                continue
+            genes += 1
+            if len(row) != len(samples) + 1:
+                raise PreflightError(f"{path.name}, line {line_no} ({row[0]!r}): {len(row) - 1} values "
+                                     f"for {len(samples)} samples")
+            for sample, value in zip(samples, row[1:]):
+                value = value.strip()
+                if value.lower() in MISSING:
+                    continue
+                try:
+                    number = float(value)
+                except ValueError:
+                    raise PreflightError(f"{path.name}, line {line_no}: non-numeric value {value!r} "
+                                         f"for gene {row[0]!r}, sample {sample!r}") from None
+                if not math.isfinite(number):
+                    raise PreflightError(f"{path.name}, line {line_no}: {value!r} for gene {row[0]!r}, "
+                                         f"sample {sample!r}")
+                values += 1
+                zeros += number == 0
+            if genes >= sample_rows:
+                break
+        else:
+            return _shape(path, samples, genes, zeros, values)
+    with open(path, "rb") as f:  # whole file: newline count only
+        total_lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(SCAN_CHUNK), b""))
+    return _shape(path, samples, total_lines - 1, zeros, values)
+
+
+def _shape(path: Path, samples: list, genes: int, zeros: int, values: int) -> dict:
+    if genes == 0:
+        raise PreflightError(f"{path.name}: no gene rows under the header")
+    return {"samples": samples, "genes": genes, "density": round(1 - zeros / values, 4) if values else 1.0}
+
+
+def check_covariates(path: Path, samples: list[str]) -> dict:
+    """Whole samples x covariates table against the expression header -> {"rows", "warnings"}"""
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        columns = [c.strip() for c in _header(path, f.readline(), "covariate")]
+        rows = [row for row in csv.reader(f) if row]
+    missing_cols = [c for c in REQUIRED_COVARIATES if c not in columns]
+    if missing_cols:
+        raise PreflightError(f"{path.name}: missing column(s) {_examples(missing_cols)}; "
+                             f"found {_examples(columns[1:], 10)}")
+
+    #rows with any missing value are dropped by the runner (dropna) -> they count as absent
+    ok = [len(r) == len(columns) and all(v.strip().lower() not in MISSING for v in r) for r in rows]
+    complete = [r for r, keep in zip(rows, ok) if keep]
+    dropped = [r[0].strip() for r, keep in zip(rows, ok) if not keep]
+    ids = [r[0].strip() for r in complete]
+    dup = _duplicates(ids)
+    if dup:
+        raise PreflightError(f"{path.name}: duplicated sample IDs: {_examples(dup)}")
+    id_set, sample_set = set(ids), set(samples)
+    not_in_cov = [s for s in samples if s not in id_set]
+    not_in_expr = [s for s in ids if s not in sample_set]
+    if not_in_cov or not_in_expr:
+        detail = []
+        if not_in_cov:
+            detail.append(f"{len(not_in_cov)} expression sample(s) without a complete covariate row: "
+                          f"{_examples(not_in_cov)}")
+        if not_in_expr:
+            detail.append(f"{len(not_in_expr)} covariate row(s) not in the expression header: "
+                          f"{_examples(not_in_expr)}")
+        if dropped:
+            detail.append(f"rows with missing values are ignored: {_examples(dropped)}")
+        raise PreflightError("Sample IDs do not match between the files - " + "; ".join(detail))
+
+    warnings = []
+    if ids != samples:
+        warnings.append("covariate rows are not in the same order as the expression columns "
+                        "(matched by sample ID)")
+    cond = columns.index("oupSample.batchCond")
+    groups = sorted({r[cond].strip() for r in complete})
+    if len(groups) < 2:
+        raise PreflightError(f"{path.name}: oupSample.batchCond has a single group {_examples(groups)}; "
+                             f"differential expression needs two (e.g. AD and CT)")
+    if not {"AD", "CT"} <= set(groups):
+        warnings.append(f"oupSample.batchCond groups are {_examples(groups)}, the default contrast is AD vs CT")
+    return {"rows": len(complete), "warnings": warnings}
+
+
+def preflight(expr_path: Path, cov_path: Path, job_dir: Path | None = None) -> dict:
+    """Both checks; raises PreflightError with a precise message, else writes + returns the summary"""
+    expr = check_expression(expr_path)
+    cov = check_covariates(cov_path, expr["samples"])
+    summary = {"cells": len(expr["samples"]), "genes": expr["genes"], "density": expr["density"],
+               "covariate_rows": cov["rows"], "warnings": cov["warnings"]}
+    if job_dir is not None:
+        (Path(job_dir) / PREFLIGHT_FILE).write_text(json.dumps(summary))
+    return summary
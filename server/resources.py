@@ -0,0 +1,96 @@
+import math
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from pipeline.worker import parse_size
+
+#? Job sizing for admission control (stdlib only, runs in the web process)
+##shape + density recorded by the /upload pre-flight (preflight.py), else a header / newline scan of the CSV
+##-> memory = base + factor x in-memory X (CSR or dense float32), clamped to [MIN, MAX] per job
+##   a job clamped at MAX still runs: the runner switches to out-of-core preprocessing under that cap
+##-> cpus from the number of non-zeros, for the per-cell-type DEG / Leiden sweep process pools
+
+BASE_MEMORY = parse_size(os.environ.get("PIPELINE_BASE_MEMORY", "700M"))  # interpreter + libraries + plots
+MEMORY_FACTOR = 4             # ingest cache pages + filtered copy + normalised X + DEG / PCA work arrays
+MIN_JOB_MEMORY = parse_size(os.environ.get("PIPELINE_MIN_MEMORY", "1G"))
+MAX_JOB_MEMORY = parse_size(os.environ.get("PIPELINE_MEMORY_MAX", "3G"))
+NNZ_PER_CPU = 25_000_000
+DENSE_THRESHOLD = 0.5         # same switch as the ingest cache
+SCAN_CHUNK = 4 * 1024 * 1024
+SAMPLE_ROWS = 200
+
+
+@dataclass(frozen=True)
+class Resources:
+    memory: int   # bytes
+    cpus: int
+
+    def fits(self, other: "Resources") -> bool:
+        return self.memory <= other.memory and self.cpus <= other.cpus
+
+    def __add__(self, other: "Resources") -> "Resources":
+        return Resources(self.memory + other.memory, self.cpus + other.cpus)
+
+    def __sub__(self, other: "Resources") -> "Resources":
+        return Resources(self.memory - other.memory, self.cpus - other.cpus)
+
+
+def _meminfo(field: str) -> int | None:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_memory() -> int | None:
+    """MemAvailable of the host right now (None off Linux)"""
+    return _meminfo("MemAvailable")
+
+
+def host_capacity() -> Resources:
+    """What pipeline jobs may reserve in total: PIPELINE_HOST_MEMORY / PIPELINE_HOST_CPUS or 80% of RAM / all CPUs"""
+    memory = os.environ.get("PIPELINE_HOST_MEMORY")
+    if memory:
+        memory = parse_size(memory)
+    else:
+        total = _meminfo("MemTotal")
+        memory = int(total * 0.8) if total else MAX_JOB_MEMORY
+    cpus = int(os.environ.get("PIPELINE_HOST_CPUS") or os.cpu_count() or 1)
+    return Resources(memory, cpus)
+
+
+def scan_expression(path: Path, sample_rows: int = SAMPLE_ROWS) -> dict:
+    """Genes x cells CSV -> {"cells", "genes", "density"} from the header, a row sample and a newline count"""
+    with open(path, "rb") as f:
+        header = f.readline()
+        sep = b"\t" if header.count(b"\t") > header.count(b",") else b","
+        cells = header.count(sep)
+        zeros = fields = 0
+        genes = 0
+        for line in f:
+            genes += 1
+            values = line.rstrip(b"\r\n").split(sep)[1:]
+            fields += len(values)
+            zeros += sum(1 for v in values if v.strip() in (b"0", b"0.0", b""))
+            if genes >= sample_rows:
+                break
+        for chunk in iter(lambda: f.read(SCAN_CHUNK), b""):
+            genes += chunk.count(b"\n")
+    density = 1 - zeros / fields if fields else 1.0
+    return {"cells": cells, "genes": genes, "density": round(density, 4)}
+
+
+def estimate_resources(shape: dict, capacity: Resources | None = None) -> Resources:
+    """Memory cap + CPU share of one pipeline run on a {"cells", "genes", "density"} upload"""
+    cells, genes, density = shape["cells"], shape["genes"], shape["density"]
+    nnz = cells * genes * density
+    x_bytes = nnz * 8 + (cells + 1) * 8 if density < DENSE_THRESHOLD else cells * genes * 4
+    memory = min(max(int(BASE_MEMORY + MEMORY_FACTOR * x_bytes), MIN_JOB_MEMORY), MAX_JOB_MEMORY)
+    max_cpus = capacity.cpus if capacity else (os.cpu_count() or 1)
+    cpus = min(max(1, math.ceil(nnz / NNZ_PER_CPU)), max_cpus)
+    return Resources(memory, cpus)
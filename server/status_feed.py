@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+
+from jobs import Job
+from pipeline.telemetry import EVENTS_FILE
+
+#? Push-based job status for /analysis/stream (Server-Sent Events)
+##one JobFeed per watched job, shared by every open tab/subscriber of that job
+##a feed wakes on JobManager state changes (thread-safe notify) and checks events.jsonl every poll_interval,
+##it only rebuilds + publishes the status when the state, the queue position, the background work
+##or the events file changed
+##subscribers always get the latest snapshot (a slow client skips intermediate ones, never queues them)
+
+FINAL_STATES = ("done", "error")
+
+
+class JobFeed:
+    def __init__(self, job: Job, position=None):
+        self.job = job
+        self.position = position  # job_id -> queue position (None = not queued)
+        self.latest: dict | None = None
+        self.version = 0
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def _signature(self):
+        try:
+            st = os.stat(self.job.job_dir / EVENTS_FILE)
+            events = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            events = None
+        queued = self.position(self.job.job_id) if self.position else None
+        return self.job.state, self.job.error, queued, self.job.background, events
+
+    async def watch(self, snapshot, poll_interval: float) -> None:
+        last = None
+        while True:
+            sig = self._signature()
+            if sig != last:
+                last = sig
+                status = snapshot(self.job)
+                async with self.changed:
+                    self.latest = status
+                    self.version += 1
+                    self.changed.notify_all()
+            try:
+                await asyncio.wait_for(self.wake.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+
+class StatusHub:
+    """Registry of JobFeeds; a feed lives as long as it has subscribers"""
+
+    def __init__(self, snapshot, position=None, poll_interval: float = 0.5, heartbeat: float = 15.0):
+        self.snapshot = snapshot  # job -> status dict (same body as GET /analysis)
+        self.position = position  # job_id -> queue position, e.g. JobManager.queue_position
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._feeds: dict[str, JobFeed] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def notify(self, job: Job) -> None:
+        """Called from any thread when a job changes state: wake its feed right away"""
+        feed = self._feeds.get(job.job_id)
+        if feed is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(feed.wake.set)
+
+    async def subscribe(self, job: Job):
+        """Async iterator of status dicts, None every `heartbeat` seconds without news; ends after done/error"""
+        feed = self._feeds.get(job.job_id)
+        if feed is None:
+            feed = self._feeds[job.job_id] = JobFeed(job, self.position)
+            feed.task = asyncio.create_task(feed.watch(self.snapshot, self.poll_interval))
+        feed.subscribers += 1
+        seen = 0
+        try:
+            while True:
+                async with feed.changed:
+                    try:
+                        await asyncio.wait_for(feed.changed.wait_for(lambda: feed.version > seen),
+                                               self.heartbeat)
+                    except asyncio.TimeoutError:
+                        status = None
+                    else:
+                        seen, status = feed.version, feed.latest
+                yield status
+                if status is not None and status["status"] in FINAL_STATES:
+                    return
+        finally:
+            feed.subscribers -= 1
+            if feed.subscribers == 0 and self._feeds.get(job.job_id) is feed:
+                feed.task.cancel()
+                del self._feeds[job.job_id]
+
+    async def sse(self, job: Job):
+        """subscribe() rendered as text/event-stream chunks"""
+        async for status in self.subscribe(job):
+            if status is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
@@ -0,0 +1,200 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from jobs import TRASH_DIR, JobManager
+
+#? Storage manager: retention of job workspaces + the shared caches (stdlib only, runs in the web process)
+##jobs/<job_id>/          last access = mtime of jobs/<job_id>/.last_access, touched by every request for the job
+##                        inputs.json = sha256 of both uploads -> the ingest caches the job depends on
+##cache/ingest/<sha256>/  last use = dir mtime (touched by ingest() on every re-use)
+##cache/stages/<key>/     last use = dir mtime (touched by StageCache on every hit)
+##collect(), every interval seconds on a background thread (and on POST /reset without a job_id):
+##  1. idle jobs not accessed for ttl seconds -> removed (renamed into jobs/.trash, deleted in the background)
+##  2. still over quota (jobs + ingest + stages): least recently used first, across idle jobs, ingest caches
+##     no remaining job depends on and stage checkpoints, until the total fits
+##  the ingest caches of kept jobs and recently used checkpoints stay -> re-runs skip ingest + preprocessing
+##nothing used in the last min_idle seconds is touched, and no stage checkpoint at all while a job is
+##queued / running / rendering: a run may have planned on an entry it has only seen through has()
+
+ACCESS_FILE = ".last_access"
+INPUTS_FILE = "inputs.json"
+TOUCH_INTERVAL = 60  # seconds between two .last_access updates of the same job
+
+
+@dataclass
+class Item:
+    kind: str         # job / ingest / stage
+    path: Path
+    size: int
+    last_used: float
+
+
+def dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+class StorageManager:
+    def __init__(self, jobs: JobManager, cache_dir: Path, ttl: float, quota: int | None,
+                 interval: float = 600, min_idle: float = 600):
+        self.jobs = jobs
+        self.cache_dir = Path(cache_dir)
+        self.ttl, self.quota = ttl, quota  # quota None / 0 = TTL only
+        self.interval, self.min_idle = interval, min_idle
+        self._touched: dict[str, float] = {}
+        self._lock = threading.Lock()  # one collect() at a time
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.last_report: dict = {}
+
+    #! access tracking
+    def touch(self, job_id: str) -> None:
+        """Record an access to the job (at most once per TOUCH_INTERVAL on disk)"""
+        now = time.time()
+        if now - self._touched.get(job_id, 0) < TOUCH_INTERVAL:
+            return
+        self._touched[job_id] = now
+        path = self.jobs.jobs_dir / job_id / ACCESS_FILE
+        try:
+            path.touch()
+        except FileNotFoundError:
+            pass  # workspace already removed
+
+    def record_inputs(self, job_dir: Path, digests: dict) -> None:
+        (Path(job_dir) / INPUTS_FILE).write_text(json.dumps(digests))
+
+    def last_access(self, job_dir: Path) -> float:
+        return _mtime(job_dir / ACCESS_FILE) or _mtime(job_dir)
+
+    #! inventory
+    def _job_inputs(self, job_dir: Path) -> set:
+        try:
+            return set(json.loads((job_dir / INPUTS_FILE).read_text()).values())
+        except (OSError, ValueError):
+            return set()
+
+    def inventory(self) -> list[Item]:
+        items = []
+        for path in self.jobs.jobs_dir.iterdir():
+            if path.is_dir() and path.name != TRASH_DIR:
+                items.append(Item("job", path, dir_size(path), self.last_access(path)))
+        for kind, root in (("ingest", self.cache_dir / "ingest"), ("stage", self.cache_dir / "stages")):
+            if root.is_dir():
+                items += [Item(kind, p, dir_size(p), _mtime(p)) for p in root.iterdir()
+                          if p.is_dir() and not p.name.startswith(".tmp-")]
+        return items
+
+    def usage(self) -> dict:
+        """Bytes + entries per kind, for /storage and /metrics"""
+        out = {kind: {"bytes": 0, "entries": 0} for kind in ("job", "ingest", "stage")}
+        for item in self.inventory():
+            out[item.kind]["bytes"] += item.size
+            out[item.kind]["entries"] += 1
+        return out
+
+    #! eviction
+    def _pipelines_active(self) -> bool:
+        usage = self.jobs.usage()
+        return usage["running"] > 0 or usage["queued"] > 0
+
+    def _idle(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)  # None: workspace left over from before a restart
+        return job is None or (job.state not in ("queued", "processing") and job.background is None)
+
+    def _remove(self, item: Item) -> bool:
+        if item.kind == "job":
+            if time.time() - self.last_access(item.path) < self.min_idle or not self._idle(item.path.name):
+                return False  # accessed / submitted since the inventory
+            if self.jobs.get(item.path.name) is None:
+                self.jobs.discard(item.path)
+                return True
+            try:
+                return self.jobs.remove(item.path.name)
+            except RuntimeError:
+                return False
+        if item.kind == "stage" and self._pipelines_active():
+            return False  # a run started since the candidates were picked
+        shutil.rmtree(item.path, ignore_errors=True)
+        return True
+
+    def collect(self) -> dict:
+        """One TTL + quota pass -> {"removed": {kind: count}, "freed_bytes", "bytes": {kind: bytes left}}"""
+        with self._lock:
+            now = time.time()
+            items = self.inventory()
+            removed = {"job": 0, "ingest": 0, "stage": 0}
+            freed = 0
+
+            def evict(item: Item) -> None:
+                nonlocal freed
+                if self._remove(item):
+                    items.remove(item)
+                    removed[item.kind] += 1
+                    freed += item.size
+
+            #1. TTL: idle workspaces nobody opened for ttl seconds
+            for item in [i for i in items if i.kind == "job" and now - i.last_used > self.ttl]:
+                evict(item)
+
+            #2. quota: LRU over everything not in use; an ingest cache becomes evictable with its last job
+            total = sum(i.size for i in items)
+            while self.quota and total > self.quota:
+                needed = set().union(*(self._job_inputs(i.path) for i in items if i.kind == "job"))
+                active = self._pipelines_active()
+                candidates = sorted((i for i in items if now - i.last_used > self.min_idle
+                                     and not (i.kind == "stage" and active)
+                                     and not (i.kind == "ingest" and i.path.name in needed)
+                                     and not (i.kind == "job" and not self._idle(i.path.name))),
+                                    key=lambda i: i.last_used)
+                if not candidates:
+                    break
+                size_before = len(items)
+                for item in candidates:
+                    evict(item)
+                    if len(items) < size_before:
+                        break
+                else:
+                    break  # nothing could be removed right now
+                total = sum(i.size for i in items)
+
+            left = {kind: sum(i.size for i in items if i.kind == kind) for kind in removed}
+            self.last_report = {"time": now, "removed": removed, "freed_bytes": freed, "bytes": left}
+            if freed:
+                print(f"Storage: removed {removed}, freed {freed / 1024 ** 2:.1f} MB", file=sys.stderr)
+            return self.last_report
+
+    #! background loop
+    def _run(self) -> None:
+        while True:  # first pass right at startup: workspaces left over from before a restart
+            try:
+                self.collect()
+            except Exception as e:  # keep collecting on the next round
+                print(f"Storage collection failed: {e}", file=sys.stderr)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="storage-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
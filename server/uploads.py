@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+from pathlib import Path
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+#? Upload streaming straight from the request body
+##the multipart/form-data body is parsed as it arrives (request.stream(), no UploadFile spool):
+##every file field is hashed + written to its destination once, chunk by chunk, and the upload is
+##aborted (partial files removed) as soon as a file passes the size limit
+##a Content-Length above what two files at the limit can take is rejected before reading anything
+##parsing + writes run in a worker thread, UPLOAD_CHUNK of body at a time: the loop keeps serving
+##the digest is handed to ingest -> the file is not read a second time just to hash it
+
+UPLOAD_CHUNK = 1024 * 1024
+FORM_OVERHEAD = 64 * 1024  # boundaries + part headers on top of the files
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadError(ValueError):
+    """Malformed form / missing file field"""
+
+
+class _FormWriter:
+    """python-multipart callbacks: file fields in targets -> dest files (other fields are ignored)"""
+
+    def __init__(self, targets: dict, max_bytes: int):
+        self.targets = targets  # field name -> fn(client filename) -> dest Path
+        self.max_bytes = max_bytes
+        self.files: dict[str, dict] = {}  # field name -> {"filename", "path", "size", "sha256"}
+        self._headers, self._field, self._value = {}, b"", b""
+        self._part: dict | None = None
+        self._out = None
+        self._hash = None
+
+    def callbacks(self) -> dict:
+        return {"on_part_begin": self.on_part_begin, "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value, "on_header_end": self.on_header_end,
+                "on_headers_finished": self.on_headers_finished, "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end}
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode(errors="replace")
+        filename = Path(options.get(b"filename", b"").decode(errors="replace")).name
+        if name not in self.targets or not filename or name in self.files:
+            self._part = None
+            return
+        path = Path(self.targets[name](filename))
+        self._part = {"filename": filename, "path": path, "size": 0}
+        self.files[name] = self._part
+        self._out = open(path, "wb")
+        self._hash = hashlib.sha256()
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._part is None:
+            return
+        chunk = data[start:end]
+        self._part["size"] += len(chunk)
+        if self.max_bytes and self._part["size"] > self.max_bytes:
+            raise UploadTooLarge(f"{self._part['filename']} is larger than {self.max_bytes // 1024 ** 2} MB")
+        self._hash.update(chunk)
+        self._out.write(chunk)
+
+    def on_part_end(self) -> None:
+        if self._part is None:
+            return
+        self._out.close()
+        self._part["sha256"] = self._hash.hexdigest()
+        self._part, self._out = None, None
+
+    def discard(self) -> None:
+        if self._out is not None:
+            self._out.close()
+        for part in self.files.values():
+            part["path"].unlink(missing_ok=True)
+
+
+async def save_form_files(request, targets: dict, max_bytes: int = 0) -> dict:
+    """
+    Stream the file fields of a multipart/form-data request to disk.
+    targets: field name -> fn(client filename) -> dest Path
+    -> {field: {"filename", "path", "size", "sha256"}}; UploadTooLarge / UploadError (nothing left on disk)
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadError("Expected a multipart/form-data upload")
+    try:
+        length = int(request.headers.get("content-length", ""))
+    except ValueError:
+        length = None  # chunked transfer: the per-file limit below still applies
+    if max_bytes and length is not None and length > len(targets) * max_bytes + FORM_OVERHEAD:
+        raise UploadTooLarge(f"Upload of {length // 1024 ** 2} MB is larger than "
+                             f"{len(targets)} x {max_bytes // 1024 ** 2} MB")
+
+    writer = _FormWriter(targets, max_bytes)
+    parser = MultipartParser(options[b"boundary"], writer.callbacks())
+    pending, size = [], 0
+    try:
+        async for chunk in request.stream():
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= UPLOAD_CHUNK:
+                await asyncio.to_thread(parser.write, b"".join(pending))
+                pending, size = [], 0
+        await asyncio.to_thread(parser.write, b"".join(pending))
+        parser.finalize()
+        missing = [name for name in targets if "sha256" not in writer.files.get(name, {})]
+        if missing:
+            raise UploadError(f"Missing file field(s): {', '.join(missing)}")
+    except BaseException as e:
+        writer.discard()
+        if isinstance(e, MultipartParseError):
+            raise UploadError(f"Malformed upload: {e}") from e
+        raise
+    return writer.files